@@ -0,0 +1,53 @@
+"""Benchmark of per-epoch time of the global ΔG fit loss kernel (eager vs TorchScript vs torch.compile)"""
+import time
+
+import numpy as np
+import torch
+
+from pyhdx.fitting import run_optimizer, regularizer_1d
+from pyhdx.fitting_torch import DeltaGFit
+from functools import partial
+
+np.random.seed(43)
+torch.manual_seed(43)
+
+protein_sizes = [150, 300, 1000]
+kernels = ['eager', 'script', 'compile']
+epochs = 2000
+Nt = 6
+peptide_length = 12
+
+
+def make_inputs(Nr):
+    """Simulated inputs with overlapping peptides of fixed length"""
+    starts = np.arange(0, Nr - peptide_length, 3)
+    X = np.zeros((len(starts), Nr))
+    for i, s in enumerate(starts):
+        X[i, s:s + peptide_length] = 1
+
+    dtype = torch.float64
+    inputs = [torch.tensor([300.], dtype=dtype),
+              torch.tensor(X, dtype=dtype),
+              torch.tensor(np.random.uniform(1, 100, size=(Nr, 1)), dtype=dtype),
+              torch.tensor(np.logspace(-1, 2, Nt)[np.newaxis, :], dtype=dtype)]
+    output_data = torch.rand(len(starts), Nt, dtype=dtype) * peptide_length
+
+    return inputs, output_data
+
+
+if __name__ == '__main__':
+    for Nr in protein_sizes:
+        inputs, output_data = make_inputs(Nr)
+        initial_guess = np.random.uniform(10e3, 30e3, size=(Nr, 1))
+        for kernel in kernels:
+            model = DeltaGFit(torch.nn.Parameter(torch.tensor(initial_guess, dtype=torch.float64)))
+            args = (inputs, output_data, torch.optim.SGD, {'lr': 1e-3}, model, torch.nn.MSELoss(reduction='sum'),
+                    partial(regularizer_1d, 2.))
+
+            t0 = time.perf_counter()
+            run_optimizer(*args, epochs=10, stop_loss=-np.inf, kernel=kernel)  # Warmup / compilation
+            t1 = time.perf_counter()
+            run_optimizer(*args, epochs=epochs, stop_loss=-np.inf, kernel=kernel)
+            t2 = time.perf_counter()
+
+            print(f'Nr={Nr:5d}, kernel={kernel:8s}: warmup {t1 - t0:6.2f} s, {1e6 * (t2 - t1) / epochs:8.1f} µs/epoch')
@@ -0,0 +1,55 @@
+"""Benchmark of pickled sizes and (un)pickling times of data objects and fit results, as transferred by Dask"""
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+
+from pyhdx import PeptideMasterTable, KineticsSeries
+from pyhdx.fileIO import read_dynamx, csv_to_protein
+from pyhdx.fitting import fit_gibbs_global, fit_gibbs_global_batch
+from pyhdx.models import HDXMeasurementSet
+
+test_data = Path(__file__).parent.parent / 'tests' / 'test_data'
+repeats = 20
+
+
+def benchmark(name, obj):
+    t0 = time.perf_counter()
+    for i in range(repeats):
+        pickled = pickle.dumps(obj)
+    t1 = time.perf_counter()
+    for i in range(repeats):
+        pickle.loads(pickled)
+    t2 = time.perf_counter()
+
+    print(f'{name:20s}: {len(pickled) / 1e3:9.1f} kB, dumps {1e3 * (t1 - t0) / repeats:6.2f} ms, '
+          f'loads {1e3 * (t2 - t1) / repeats:6.2f} ms')
+
+
+if __name__ == '__main__':
+    data = read_dynamx(test_data / 'ecSecB_apo.csv', test_data / 'ecSecB_dimer.csv')
+    pmt = PeptideMasterTable(data, drop_first=1, ignore_prolines=True, remove_nan=False)
+    pmt.set_control(('Full deuteration control', 0.167))
+    temperature, pH = 273.15 + 30, 8.
+    series_apo = KineticsSeries(pmt.get_state('SecB WT apo'), temperature=temperature, pH=pH)
+    series_dimer = KineticsSeries(pmt.get_state('SecB his dimer apo'), temperature=temperature, pH=pH)
+    hdx_set = HDXMeasurementSet([series_apo, series_dimer])
+
+    guess = csv_to_protein(test_data / 'ecSecB_guess.txt')
+    single_result = fit_gibbs_global(series_apo, series_apo.guess_deltaG(guess['rate']), epochs=100)
+    batch_result = fit_gibbs_global_batch(hdx_set, hdx_set.guess_deltaG([guess['rate'], guess['rate']]), epochs=100)
+    for result in [single_result, batch_result]:
+        result.output, result.residuals()  # Populate cached attributes
+
+    benchmark('Coverage', series_apo.coverage)
+    benchmark('KineticsSeries', series_apo)
+    benchmark('HDXMeasurementSet', hdx_set)
+    benchmark('Single fit result', single_result)
+    benchmark('Batch fit result', batch_result)
+
+    # Time to first access of the coverage matrices after unpickling
+    unpickled = pickle.loads(pickle.dumps(series_apo))
+    t0 = time.perf_counter()
+    np.stack([pm.X.sum() for pm in unpickled])
+    print(f'Rebuild X/Z matrices of {len(unpickled)} timepoints: {1e3 * (time.perf_counter() - t0):.2f} ms')
@@ -144,6 +144,7 @@ def do_stuff(load_dict, fit_dict, output_dir):
     yaml_file_out.write_text(yaml.dump(combined_dict))
 
     fit_file_out = output_dir / 'deltaG.txt'
+    fr.estimate_errors()
     fr.output.to_file(fit_file_out)
 
     loss_file_out = output_dir / 'reg_loss.txt'
@@ -2,8 +2,8 @@ import argparse
 from ipaddress import ip_address
 from pyhdx.panel import serve
 from pyhdx.panel.config import ConfigurationSettings
-from dask.distributed import Client, LocalCluster
 from pyhdx.support import verify_cluster
+from pyhdx.local_cluster import default_cluster
 
 
 def main():
@@ -34,7 +34,7 @@ def main():
         cluster = ConfigurationSettings().cluster
         if not verify_cluster(cluster):
             # Start a new local cluster if none is specified
-            local_cluster = LocalCluster()  #todo cluster config in configuration file
+            local_cluster = default_cluster(scheduler_port=0)
             _, ip, port = local_cluster.scheduler_address.split(':')
             ip = ip.strip('/')
             cluster = f"{ip}:{port}"
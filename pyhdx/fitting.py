@@ -1,6 +1,7 @@
-from pyhdx.support import get_reduced_blocks, temporary_seed
+from pyhdx.support import get_reduced_blocks, get_original_blocks, temporary_seed
 from pyhdx.models import Protein, HDXMeasurementSet
-from pyhdx.fitting_torch import DeltaGFit, TorchSingleFitResult, TorchBatchFitResult
+from pyhdx.fitting_torch import deltaG_uptake, DeltaGFit, BlockDeltaGFit, TorchSingleFitResult, TorchBatchFitResult, TorchSweepFitResult, TorchCVFitResult, \
+    TorchBootstrapFitResult, mse_kernel, mse_tv_kernel, compile_kernel, uptake_weights, weighted_mse_loss
 from pyhdx.fit_models import SingleKineticModel, OneComponentAssociationModel, TwoComponentAssociationModel, OneComponentDissociationModel, \
     TwoComponentDissociationModel
 from scipy import constants
@@ -12,11 +13,15 @@ from symfit.core.minimizers import DifferentialEvolution, Powell
 from collections import namedtuple
 from functools import reduce, partial
 from operator import add
-from dask.distributed import Client, worker_client
+from dask.distributed import Client, worker_client, as_completed
+from concurrent.futures import Executor
 import dask
 import warnings
 import pandas as pd
-from itertools import repeat
+from itertools import repeat, product
+from pathlib import Path
+import hashlib
+import os
 
 
 EmptyResult = namedtuple('EmptyResult', ['chi_squared', 'params'])
@@ -119,6 +124,8 @@ def fit_rates_weighted_average(data_obj, bounds=None, chisq_thd=20, model_type='
     Parameters
     ----------
     chisq_max
+    pbar : :class:`~pyhdx.support.ProgressReporter`, optional
+        Reporter called with the number of fitted blocks as blocks complete
 
     Returns
     -------
@@ -126,27 +133,25 @@ def fit_rates_weighted_average(data_obj, bounds=None, chisq_thd=20, model_type='
     """
 
     d_list, intervals, models = _prepare_wt_avg_fit(data_obj, model_type=model_type, bounds=bounds)
-    if pbar:
-        raise NotImplementedError()
-    else:
-        inc = lambda: None
 
     results = []
 
     if client is None:
-        for d, model in zip(d_list, models):
+        for i, (d, model) in enumerate(zip(d_list, models)):
             result = fit_kinetics(data_obj.timepoints, d, model, chisq_thd=chisq_thd)
             results.append(result)
+            if pbar is not None:
+                pbar(i + 1, len(d_list), done=i + 1 == len(d_list))
     else:
         iterables = [[data_obj.timepoints]*len(d_list), d_list, models]
 
         if isinstance(client, Client):
             futures = client.map(fit_kinetics, *iterables, chisq_thd=chisq_thd)
-            results = client.gather(futures)
+            results = _gather_with_progress(client, futures, pbar)
         elif client == 'worker_client':
             with worker_client() as client:
                 futures = client.map(fit_kinetics, *iterables, chisq_thd=chisq_thd)
-                results = client.gather(futures)
+                results = _gather_with_progress(client, futures, pbar)
 
 
     fit_result = KineticsFitResult(data_obj, intervals, results, models)
@@ -154,6 +159,14 @@ def fit_rates_weighted_average(data_obj, bounds=None, chisq_thd=20, model_type='
     return fit_result
 
 
+def _gather_with_progress(client, futures, pbar=None):
+    """Gathers `futures`, calling `pbar` with the number of completed futures as they complete"""
+    if pbar is not None:
+        for i, _ in enumerate(as_completed(futures)):
+            pbar(i + 1, len(futures), done=i + 1 == len(futures))
+    return client.gather(futures)
+
+
 def fit_rates(data_obj, method='wt_avg', **kwargs):
     """
     Fit observed rates of exchange to HDX-MS data in `data_obj`
@@ -245,51 +258,312 @@ optimizer_defaults = {
         'momentum': 0.5,
         'nesterov': True
     },
+    'FISTA': {
+        'lr': 10,
+        'eta': 2.,
+    }
+}
+
+scheduler_defaults = {
+    'plateau': {
+        'factor': 0.5,
+        'patience': 50
+    },
+    'cosine': {
+        'eta_min': 0.
+    }
 }
 
 
 def run_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs, model, criterion, regularizer,
-                  epochs=100000, patience=50, stop_loss=0.05):
+                  epochs=100000, patience=50, stop_loss=0.05, kernel='eager', checkpoint=None, checkpoint_interval=1000,
+                  resume=False, fingerprint=None, checkpoint_metadata=None, rel_tol=None, grad_tol=None,
+                  scheduler=None, scheduler_kwargs=None, progress=None):
+    """
+    Runs the optimization loop for global ΔG fits.
+
+    The fit stops after `patience` successive epochs where the decrease of the total loss is below `stop_loss`, or
+    below `rel_tol` times the total loss, or where the norm of the gradient is below `grad_tol`.
+
+    Parameters
+    ----------
+    kernel : :obj:`str`
+        Set to 'script' or 'compile' to replace `model` and `criterion` by a compiled kernel
+        (see :func:`~pyhdx.fitting_torch.compile_kernel`). Only valid for :class:`~pyhdx.fitting_torch.DeltaGFit` models
+        with a sum of squared residuals criterion (``MSELoss(reduction='sum')``). A :func:`regularizer_1d` regularizer
+        is fused into the compiled kernel, other regularizers are evaluated separately.
+    checkpoint : :obj:`str` or :class:`~pathlib.Path`, optional
+        File to which the optimization state is saved every `checkpoint_interval` epochs. The file is removed when the
+        optimization finishes.
+    checkpoint_interval : :obj:`int`
+        Number of epochs between checkpoints.
+    resume : :obj:`bool`
+        If ``True`` and `checkpoint` exists, the optimization resumes from the saved state. Otherwise an existing
+        checkpoint file is removed.
+    fingerprint : :obj:`str`, optional
+        Fingerprint of the fit saved in the checkpoint (see :func:`checkpoint_fingerprint`). Resuming from a checkpoint
+        with a different fingerprint raises a :class:`ValueError`. By default the fingerprint is computed from the
+        inputs, initial ΔG values and optimizer settings.
+    checkpoint_metadata : :obj:`dict`, optional
+        Additional metadata saved in the checkpoint.
+    rel_tol : :obj:`float`, optional
+        Relative tolerance of the loss decrease with respect to the total loss.
+    grad_tol : :obj:`float`, optional
+        Tolerance of the norm of the gradient of the total loss. As the regularizer is not smooth, the gradient norm
+        does not vanish at the optimum and tolerances should be chosen relative to the initial gradient norm.
+    scheduler : :obj:`str`, optional
+        Learning rate scheduler, either 'plateau' (:class:`~torch.optim.lr_scheduler.ReduceLROnPlateau` on the total
+        loss) or 'cosine' (:class:`~torch.optim.lr_scheduler.CosineAnnealingLR` over `epochs`).
+    scheduler_kwargs : :obj:`dict`, optional
+        Keyword arguments for the scheduler, overriding the defaults.
+    progress : :class:`~pyhdx.support.ProgressReporter`, optional
+        Reporter called every epoch with the number of epochs and the current losses.
+
+    """
 
     optimizer_obj = optimizer_klass(model.parameters(), **optimizer_kwargs)
+    scheduler_kwargs = {**scheduler_defaults.get(scheduler, {}), **(scheduler_kwargs or {})}
+    if scheduler == 'plateau':
+        scheduler_obj = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer_obj, **scheduler_kwargs)
+    elif scheduler == 'cosine':
+        scheduler_obj = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer_obj, T_max=epochs, **scheduler_kwargs)
+    elif scheduler is None:
+        scheduler_obj = None
+    else:
+        raise ValueError(f"Invalid value for 'scheduler': {scheduler!r}")
 
     np.random.seed(43)
     torch.manual_seed(43)
 
     mse_loss_list = [np.inf]
     total_loss_list = [np.inf]
+    start, stop = 0, 0
+
+    if checkpoint is not None and fingerprint is None:
+        fingerprint = checkpoint_fingerprint(inputs, output_data, model.deltaG, optimizer_klass, optimizer_kwargs,
+                                             criterion, regularizer, scheduler, scheduler_kwargs)
+    checkpoint_metadata = {'fingerprint': fingerprint, **(checkpoint_metadata or {})}
+
+    if _resume_checkpoint(checkpoint, resume):
+        state = load_checkpoint(checkpoint, model.deltaG, fingerprint)
+        optimizer_obj.load_state_dict(state['optimizer'])
+        if scheduler_obj is not None:
+            scheduler_obj.load_state_dict(state['scheduler'])
+        mse_loss_list, total_loss_list = list(state['mse_loss']), list(state['total_loss'])
+        start, stop = state['epoch'], state['stop']
+
+    if kernel == 'eager':
+        loss_func = lambda: (criterion(model(*inputs), output_data), regularizer(model.deltaG))
+    elif not (isinstance(criterion, torch.nn.MSELoss) and criterion.reduction == 'sum'):
+        raise ValueError("Compiled kernels are only available with the sum of squared residuals criterion")
+    elif isinstance(regularizer, partial) and regularizer.func is regularizer_1d and len(regularizer.args) == 1:
+        fused = compile_kernel(mse_tv_kernel, method=kernel)
+        r1 = float(regularizer.args[0])
+        loss_func = lambda: fused(model.deltaG, *inputs, output_data, r1)
+    else:
+        compiled = compile_kernel(mse_kernel, method=kernel)
+        loss_func = lambda: (compiled(model.deltaG, *inputs, output_data), regularizer(model.deltaG))
 
     def closure():
-        output = model(*inputs)
-        loss = criterion(output, output_data)
+        loss, reg_loss = loss_func()
         mse_loss_list.append(loss.detach())
-        reg_loss = regularizer(model.deltaG)
         total_loss = loss + reg_loss
         total_loss_list.append(total_loss.detach())
         total_loss.backward()
         return total_loss
 
-    stop = 0
-    for epoch in range(epochs):
+    for epoch in range(start, epochs):
         optimizer_obj.zero_grad()
         loss = optimizer_obj.step(closure)
 
         diff = total_loss_list[-2] - total_loss_list[-1]
-        if diff < stop_loss:
+        converged = diff < stop_loss
+        if rel_tol:
+            converged |= diff < rel_tol * abs(total_loss_list[-1])
+        if grad_tol:
+            grad_norm = torch.sqrt(sum(torch.sum(p.grad ** 2) for p in model.parameters()))
+            converged |= grad_norm < grad_tol
+
+        if converged:
             stop += 1
             if stop > patience:
                 break
         else:
             stop = 0
 
+        if scheduler == 'plateau':
+            scheduler_obj.step(total_loss_list[-1])
+        elif scheduler_obj is not None:
+            scheduler_obj.step()
+
+        if progress is not None:
+            progress(epoch + 1, epochs, mse_loss=mse_loss_list[-1], total_loss=total_loss_list[-1])
+
+        if checkpoint is not None and (epoch + 1) % checkpoint_interval == 0:
+            scheduler_state = {} if scheduler_obj is None else {'scheduler': scheduler_obj.state_dict()}
+            save_checkpoint(checkpoint, model.deltaG, mse_loss_list, total_loss_list, epoch + 1, stop,
+                            optimizer=optimizer_obj.state_dict(), **scheduler_state, **checkpoint_metadata)
+
+    if checkpoint is not None and Path(checkpoint).exists():
+        Path(checkpoint).unlink()
+    if progress is not None:
+        progress(len(total_loss_list) - 1, epochs, done=True, mse_loss=mse_loss_list[-1],
+                 total_loss=total_loss_list[-1])
+
     #par = model.deltaG.detach().numpy()
     return np.array(mse_loss_list), np.array(total_loss_list), model
 
 
+def save_checkpoint(path, param, mse_loss, total_loss, epoch, stop, **state):
+    """
+    Saves the state of a ΔG optimization to `path`.
+
+    The file is first written to a temporary file and then moved, such that an interruption never leaves a corrupted
+    checkpoint.
+
+    Parameters
+    ----------
+    path : :obj:`str` or :class:`~pathlib.Path`
+        Checkpoint file path
+    param : :class:`~torch.Tensor`
+        ΔG parameter values
+    mse_loss : :obj:`list`
+        Mean squared error losses per epoch
+    total_loss : :obj:`list`
+        Total losses per epoch
+    epoch : :obj:`int`
+        Number of completed epochs
+    stop : :obj:`int`
+        Number of successive epochs where the stopping criterion was met
+    **state
+        Additional optimizer state to save
+
+    """
+    path = Path(path)
+    state = {'deltaG': param.detach().clone(),
+             'mse_loss': torch.tensor([float(loss) for loss in mse_loss]),
+             'total_loss': torch.tensor([float(loss) for loss in total_loss]),
+             'epoch': epoch, 'stop': stop, **state}
+
+    temp_path = path.with_name(path.name + '.tmp')
+    torch.save(state, temp_path)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path, param, fingerprint=None):
+    """
+    Loads the state of a ΔG optimization from `path` and copies the saved ΔG values into `param`.
+
+    Parameters
+    ----------
+    path : :obj:`str` or :class:`~pathlib.Path`
+        Checkpoint file path
+    param : :class:`~torch.Tensor`
+        ΔG parameter to restore
+    fingerprint : :obj:`str`, optional
+        Fingerprint of the fit, if given it must be equal to the fingerprint saved in the checkpoint
+
+    Returns
+    -------
+    state : :obj:`dict`
+        Saved optimization state
+
+    """
+    state = torch.load(path)
+    if fingerprint is not None and state.get('fingerprint') != fingerprint:
+        raise ValueError(f"Checkpoint '{path}' was written by a fit with different data or settings")
+    if state['deltaG'].shape != param.shape:
+        raise ValueError(f"Shape of ΔG values in checkpoint '{path}' does not match the fit parameters")
+
+    with torch.no_grad():
+        param.copy_(state['deltaG'])
+
+    return state
+
+
+def checkpoint_fingerprint(*objects):
+    """
+    Returns a fingerprint of the data and settings of a fit. Fingerprints are saved in checkpoints, such that fits only
+    resume from checkpoints written by the same fit.
+
+    Parameters
+    ----------
+    *objects
+        Tensors, arrays, settings and (partial) functions which define the fit
+
+    Returns
+    -------
+    fingerprint : :obj:`str`
+        Hexadecimal SHA-1 digest
+
+    """
+    sha = hashlib.sha1()
+
+    def update(obj):
+        if isinstance(obj, torch.Tensor):
+            obj = obj.detach().numpy()
+        if isinstance(obj, np.ndarray):
+            sha.update(str(obj.shape).encode())
+            sha.update(np.ascontiguousarray(obj).tobytes())
+        elif isinstance(obj, partial):
+            update([obj.func, obj.args, obj.keywords])
+        elif isinstance(obj, (list, tuple)):
+            for elem in obj:
+                update(elem)
+        elif isinstance(obj, dict):
+            for key in sorted(obj):
+                update([key, obj[key]])
+        elif isinstance(obj, torch.nn.Module):
+            sha.update(f'{type(obj).__name__}{getattr(obj, "reduction", "")}'.encode())
+        elif callable(obj):
+            sha.update(getattr(obj, '__qualname__', type(obj).__name__).encode())
+        else:
+            sha.update(repr(obj).encode())
+
+    update(objects)
+
+    return sha.hexdigest()
+
+
+def _resume_checkpoint(checkpoint, resume):
+    """Returns ``True`` if the optimization should resume from `checkpoint`, otherwise removes stale checkpoints"""
+    if checkpoint is None or not Path(checkpoint).exists():
+        return False
+    if not resume:
+        Path(checkpoint).unlink()
+    return resume
+
+
 def regularizer_1d(r1, param):
     return r1 * torch.mean(torch.abs(param[:-1] - param[1:]))
 
 
+def regularizer_1d_independent(r1, mask, param):
+    """
+    Per-state regularization along the residue axis for independent fits of states in a batch.
+
+    Each state's loss equals :func:`regularizer_1d` of its own residues, the mask excludes differences with padded
+    residues outside the state's interval.
+
+    Parameters
+    ----------
+    r1 : :obj:`float`
+        Regularizer value along the residue axis
+    mask : :class:`~torch.Tensor`
+        Boolean tensor (N_states, N_residues - 1, 1) with ``True`` for differences within each state's interval
+    param : :class:`~torch.Tensor`
+        ΔG values (N_states, N_residues, 1)
+
+    Returns
+    -------
+    reg_loss : :class:`~torch.Tensor`
+        Regularization loss per state (N_states,)
+
+    """
+    d_ax1 = torch.abs(param[:, :-1, :] - param[:, 1:, :]) * mask
+    return r1 * torch.sum(d_ax1, dim=(1, 2)) / torch.sum(mask, dim=(1, 2))
+
+
 def regularizer_2d(r1, r2, param):
     #todo allow regularization wrt reference rather than mean
     d_ax1 = torch.abs(param[:, :-1, :] - param[:, 1:, :])
@@ -298,6 +572,31 @@ def regularizer_2d(r1, r2, param):
     return reg_loss
 
 
+def regularizer_2d_per_state(r1, r2, param):
+    """
+    Contributions of each state to :func:`regularizer_2d`, such that their sum equals the total regularization loss.
+
+    Parameters
+    ----------
+    r1 : :obj:`float`
+        Regularizer value along the residue axis
+    r2 : :obj:`float`
+        Regularizer value along the sample axis
+    param : :class:`~torch.Tensor`
+        ΔG values (N_states, N_residues, 1)
+
+    Returns
+    -------
+    reg_loss : :class:`~torch.Tensor`
+        Regularization loss per state (N_states,)
+
+    """
+    d_ax1 = torch.abs(param[:, :-1, :] - param[:, 1:, :])
+    d_ax2 = torch.abs(param - torch.mean(param, axis=0))
+    reg_loss = r1 * torch.sum(d_ax1, dim=(1, 2)) / d_ax1[0].numel() + r2 * torch.sum(d_ax2, dim=(1, 2)) / d_ax2[0].numel()
+    return reg_loss / param.shape[0]
+
+
 def regularizer_2d_aligned(r1, r2, indices, param):
     i0 = indices[0]
     i1 = indices[1]
@@ -308,12 +607,618 @@ def regularizer_2d_aligned(r1, r2, indices, param):
     return reg_loss
 
 
+def tv_denoise_1d(y, lam):
+    """
+    Exact proximal operator of the 1D total variation penalty (Condat's direct algorithm).
+
+    Solves argmin_x 0.5 * sum((y - x)**2) + lam * sum(abs(x[1:] - x[:-1]))
+
+    Parameters
+    ----------
+    y : :class:`~numpy.ndarray`
+        Input 1D array
+    lam : :obj:`float`
+        Weight of the total variation penalty
+
+    Returns
+    -------
+    x : :class:`~numpy.ndarray`
+        Denoised output array
+
+    """
+    #https://doi.org/10.1109/LSP.2013.2278339
+    y = np.asarray(y, dtype=float)
+    width = len(y)
+    x = np.empty_like(y)
+    if width == 0:
+        return x
+    if lam <= 0:
+        x[:] = y
+        return x
+
+    k = k0 = kplus = kminus = 0
+    umin, umax = lam, -lam
+    vmin, vmax = y[0] - lam, y[0] + lam
+    while True:
+        while k == width - 1:  # right boundary condition
+            if umin < 0.:  # vmin too high -> negative jump
+                x[k0:kminus + 1] = vmin
+                k = k0 = kminus = kminus + 1
+                vmin = y[k]
+                umin = lam
+                umax = vmin + umin - vmax
+            elif umax > 0.:  # vmax too low -> positive jump
+                x[k0:kplus + 1] = vmax
+                k = k0 = kplus = kplus + 1
+                vmax = y[k]
+                umax = -lam
+                umin = vmax + umax - vmin
+            else:
+                vmin += umin / (k - k0 + 1)
+                x[k0:k + 1] = vmin
+                return x
+
+        umin += y[k + 1] - vmin
+        if umin < -lam:  # negative jump
+            x[k0:kminus + 1] = vmin
+            k = k0 = kplus = kminus = kminus + 1
+            vmin = y[k]
+            vmax = vmin + 2 * lam
+            umin, umax = lam, -lam
+            continue
+
+        umax += y[k + 1] - vmax
+        if umax > lam:  # positive jump
+            x[k0:kplus + 1] = vmax
+            k = k0 = kplus = kminus = kplus + 1
+            vmax = y[k]
+            vmin = vmax - 2 * lam
+            umin, umax = lam, -lam
+        else:  # no jump
+            k += 1
+            if umin >= lam:
+                kminus = k
+                vmin += (umin - lam) / (kminus - k0 + 1)
+                umin = lam
+            if umax <= -lam:
+                kplus = k
+                vmax += (umax + lam) / (kplus - k0 + 1)
+                umax = -lam
+
+
+def prox_deviation(v, lam):
+    """
+    Exact proximal operator of the penalty lam * sum(abs(x - mean(x, axis=0))) which is applied independently to each
+    column of `v`.
+
+    Parameters
+    ----------
+    v : :class:`~numpy.ndarray`
+        Input array of shape Ns x ...
+    lam : :obj:`float`
+        Weight of the penalty
+
+    Returns
+    -------
+    x : :class:`~numpy.ndarray`
+        Output array of the same shape as `v`
+
+    """
+    # Solution is mean(v) + soft_threshold(w - tau, lam), with w = v - mean(v) and tau such that the deviations
+    # sum to zero. The sum is piecewise linear in tau with breakpoints at w +/- lam.
+    soft = lambda a: np.sign(a) * np.clip(np.abs(a) - lam, 0, None)
+
+    mean = np.mean(v, axis=0)
+    w = v - mean
+    breakpoints = np.sort(np.concatenate([w - lam, w + lam]), axis=0)  # 2Ns x ...
+    sums = np.sum(soft(w[np.newaxis, ...] - breakpoints[:, np.newaxis, ...]), axis=1)  # Decreasing along axis 0
+
+    # Index of the last breakpoint where the sum is positive; the root is between this and the next breakpoint
+    idx = np.clip(np.sum(sums > 0, axis=0) - 1, 0, len(breakpoints) - 2)[np.newaxis, ...]
+    t0, t1 = np.take_along_axis(breakpoints, idx, 0)[0], np.take_along_axis(breakpoints, idx + 1, 0)[0]
+    s0, s1 = np.take_along_axis(sums, idx, 0)[0], np.take_along_axis(sums, idx + 1, 0)[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = np.where(s0 != s1, t0 + s0 * (t1 - t0) / (s0 - s1), t0)
+
+    return mean + soft(w - tau)
+
+
+def prox_1d(r1, param, step):
+    """Proximal operator of :func:`regularizer_1d` with step size `step`"""
+    value = param.detach().numpy()
+    lam = step * r1 / (len(value) - 1)
+    output = tv_denoise_1d(value[:, 0], lam)[:, np.newaxis]
+
+    return torch.tensor(output, dtype=param.dtype)
+
+
+def prox_2d(r1, r2, param, step, n_iter=50, tol=1e-8):
+    """
+    Proximal operator of :func:`regularizer_2d` with step size `step`.
+
+    The residue-axis (r1) and sample-axis (r2) terms both have exact proximal operators, the proximal operator of their
+    sum is found by Dykstra-like splitting.
+    """
+    value = param.detach().numpy()[..., 0]  # Ns x Nr
+    Ns, Nr = value.shape
+    lam_1 = step * r1 / (Ns * (Nr - 1))
+    lam_2 = step * r2 / (Ns * Nr)
+
+    prox_tv = lambda v: np.stack([tv_denoise_1d(row, lam_1) for row in v])
+    if Ns == 1 or lam_2 == 0:
+        output = prox_tv(value)
+    else:
+        x = value
+        p = np.zeros_like(value)
+        q = np.zeros_like(value)
+        for i in range(n_iter):
+            y = prox_deviation(x + p, lam_2)
+            p = x + p - y
+            x_new = prox_tv(y + q)
+            q = y + q - x_new
+            converged = np.max(np.abs(x_new - x)) < tol
+            x = x_new
+            if converged:
+                break
+        output = x
+
+    return torch.tensor(output[..., np.newaxis], dtype=param.dtype)
+
+
+def run_proximal_optimizer(inputs, output_data, model, criterion, regularizer, prox, epochs=100000, patience=50,
+                           stop_loss=0.05, lr=10, eta=2., checkpoint=None, checkpoint_interval=1000, resume=False,
+                           fingerprint=None, checkpoint_metadata=None, progress=None):
+    """
+    Minimizes the loss with the accelerated proximal gradient method (FISTA) with backtracking and adaptive restart.
+
+    The mean squared error part of the loss is treated as the smooth part, the non-smooth regularizer is applied through
+    its proximal operator.
+
+    Parameters
+    ----------
+    inputs : :obj:`list`
+        List of input tensors for `model`
+    output_data : :class:`~torch.Tensor`
+        Measured uptake tensor
+    model : :class:`~pyhdx.fitting_torch.DeltaGFit`
+        Model to optimize
+    criterion : :obj:`callable`
+        Smooth loss function
+    regularizer : :obj:`callable`
+        Regularization function, called with the model's deltaG parameter
+    prox : :obj:`callable`
+        Proximal operator of `regularizer`, called with deltaG and the step size
+    epochs : :obj:`int`
+        Maximum number of iterations
+    patience : :obj:`int`
+        Number of iterations where the loss decrease is below `stop_loss` before stopping
+    stop_loss : :obj:`float`
+        Threshold loss difference below which to stop fitting.
+    lr : :obj:`float`
+        Initial step size
+    eta : :obj:`float`
+        Factor by which the inverse step size is increased upon backtracking
+    checkpoint : :obj:`str` or :class:`~pathlib.Path`, optional
+        File to which the optimization state is saved every `checkpoint_interval` epochs. The file is removed when the
+        optimization finishes.
+    checkpoint_interval : :obj:`int`
+        Number of epochs between checkpoints.
+    resume : :obj:`bool`
+        If ``True`` and `checkpoint` exists, the optimization resumes from the saved state. Otherwise an existing
+        checkpoint file is removed.
+    fingerprint : :obj:`str`, optional
+        Fingerprint of the fit saved in the checkpoint (see :func:`checkpoint_fingerprint`). Resuming from a checkpoint
+        with a different fingerprint raises a :class:`ValueError`. By default the fingerprint is computed from the
+        inputs, initial ΔG values and optimizer settings.
+    checkpoint_metadata : :obj:`dict`, optional
+        Additional metadata saved in the checkpoint.
+    progress : :class:`~pyhdx.support.ProgressReporter`, optional
+        Reporter called every iteration with the number of iterations and the current losses.
+
+    Returns
+    -------
+    mse_loss : :class:`~numpy.ndarray`
+        Array with mean squared error losses per epoch
+    total_loss : :class:`~numpy.ndarray`
+        Array with total losses per epoch
+    model : :class:`~pyhdx.fitting_torch.DeltaGFit`
+        Optimized model
+
+    """
+    param = model.deltaG
+
+    def smooth_loss(value):
+        with torch.no_grad():
+            param.copy_(value)
+        return criterion(model(*inputs), output_data)
+
+    mse_loss_list = [np.inf]
+    total_loss_list = [np.inf]
+
+    x = param.detach().clone()
+    y = x.clone()
+    t_k = 1.
+    step = lr
+    start, stop = 0, 0
+
+    if checkpoint is not None and fingerprint is None:
+        fingerprint = checkpoint_fingerprint(inputs, output_data, param, criterion, regularizer, prox, lr, eta)
+    checkpoint_metadata = {'fingerprint': fingerprint, **(checkpoint_metadata or {})}
+
+    if _resume_checkpoint(checkpoint, resume):
+        state = load_checkpoint(checkpoint, param, fingerprint)
+        x = param.detach().clone()
+        y, t_k, step = state['y'], state['t_k'], state['step']
+        mse_loss_list, total_loss_list = list(state['mse_loss']), list(state['total_loss'])
+        start, stop = state['epoch'], state['stop']
+
+    for epoch in range(start, epochs):
+        param.grad = None
+        f_y = smooth_loss(y)
+        f_y.backward()
+        grad = param.grad.detach().clone()
+        f_y = f_y.detach()
+
+        while True:
+            x_new = prox(y - step * grad, step)
+            with torch.no_grad():
+                f_new = smooth_loss(x_new)
+            d = x_new - y
+            if f_new <= f_y + torch.sum(grad * d) + torch.sum(d * d) / (2 * step):
+                break
+            step /= eta
+
+        with torch.no_grad():
+            total = f_new + regularizer(x_new)
+
+        if total > total_loss_list[-1]:  # Adaptive restart of the momentum
+            t_k = 1.
+            y = x.clone()
+            continue
+
+        t_new = (1 + np.sqrt(1 + 4 * t_k ** 2)) / 2
+        y = x_new + ((t_k - 1) / t_new) * (x_new - x)
+        x = x_new
+        t_k = t_new
+
+        mse_loss_list.append(f_new)
+        total_loss_list.append(total)
+
+        diff = total_loss_list[-2] - total_loss_list[-1]
+        if diff < stop_loss:
+            stop += 1
+            if stop > patience:
+                break
+        else:
+            stop = 0
+
+        if checkpoint is not None and (epoch + 1) % checkpoint_interval == 0:
+            save_checkpoint(checkpoint, x, mse_loss_list, total_loss_list, epoch + 1, stop, y=y, t_k=float(t_k),
+                            step=float(step), **checkpoint_metadata)
+
+        if progress is not None:
+            progress(epoch + 1, epochs, mse_loss=mse_loss_list[-1], total_loss=total_loss_list[-1])
+
+    with torch.no_grad():
+        param.copy_(x)
+
+    if checkpoint is not None and Path(checkpoint).exists():
+        Path(checkpoint).unlink()
+    if progress is not None:
+        progress(len(total_loss_list) - 1, epochs, done=True, mse_loss=mse_loss_list[-1],
+                 total_loss=total_loss_list[-1])
+
+    return np.array(mse_loss_list), np.array(total_loss_list), model
+
+
+def probe_learning_rate(inputs, output_data, optimizer_kwargs, model, criterion, regularizer,
+                        factors=(0.1, 0.3, 1., 3., 10.), epochs=50):
+    """
+    Probes learning rates for the SGD optimizer by running short trial fits at several learning rates in one batched
+    run.
+
+    The ΔG parameters of `model` are stacked along a new leading axis, one set per learning rate. All sets are
+    optimized with a learning rate of one while their gradients are scaled by the trial learning rates, which is
+    equivalent to separate SGD runs as the SGD update (including momentum) is linear in the gradient. Weight decay is
+    added to the gradients before scaling, such that it is also applied with the trial learning rates.
+
+    Trials are stable if their losses stay finite and their final loss is below the initial loss and within 1% of the
+    lowest loss of the trial, ie the loss does not diverge or oscillate. Of the stable trials, the learning rate with
+    the lowest final loss is selected, which is the learning rate with the largest loss decrease over `epochs`,
+    rather than the steepest initial decrease. If no trial is stable, the lowest learning rate is selected. The
+    parameters of `model` are set to the result of the selected trial run.
+
+    Parameters
+    ----------
+    optimizer_kwargs : :obj:`dict`
+        Keyword arguments for :class:`~torch.optim.SGD`, the trial learning rates are `factors` times 'lr'
+    model : :class:`~pyhdx.fitting_torch.DeltaGFit`
+        Model with initial ΔG parameters
+    factors : :obj:`tuple`
+        Factors by which to multiply the learning rate for each trial
+    epochs : :obj:`int`
+        Number of epochs of each trial
+
+    Returns
+    -------
+    lr : :obj:`float`
+        Selected learning rate
+    probe : :obj:`dict`
+        Dictionary with the trial learning rates ('lr'), final losses of each trial ('loss') and the selected
+        learning rate ('lr_chosen')
+
+    """
+    lrs = optimizer_kwargs['lr'] * np.array(factors, dtype=float)
+    K = len(lrs)
+    deltaG = model.deltaG.detach()
+    stacked = torch.nn.Parameter(deltaG.expand(K, *deltaG.shape).clone())
+    probe_model = DeltaGFit(stacked)
+
+    scale = torch.tensor(lrs, dtype=deltaG.dtype).reshape(K, *[1] * deltaG.dim())
+    weight_decay = optimizer_kwargs.get('weight_decay', 0.)
+    stacked.register_hook(lambda grad: (grad + weight_decay * stacked.detach()) * scale)
+    optimizer_obj = torch.optim.SGD([stacked], **{**optimizer_kwargs, 'lr': 1., 'weight_decay': 0.})
+
+    loss_list = []
+    for epoch in range(epochs):
+        optimizer_obj.zero_grad()
+        output = probe_model(*inputs)
+        losses = torch.stack([criterion(output[k], output_data) + regularizer(stacked[k]) for k in range(K)])
+        loss_list.append(losses.detach())
+        losses.sum().backward()
+        optimizer_obj.step()
+
+    with torch.no_grad():
+        output = probe_model(*inputs)
+        losses = torch.stack([criterion(output[k], output_data) + regularizer(stacked[k]) for k in range(K)])
+    loss_list.append(losses)
+    loss = torch.stack(loss_list).numpy()  # Shape (epochs + 1, K)
+
+    # Stable trials have finite losses and end at (close to) their lowest loss
+    final = loss[-1]
+    stable = np.all(np.isfinite(loss), axis=0) & (final < loss[0]) & (final <= 1.01 * np.nanmin(loss, axis=0))
+    best = np.argmin(np.where(stable, final, np.inf)) if np.any(stable) else np.argmin(lrs)
+
+    with torch.no_grad():
+        model.deltaG.copy_(stacked[best])
+
+    lr_chosen = float(lrs[best])
+    return lr_chosen, {'lr': lrs, 'loss': final, 'lr_chosen': lr_chosen}
+
+
+def _probe_or_resume(lr_probe, checkpoint, fingerprint, inputs, output_data, optimizer_kwargs, model, criterion,
+                     regularizer):
+    """
+    Runs :func:`probe_learning_rate` with factors `lr_probe`, or returns the probe results saved in `checkpoint` if
+    the fit resumes from it, such that the resumed fit uses the learning rate of the interrupted fit.
+    """
+    if checkpoint is not None and Path(checkpoint).exists():
+        probe = load_checkpoint(checkpoint, model.deltaG, fingerprint)['lr_probe']
+        return probe['lr_chosen'], {'lr': np.array(probe['lr']), 'loss': np.array(probe['loss']),
+                                    'lr_chosen': probe['lr_chosen']}
+
+    probe_kwargs = {} if lr_probe is True else {'factors': lr_probe}
+    return probe_learning_rate(inputs, output_data, optimizer_kwargs, model, criterion, regularizer, **probe_kwargs)
+
+
+def _probe_metadata(probe):
+    """Probe results as lists and floats, which can be saved in checkpoints"""
+    return {'lr_probe': {'lr': np.asarray(probe['lr']).tolist(), 'loss': np.asarray(probe['loss']).tolist(),
+                         'lr_chosen': float(probe['lr_chosen'])}}
+
+
+def run_batch_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs, model, criterion, regularizer,
+                        epochs=100000, patience=50, stop_loss=0.05, weights=None, progress=None):
+    """
+    Runs the optimization loop for batch ΔG fits with convergence tracked per state.
+
+    A state is converged when its total loss decreases less than `stop_loss` for more than `patience` epochs, after
+    which its ΔG values are frozen and its uptake is no longer computed. The optimization stops when all states have
+    converged.
+
+    Parameters
+    ----------
+    inputs : :obj:`list`
+        List of input tensors for `model`, with states along the first axis
+    output_data : :class:`~torch.Tensor`
+        Measured uptake tensor (N_states, N_peptides, N_timepoints)
+    optimizer_klass : :obj:`type`
+        PyTorch optimizer class
+    optimizer_kwargs : :obj:`dict`
+        Keyword arguments for the optimizer
+    model : :class:`~pyhdx.fitting_torch.DeltaGFit`
+        Model with ΔG parameter (N_states, N_residues, 1)
+    criterion : :obj:`callable`
+        Loss function called with model output and `output_data` of active states, returns losses per state
+    regularizer : :obj:`callable`
+        Regularization function called with the ΔG parameter, returns losses per state (N_states,)
+    epochs : :obj:`int`
+        Maximum number of epochs
+    patience : :obj:`int`
+        Number of epochs where the loss decrease is below `stop_loss` before a state is converged
+    stop_loss : :obj:`float`
+        Threshold loss difference below which to stop fitting.
+    weights : :class:`~torch.Tensor`, optional
+        Weights of the squared residuals (N_states, N_peptides, N_timepoints). If given, `criterion` is called with the
+        weights of active states as third argument.
+    progress : :class:`~pyhdx.support.ProgressReporter`, optional
+        Reporter called every epoch with the number of epochs, the current losses summed over states and the number
+        of converged states.
+
+    Returns
+    -------
+    mse_loss : :class:`~numpy.ndarray`
+        Mean squared error losses per epoch and state (N_epochs + 1, N_states)
+    total_loss : :class:`~numpy.ndarray`
+        Total losses per epoch and state (N_epochs + 1, N_states)
+    n_epochs : :class:`~numpy.ndarray`
+        Number of epochs until convergence per state
+    model : :class:`~pyhdx.fitting_torch.DeltaGFit`
+        Optimized model
+
+    """
+    param = model.deltaG
+    optimizer_obj = optimizer_klass(model.parameters(), **optimizer_kwargs)
+
+    Ns = param.shape[0]
+    mse_loss_list = [torch.full((Ns,), np.inf, dtype=param.dtype)]
+    total_loss_list = [torch.full((Ns,), np.inf, dtype=param.dtype)]
+
+    active = torch.ones(Ns, dtype=torch.bool)
+    stop = torch.zeros(Ns, dtype=torch.long)
+    n_epochs = np.full(Ns, epochs)
+    frozen = param.detach().clone()
+    all_active = True
+
+    # Only the uptake of active states is computed, the mse losses of converged states are constant
+    active_idx, active_inputs, active_output = torch.arange(Ns), inputs, output_data
+    active_weights = [] if weights is None else [weights]
+    mse_loss = torch.zeros(Ns, dtype=param.dtype)
+
+    for epoch in range(epochs):
+        optimizer_obj.zero_grad()
+        active_param = param if all_active else param[active_idx]
+        active_mse_loss = criterion(deltaG_uptake(active_param, *active_inputs), active_output, *active_weights)
+        reg_loss = regularizer(param)
+        (active_mse_loss.sum() + reg_loss.sum()).backward()
+        optimizer_obj.step()
+
+        if not all_active:
+            with torch.no_grad():
+                param[~active] = frozen[~active]  # Converged states are not updated by the optimizer
+
+        mse_loss = mse_loss.clone()
+        mse_loss[active_idx] = active_mse_loss.detach()
+        mse_loss_list.append(mse_loss)
+        total_loss_list.append(mse_loss + reg_loss.detach())
+
+        diff = total_loss_list[-2] - total_loss_list[-1]
+        stop = torch.where(diff < stop_loss, stop + 1, torch.zeros_like(stop))
+        converged = active & (stop > patience)
+        if converged.any():
+            all_active = False
+            active &= ~converged
+            n_epochs[converged.numpy()] = epoch + 1
+            frozen[converged] = param.detach()[converged]
+
+            active_idx = torch.nonzero(active).squeeze(-1)
+            active_inputs = [tensor[active_idx] for tensor in inputs]
+            active_output = output_data[active_idx]
+            active_weights = [] if weights is None else [weights[active_idx]]
+
+        if not active.any():
+            break
+        if progress is not None:
+            progress(epoch + 1, epochs, mse_loss=mse_loss_list[-1].sum(), total_loss=total_loss_list[-1].sum(),
+                     converged=Ns - active.sum())
+
+    if progress is not None:
+        progress(len(total_loss_list) - 1, epochs, done=True, mse_loss=mse_loss_list[-1].sum(),
+                 total_loss=total_loss_list[-1].sum(), converged=Ns - active.sum())
+
+    return torch.stack(mse_loss_list).numpy(), torch.stack(total_loss_list).numpy(), n_epochs, model
+
+
+def warm_start_guess(fit_result, data_obj, initial_guess):
+    """
+    Initial guesses of ΔG from a previous global fit, to refine a fit after small changes to the data or settings.
+
+    ΔG values are aligned by residue number and matched to states by name. Residues and states not present in the
+    previous fit are taken from `initial_guess`. If a single state is refined from a fit of a single state with another
+    name, the ΔG values of that state are used and a warning is issued.
+
+    Parameters
+    ----------
+    fit_result : :class:`~pyhdx.fitting_torch.TorchSingleFitResult`, :class:`~pyhdx.fitting_torch.TorchBatchFitResult` or :obj:`list`
+        Previous fit result, or a list of single fit results
+    data_obj : :class:`~pyhdx.models.KineticsSeries` or :class:`~pyhdx.models.HDXMeasurementSet`
+        Data object to fit
+    initial_guess : :class:`~pandas.Series` or :class:`~numpy.ndarray`
+        Initial guesses for `data_obj`, typically obtained from `guess_deltaG`
+
+    Returns
+    -------
+    guess : :class:`~pandas.Series` or :class:`~numpy.ndarray`
+        Initial guesses with values from `fit_result` where available, of the same type and shape as `initial_guess`
+
+    """
+    previous = _fitted_deltaG(fit_result)
+    guess = np.array(initial_guess, dtype=float)
+
+    if isinstance(data_obj, HDXMeasurementSet):
+        for row, state_obj in zip(guess, data_obj.data_objs):
+            name = state_obj.name or state_obj.state
+            if name in previous:
+                values = previous[name].reindex(data_obj.r_number).to_numpy()
+                bools = np.isfinite(values)
+                row[bools] = values[bools]
+    else:
+        name = data_obj.name or data_obj.state
+        if name in previous:
+            column = previous[name]
+        elif previous.shape[1] == 1:
+            column = previous.iloc[:, 0]
+            warnings.warn(f"State {name!r} not in previous fit, using ΔG values of state {column.name!r}")
+        else:
+            column = None
+
+        if column is not None:
+            values = column.reindex(data_obj.coverage.r_number).to_numpy()
+            bools = np.isfinite(values)
+            guess[bools] = values[bools]
+
+    if isinstance(initial_guess, pd.Series):
+        return pd.Series(guess, index=initial_guess.index, name=initial_guess.name)
+    return guess
+
+
+def _fitted_deltaG(fit_result):
+    """Fitted ΔG values of a fit result or list of fit results as DataFrame with residue numbers and state names"""
+    if isinstance(fit_result, list):
+        return pd.concat([_fitted_deltaG(result) for result in fit_result], axis=1)
+    elif isinstance(fit_result, TorchBatchFitResult):
+        hdx_set = fit_result.fit_object
+        names = [data_obj.name or data_obj.state for data_obj in hdx_set.data_objs]
+        return pd.DataFrame(fit_result.deltaG.T, index=hdx_set.r_number, columns=names)
+    elif isinstance(fit_result, TorchSingleFitResult):
+        series = fit_result.fit_object
+        return pd.DataFrame({series.name or series.state: fit_result.deltaG}, index=series.coverage.r_number)
+    else:
+        raise TypeError(f"Invalid type {type(fit_result)!r} for 'fit_result'")
+
+
 def fit_gibbs_global(data_object, initial_guess, r1=2, epochs=100000, patience=50, stop_loss=0.05,
-               optimizer='SGD', **optimizer_kwargs):
+               optimizer='SGD', kernel='eager', checkpoint=None, checkpoint_interval=1000, resume=False, prune=False,
+               weighted=False, lr_probe=False, rel_tol=None, grad_tol=None, scheduler=None, scheduler_kwargs=None,
+               progress=None, **optimizer_kwargs):
     #todo @tejas: Missing docstring
-    """Pytorch global fitting"""
+    """Pytorch global fitting
 
-    tensors = data_object.get_tensors()
+    If `prune` is ``True``, only ΔG of exchanging residues are fitted, with neighbouring exchanging residues adjacent
+    in the regularizer and r1 scaled by (N_exchanging - 1) / (N_residues - 1) to keep the same penalty per step. The
+    remaining residues are linearly interpolated, which gives the same optimum as the unpruned fit.
+
+    If `weighted` is ``True``, squared residuals are weighted by the inverse variance of the uptake values
+    (see :func:`~pyhdx.fitting_torch.uptake_weights`), which requires an `uptake_sd` field in the peptide data, for
+    example after :meth:`~pyhdx.models.PeptideMasterTable.aggregate`.
+
+    If `lr_probe` is ``True`` or a tuple of factors, the learning rate of the 'SGD' optimizer is first selected by
+    :func:`probe_learning_rate` and the probe results are added to the metadata as 'lr_probe'.
+
+    If a `checkpoint` file is given the optimization state is saved to it periodically. With `resume` set to ``True``
+    the fit continues from an existing checkpoint, which must have been written by a fit with the same data and
+    settings (see :func:`run_optimizer`). Fits with `lr_probe` resume with the probed learning rate of the checkpoint.
+
+    Relative and gradient norm tolerances `rel_tol` and `grad_tol` and the learning rate `scheduler` are passed to
+    :func:`run_optimizer` and are not available with the 'FISTA' optimizer. Progress of the fit is reported to
+    `progress` (see :class:`~pyhdx.support.ProgressReporter`).
+    """
+    if weighted and kernel != 'eager':
+        raise ValueError("Weighted fits are only available with the 'eager' kernel")
+    if optimizer == 'FISTA' and (rel_tol or grad_tol or scheduler):
+        raise ValueError("Tolerances 'rel_tol', 'grad_tol' and schedulers are not available with 'FISTA'")
+
+    tensors = data_object.get_tensors(exchanges=prune)
     inputs = [tensors[key] for key in ['temperature', 'X', 'k_int', 'timepoints']]
     output_data = tensors['uptake']
 
@@ -321,33 +1226,76 @@ def fit_gibbs_global(data_object, initial_guess, r1=2, epochs=100000, patience=5
         initial_guess = initial_guess.to_numpy()
 
     assert len(initial_guess) == data_object.Nr, "Invalid length of initial guesses"
+    if prune:
+        exchanges = data_object.coverage['exchanges'].to_numpy()
+        initial_guess = initial_guess[exchanges]
+        r1 = r1 * (exchanges.sum() - 1) / (data_object.Nr - 1)
     #todo dtype config
     dtype = torch.float64
     deltaG_par = torch.nn.Parameter(torch.tensor(initial_guess, dtype=dtype).unsqueeze(-1))  #reshape (nr, 1)
     #deltaG_par = torch.nn.Parameter(torch.Tensor(initial_guess).unsqueeze(-1))
 
     model = DeltaGFit(deltaG_par)
-    criterion = torch.nn.MSELoss(reduction='sum')
+    if weighted:
+        weights = uptake_weights(torch.tensor(data_object.uptake_corrected_sd.T, dtype=dtype))
+        criterion = partial(weighted_mse_loss, weights)
+    else:
+        criterion = torch.nn.MSELoss(reduction='sum')
 
     # Take default optimizer kwargs and update them with supplied kwargs
     optimizer_kwargs = {**optimizer_defaults.get(optimizer, {}), **optimizer_kwargs}  # Take defaults and override with user-specified
-    optimizer_klass = getattr(torch.optim, optimizer)
 
     reg_func = partial(regularizer_1d, r1)
 
+    metadata, fingerprint = {}, None
+    if lr_probe:
+        if optimizer != 'SGD':
+            raise ValueError("Learning rate probing is only available for the 'SGD' optimizer")
+        if checkpoint is not None:
+            # Fingerprint before probing, as the probe changes the initial ΔG values and learning rate
+            fingerprint = checkpoint_fingerprint(inputs, output_data, model.deltaG, optimizer_kwargs, criterion,
+                                                 reg_func, lr_probe, scheduler, scheduler_kwargs)
+        optimizer_kwargs['lr'], metadata['lr_probe'] = _probe_or_resume(lr_probe, checkpoint if resume else None,
+                                                                        fingerprint, inputs, output_data,
+                                                                        optimizer_kwargs, model, criterion, reg_func)
+
     # returned_model is the same object as model
-    mse_loss, total_loss, returned_model = run_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs,
-                                                         model, criterion, reg_func, epochs=epochs,
-                                                         patience=patience, stop_loss=stop_loss)
+    if optimizer == 'FISTA':
+        prox_func = partial(prox_1d, r1)
+        mse_loss, total_loss, returned_model = run_proximal_optimizer(inputs, output_data, model, criterion, reg_func,
+                                                                      prox_func, epochs=epochs, patience=patience,
+                                                                      stop_loss=stop_loss, checkpoint=checkpoint,
+                                                                      checkpoint_interval=checkpoint_interval,
+                                                                      resume=resume, progress=progress,
+                                                                      **optimizer_kwargs)
+    else:
+        optimizer_klass = getattr(torch.optim, optimizer)
+        checkpoint_metadata = _probe_metadata(metadata['lr_probe']) if lr_probe else None
+        mse_loss, total_loss, returned_model = run_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs,
+                                                             model, criterion, reg_func, epochs=epochs,
+                                                             patience=patience, stop_loss=stop_loss, kernel=kernel,
+                                                             checkpoint=checkpoint,
+                                                             checkpoint_interval=checkpoint_interval, resume=resume,
+                                                             fingerprint=fingerprint,
+                                                             checkpoint_metadata=checkpoint_metadata,
+                                                             rel_tol=rel_tol, grad_tol=grad_tol, scheduler=scheduler,
+                                                             scheduler_kwargs=scheduler_kwargs, progress=progress)
+
+    if prune:
+        r_number = data_object.coverage.r_number
+        deltaG = np.interp(r_number, r_number[exchanges], model.deltaG.detach().numpy().squeeze(-1))
+        model = DeltaGFit(torch.nn.Parameter(torch.tensor(deltaG, dtype=dtype).unsqueeze(-1)))
 
     result = TorchSingleFitResult(data_object, model,
-                                  mse_loss=mse_loss, total_loss=total_loss)
+                                  mse_loss=mse_loss, total_loss=total_loss, **metadata)
 
     return result
 
 
 def fit_gibbs_global_batch(hdx_set, initial_guess, r1=2, r2=5, epochs=100000, patience=50, stop_loss=0.05,
-               optimizer='SGD', **optimizer_kwargs):
+               optimizer='SGD', kernel='eager', checkpoint=None, checkpoint_interval=1000, resume=False,
+               stop_per_state=False, weighted=False, lr_probe=False, rel_tol=None, grad_tol=None, scheduler=None,
+               scheduler_kwargs=None, progress=None, **optimizer_kwargs):
 
     """
 
@@ -359,12 +1307,41 @@ def fit_gibbs_global_batch(hdx_set, initial_guess, r1=2, r2=5, epochs=100000, pa
     patience
     stop_loss
     optimizer
+    kernel
+    checkpoint
+    checkpoint_interval
+    resume : :obj:`bool`
+        If ``True``, resume from an existing `checkpoint` written by a fit with the same data and settings (see
+        :func:`fit_gibbs_global`).
+    stop_per_state : :obj:`bool`
+        If ``True``, convergence is tracked per state with threshold `stop_loss` / N_states and converged states are
+        frozen (see :func:`run_batch_optimizer`). Per-state loss histories and epoch counts are added to the metadata.
+        Not available with the 'FISTA' optimizer, compiled kernels or checkpoints.
+    weighted : :obj:`bool`
+        If ``True``, squared residuals are weighted by the inverse variance of the uptake values (see
+        :func:`fit_gibbs_global`). Weights are normalized over all states. Only available with the 'eager' kernel.
+    lr_probe : :obj:`bool` or :obj:`tuple`
+        If ``True`` or a tuple of factors, the learning rate of the 'SGD' optimizer is first selected by
+        :func:`probe_learning_rate`. Probe results are added to the metadata as 'lr_probe'.
+    rel_tol : :obj:`float`, optional
+        Relative tolerance of the loss decrease (see :func:`run_optimizer`).
+    grad_tol : :obj:`float`, optional
+        Tolerance of the gradient norm (see :func:`run_optimizer`).
+    scheduler : :obj:`str`, optional
+        Learning rate scheduler, 'plateau' or 'cosine' (see :func:`run_optimizer`).
+    scheduler_kwargs : :obj:`dict`, optional
+        Keyword arguments for the scheduler.
+    progress : :class:`~pyhdx.support.ProgressReporter`, optional
+        Reporter for the progress of the fit.
     optimizer_kwargs
 
     Returns
     -------
     """
     # todo still some repeated code with fit_gibbs single
+    if weighted and kernel != 'eager':
+        raise ValueError("Weighted fits are only available with the 'eager' kernel")
+
     tensors = hdx_set.get_tensors()
     inputs = [tensors[key] for key in ['temperature', 'X', 'k_int', 'timepoints']]
     output_data = tensors['uptake']
@@ -375,23 +1352,82 @@ def fit_gibbs_global_batch(hdx_set, initial_guess, r1=2, r2=5, epochs=100000, pa
     deltaG_par = torch.nn.Parameter(torch.tensor(initial_guess, dtype=dtype).reshape(hdx_set.Ns, hdx_set.Nr, 1))
 
     model = DeltaGFit(deltaG_par)
-    criterion = torch.nn.MSELoss(reduction='sum')
+    if weighted:
+        # Padded entries have zero residuals and are excluded from the normalization of the weights
+        spt = torch.tensor(hdx_set.masks['spt'])
+        weights = torch.zeros_like(output_data)
+        weights[spt] = uptake_weights(torch.tensor(hdx_set.uptake_corrected_sd, dtype=dtype)[spt])
+        criterion = partial(weighted_mse_loss, weights)
+    else:
+        weights = torch.ones_like(output_data)
+        criterion = torch.nn.MSELoss(reduction='sum')
 
     # Take default optimizer kwargs and update them with supplied kwargs
     optimizer_kwargs = {**optimizer_defaults.get(optimizer, {}), **optimizer_kwargs}  # Take defaults and override with user-specified
-    optimizer_klass = getattr(torch.optim, optimizer)
 
-    reg_func = partial(regularizer_2d, r1, r2)
-    mse_loss, total_loss, returned_model = run_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs,
-                                                         model, criterion, reg_func, epochs=epochs,
-                                                         patience=patience, stop_loss=stop_loss)
+    metadata, fingerprint = {}, None
+    if lr_probe:
+        if optimizer != 'SGD':
+            raise ValueError("Learning rate probing is only available for the 'SGD' optimizer")
+        reg_func = partial(regularizer_2d, r1, r2)
+        if checkpoint is not None:
+            # Fingerprint before probing, as the probe changes the initial ΔG values and learning rate
+            fingerprint = checkpoint_fingerprint(inputs, output_data, model.deltaG, optimizer_kwargs, criterion,
+                                                 reg_func, lr_probe, scheduler, scheduler_kwargs)
+        optimizer_kwargs['lr'], metadata['lr_probe'] = _probe_or_resume(lr_probe, checkpoint if resume else None,
+                                                                        fingerprint, inputs, output_data,
+                                                                        optimizer_kwargs, model, criterion, reg_func)
+
+    if (optimizer == 'FISTA' or stop_per_state) and (rel_tol or grad_tol or scheduler):
+        raise ValueError("Tolerances 'rel_tol', 'grad_tol' and schedulers are not available with 'FISTA' or "
+                         "per-state stopping")
+
+    if stop_per_state:
+        if optimizer == 'FISTA' or kernel != 'eager' or checkpoint is not None:
+            raise ValueError("Per-state stopping is not available with 'FISTA', compiled kernels or checkpoints")
+
+        criterion = lambda output, target, weights: torch.sum(weights * (output - target) ** 2, dim=(1, 2))
+        reg_func = partial(regularizer_2d_per_state, r1, r2)
+        optimizer_klass = getattr(torch.optim, optimizer)
+        state_mse_loss, state_total_loss, n_epochs, returned_model = \
+            run_batch_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs, model, criterion, reg_func,
+                                epochs=epochs, patience=patience, stop_loss=stop_loss / hdx_set.Ns,
+                                weights=weights, progress=progress)
+
+        result = TorchBatchFitResult(hdx_set, model, mse_loss=state_mse_loss.sum(axis=1),
+                                     total_loss=state_total_loss.sum(axis=1), state_mse_loss=state_mse_loss,
+                                     state_total_loss=state_total_loss, n_epochs=n_epochs, **metadata)
+        return result
 
-    result = TorchBatchFitResult(hdx_set, model, mse_loss=mse_loss, total_loss=total_loss)
+    reg_func = partial(regularizer_2d, r1, r2)
+    if optimizer == 'FISTA':
+        prox_func = partial(prox_2d, r1, r2)
+        mse_loss, total_loss, returned_model = run_proximal_optimizer(inputs, output_data, model, criterion, reg_func,
+                                                                      prox_func, epochs=epochs, patience=patience,
+                                                                      stop_loss=stop_loss, checkpoint=checkpoint,
+                                                                      checkpoint_interval=checkpoint_interval,
+                                                                      resume=resume, progress=progress,
+                                                                      **optimizer_kwargs)
+    else:
+        optimizer_klass = getattr(torch.optim, optimizer)
+        checkpoint_metadata = _probe_metadata(metadata['lr_probe']) if lr_probe else None
+        mse_loss, total_loss, returned_model = run_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs,
+                                                             model, criterion, reg_func, epochs=epochs,
+                                                             patience=patience, stop_loss=stop_loss, kernel=kernel,
+                                                             checkpoint=checkpoint,
+                                                             checkpoint_interval=checkpoint_interval, resume=resume,
+                                                             fingerprint=fingerprint,
+                                                             checkpoint_metadata=checkpoint_metadata,
+                                                             rel_tol=rel_tol, grad_tol=grad_tol, scheduler=scheduler,
+                                                             scheduler_kwargs=scheduler_kwargs, progress=progress)
+
+    result = TorchBatchFitResult(hdx_set, model, mse_loss=mse_loss, total_loss=total_loss, **metadata)
     return result
 
 
 def fit_gibbs_global_batch_aligned(hdx_set, initial_guess, r1=2, r2=5, epochs=100000, patience=50, stop_loss=0.05,
-               optimizer='SGD', **optimizer_kwargs):
+               optimizer='SGD', kernel='eager', checkpoint=None, checkpoint_interval=1000, resume=False,
+               **optimizer_kwargs):
 
     """
 
@@ -403,6 +1439,10 @@ def fit_gibbs_global_batch_aligned(hdx_set, initial_guess, r1=2, r2=5, epochs=10
     patience
     stop_loss
     optimizer
+    kernel
+    checkpoint
+    checkpoint_interval
+    resume
     optimizer_kwargs
 
     Returns
@@ -435,12 +1475,575 @@ def fit_gibbs_global_batch_aligned(hdx_set, initial_guess, r1=2, r2=5, epochs=10
     reg_func = partial(regularizer_2d_aligned, r1, r2, indices)
     mse_loss, total_loss, returned_model = run_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs,
                                                          model, criterion, reg_func, epochs=epochs,
-                                                         patience=patience, stop_loss=stop_loss)
+                                                         patience=patience, stop_loss=stop_loss, kernel=kernel,
+                                                         checkpoint=checkpoint, checkpoint_interval=checkpoint_interval,
+                                                         resume=resume)
 
     result = TorchBatchFitResult(hdx_set, model, mse_loss=mse_loss, total_loss=total_loss)
     return result
 
 
+def fit_gibbs_global_blocks(data_object, initial_guess, r1=2, levels=None, epochs=100000, patience=50, stop_loss=0.05,
+                            optimizer='SGD', **optimizer_kwargs):
+    """
+    Coarse-to-fine global fit, where ΔG is first fitted on blocks of residues and then refined at residue resolution.
+
+    At each level ΔG values are shared within blocks of consecutive residues, such that the number of parameters is
+    small. The fitted values are unfolded to initialize the next level and finally all residues are fitted
+    independently with the same loss as :func:`fit_gibbs_global`.
+
+    Parameters
+    ----------
+    data_object : :class:`~pyhdx.models.KineticsSeries`
+        HDX measurement to fit
+    initial_guess : :class:`~pandas.Series` or :class:`~numpy.ndarray`
+        Initial guesses of ΔG per residue
+    r1 : :obj:`float`
+        Regularizer value along the residue axis
+    levels : :obj:`list`, optional
+        List of block lengths per level, from coarse to fine. Each list of block lengths should sum to the number of
+        residues. By default the blocks from :func:`~pyhdx.support.get_reduced_blocks` and
+        :func:`~pyhdx.support.get_original_blocks` are used.
+    epochs : :obj:`int`
+        Maximum number of epochs per level
+    patience : :obj:`int`
+        Number of epochs where the loss decrease is below `stop_loss` before stopping
+    stop_loss : :obj:`float`
+        Threshold loss difference below which to stop fitting.
+    optimizer : :obj:`str`
+        Name of the PyTorch optimizer
+    **optimizer_kwargs
+        Keyword arguments for the optimizer, overriding the defaults
+
+    Returns
+    -------
+    fit_result : :class:`~pyhdx.fitting_torch.TorchSingleFitResult`
+        Fit result at residue resolution. Losses of all levels are concatenated, the metadata entry 'level_epochs' has
+        the number of epochs per level.
+
+    """
+    if levels is None:
+        levels = [get_reduced_blocks(data_object.coverage), get_original_blocks(data_object.coverage)]
+
+    tensors = data_object.get_tensors()
+    inputs = [tensors[key] for key in ['temperature', 'X', 'k_int', 'timepoints']]
+    output_data = tensors['uptake']
+
+    if isinstance(initial_guess, pd.Series):
+        initial_guess = initial_guess.to_numpy()
+    assert len(initial_guess) == data_object.Nr, "Invalid length of initial guesses"
+
+    dtype = torch.float64
+    criterion = torch.nn.MSELoss(reduction='sum')
+    reg_func = partial(regularizer_1d, r1)
+    optimizer_kwargs = {**optimizer_defaults.get(optimizer, {}), **optimizer_kwargs}
+    optimizer_klass = getattr(torch.optim, optimizer)
+
+    deltaG = torch.tensor(initial_guess, dtype=dtype).unsqueeze(-1)
+    mse_losses, total_losses = [], []
+    for block_length in levels:
+        if np.sum(block_length) != data_object.Nr:
+            raise ValueError("Block lengths should sum to the number of residues")
+        block_idx = np.repeat(np.arange(len(block_length)), block_length)
+        blocks = torch.zeros((data_object.Nr, len(block_length)), dtype=dtype)
+        blocks[np.arange(data_object.Nr), block_idx] = 1.
+
+        block_deltaG = torch.matmul(blocks.T, deltaG) / blocks.sum(dim=0).unsqueeze(-1)  # Mean ΔG per block
+        model = BlockDeltaGFit(torch.nn.Parameter(block_deltaG), blocks)
+        mse_loss, total_loss, model = run_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs, model,
+                                                    criterion, reg_func, epochs=epochs, patience=patience,
+                                                    stop_loss=stop_loss)
+        mse_losses.append(mse_loss[1:])
+        total_losses.append(total_loss[1:])
+        deltaG = model.deltaG.detach()
+
+    model = DeltaGFit(torch.nn.Parameter(deltaG.clone()))
+    mse_loss, total_loss, model = run_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs, model,
+                                                criterion, reg_func, epochs=epochs, patience=patience,
+                                                stop_loss=stop_loss)
+    mse_losses.append(mse_loss[1:])
+    total_losses.append(total_loss[1:])
+
+    level_epochs = [len(loss) for loss in mse_losses]
+    result = TorchSingleFitResult(data_object, model, mse_loss=np.concatenate([[np.inf], *mse_losses]),
+                                  total_loss=np.concatenate([[np.inf], *total_losses]), level_epochs=level_epochs)
+
+    return result
+
+
+def fit_gibbs_global_independent(hdx_set, initial_guess, r1=2, epochs=100000, patience=50, stop_loss=0.05,
+                                 optimizer='SGD', progress=None, **optimizer_kwargs):
+    """
+    Fits the states of a :class:`~pyhdx.models.HDXMeasurementSet` independently, as one vectorized batch.
+
+    States are not coupled by a regularizer along the sample axis; the regularizer along the residue axis is applied
+    per state and each state stops independently when it converges. The results are equivalent to separate
+    :func:`fit_gibbs_global` fits of each state.
+
+    Parameters
+    ----------
+    hdx_set : :class:`~pyhdx.models.HDXMeasurementSet`
+        HDX measurements to fit
+    initial_guess : :class:`~numpy.ndarray`
+        Initial guesses of ΔG (N_states, N_residues)
+    r1 : :obj:`float`
+        Regularizer value along the residue axis
+    epochs : :obj:`int`
+        Maximum number of epochs
+    patience : :obj:`int`
+        Number of epochs where the loss decrease is below `stop_loss` before a state is converged
+    stop_loss : :obj:`float`
+        Threshold loss difference below which to stop fitting.
+    optimizer : :obj:`str`
+        Name of the PyTorch optimizer
+    progress : :class:`~pyhdx.support.ProgressReporter`, optional
+        Reporter for the progress of the fit
+    **optimizer_kwargs
+        Keyword arguments for the optimizer, overriding the defaults
+
+    Returns
+    -------
+    fit_results : :obj:`list`
+        List of :class:`~pyhdx.fitting_torch.TorchSingleFitResult`, one per state
+
+    """
+    tensors = hdx_set.get_tensors()
+    inputs = [tensors[key] for key in ['temperature', 'X', 'k_int', 'timepoints']]
+    output_data = tensors['uptake']
+
+    assert initial_guess.shape == (hdx_set.Ns, hdx_set.Nr), "Invalid shape of initial guesses"
+
+    dtype = torch.float64
+    deltaG_par = torch.nn.Parameter(torch.tensor(initial_guess, dtype=dtype).reshape(hdx_set.Ns, hdx_set.Nr, 1))
+
+    model = DeltaGFit(deltaG_par)
+    criterion = lambda output, target: torch.sum((output - target) ** 2, dim=(1, 2))
+
+    sr_mask = torch.tensor(hdx_set.masks['sr'])
+    diff_mask = (sr_mask[:, :-1] & sr_mask[:, 1:]).unsqueeze(-1)
+    reg_func = partial(regularizer_1d_independent, r1, diff_mask)
+
+    optimizer_kwargs = {**optimizer_defaults.get(optimizer, {}), **optimizer_kwargs}
+    optimizer_klass = getattr(torch.optim, optimizer)
+    mse_loss, total_loss, n_epochs, model = run_batch_optimizer(inputs, output_data, optimizer_klass,
+                                                                optimizer_kwargs, model, criterion, reg_func,
+                                                                epochs=epochs, patience=patience, stop_loss=stop_loss,
+                                                                progress=progress)
+
+    results = []
+    for i, data_obj in enumerate(hdx_set.data_objs):
+        i0 = data_obj.coverage.interval[0] - hdx_set.interval[0]
+        i1 = data_obj.coverage.interval[1] - hdx_set.interval[0]
+        state_model = DeltaGFit(torch.nn.Parameter(model.deltaG.detach()[i, i0:i1].clone()))
+        result = TorchSingleFitResult(data_obj, state_model, mse_loss=mse_loss[:n_epochs[i] + 1, i],
+                                      total_loss=total_loss[:n_epochs[i] + 1, i])
+        results.append(result)
+
+    return results
+
+
+def _fit_section(inputs, output_data, initial_guess, r1, epochs=100000, patience=50, stop_loss=0.05, optimizer='SGD',
+                 **optimizer_kwargs):
+    """Fits ΔG of a single coverage section, returns fitted ΔG and loss arrays as :class:`~numpy.ndarray`"""
+    dtype = torch.float64
+    model = DeltaGFit(torch.nn.Parameter(torch.tensor(initial_guess, dtype=dtype).unsqueeze(-1)))
+    criterion = torch.nn.MSELoss(reduction='sum')
+    reg_func = partial(regularizer_1d, r1) if len(initial_guess) > 1 else lambda param: 0.
+
+    optimizer_kwargs = {**optimizer_defaults.get(optimizer, {}), **optimizer_kwargs}
+    if optimizer == 'FISTA':
+        prox_func = partial(prox_1d, r1)
+        mse_loss, total_loss, model = run_proximal_optimizer(inputs, output_data, model, criterion, reg_func,
+                                                             prox_func, epochs=epochs, patience=patience,
+                                                             stop_loss=stop_loss, **optimizer_kwargs)
+    else:
+        optimizer_klass = getattr(torch.optim, optimizer)
+        mse_loss, total_loss, model = run_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs, model,
+                                                    criterion, reg_func, epochs=epochs, patience=patience,
+                                                    stop_loss=stop_loss)
+
+    return model.deltaG.detach().numpy().squeeze(-1), mse_loss.astype(float), total_loss.astype(float)
+
+
+def fit_gibbs_global_sections(data_object, initial_guess, r1=2, gap_size=-1, client=None, epochs=100000, patience=50,
+                              stop_loss=0.05, optimizer='SGD', **optimizer_kwargs):
+    """
+    Global fit where the protein is split into sections separated by coverage gaps, which are fitted independently.
+
+    Peptides in different sections (see :meth:`~pyhdx.models.Coverage.get_sections`) share no residues, such that the
+    sections are only coupled by the regularizer across the gaps. This coupling is dropped and each section is fitted
+    as an independent subproblem with regularizer r1 * (N_section - 1) / (N_residues - 1), which gives the same
+    penalty per residue step as :func:`fit_gibbs_global`. ΔG values of residues in gaps are linearly interpolated
+    between the flanking sections.
+
+    Parameters
+    ----------
+    data_object : :class:`~pyhdx.models.KineticsSeries`
+        HDX measurement to fit
+    initial_guess : :class:`~pandas.Series` or :class:`~numpy.ndarray`
+        Initial guesses of ΔG per residue
+    r1 : :obj:`float`
+        Regularizer value along the residue axis
+    gap_size : :obj:`int`
+        Gap size passed to :meth:`~pyhdx.models.Coverage.get_sections`
+    client : :class:`~dask.distributed.Client`, :class:`~concurrent.futures.Executor` or :obj:`str`, optional
+        Client or executor (eg :class:`~concurrent.futures.ProcessPoolExecutor`) to fit the sections in parallel, or
+        'worker_client' when called from a dask worker. If `None`, sections are fitted sequentially.
+    epochs : :obj:`int`
+        Maximum number of epochs per section
+    patience : :obj:`int`
+        Number of epochs where the loss decrease is below `stop_loss` before stopping
+    stop_loss : :obj:`float`
+        Threshold loss difference below which to stop fitting.
+    optimizer : :obj:`str`
+        Name of the PyTorch optimizer, or 'FISTA'
+    **optimizer_kwargs
+        Keyword arguments for the optimizer, overriding the defaults
+
+    Returns
+    -------
+    fit_result : :class:`~pyhdx.fitting_torch.TorchSingleFitResult`
+        Stitched fit result. Losses are summed over sections, where sections which converged early contribute their
+        final loss. The metadata entry 'sections' has the fitted intervals.
+
+    """
+    tensors = data_object.get_tensors()
+    temperature, X, k_int, timepoints, uptake = [tensors[key] for key in
+                                                 ['temperature', 'X', 'k_int', 'timepoints', 'uptake']]
+
+    if isinstance(initial_guess, pd.Series):
+        initial_guess = initial_guess.to_numpy()
+    assert len(initial_guess) == data_object.Nr, "Invalid length of initial guesses"
+
+    r_number = data_object.coverage.r_number
+    peptides = data_object.coverage.data
+    sections = data_object.coverage.get_sections(gap_size=gap_size)
+
+    args_list, r_masks = [], []
+    for start, end in sections:
+        r_mask = (r_number >= start) & (r_number < end)
+        p_mask = (peptides['start'] >= start) & (peptides['end'] <= end)
+        inputs = [temperature, X[p_mask][:, r_mask], k_int[r_mask], timepoints]
+        r1_section = r1 * (r_mask.sum() - 1) / (data_object.Nr - 1)
+        args_list.append((inputs, uptake[p_mask], initial_guess[r_mask], r1_section))
+        r_masks.append(r_mask)
+
+    kwargs = dict(epochs=epochs, patience=patience, stop_loss=stop_loss, optimizer=optimizer, **optimizer_kwargs)
+    if client is None:
+        results = [_fit_section(*args, **kwargs) for args in args_list]
+    elif isinstance(client, Executor):
+        futures = [client.submit(_fit_section, *args, **kwargs) for args in args_list]
+        results = [future.result() for future in futures]
+    elif isinstance(client, Client):
+        futures = [client.submit(_fit_section, *args, **kwargs, pure=False) for args in args_list]
+        results = client.gather(futures)
+    elif client == 'worker_client':
+        with worker_client() as client:
+            futures = [client.submit(_fit_section, *args, **kwargs, pure=False) for args in args_list]
+            results = client.gather(futures)
+    else:
+        raise ValueError(f"Invalid value for 'client': {client!r}")
+
+    deltaG = np.full(data_object.Nr, np.nan)
+    for r_mask, (section_deltaG, *_) in zip(r_masks, results):
+        deltaG[r_mask] = section_deltaG
+    fitted = ~np.isnan(deltaG)
+    deltaG[~fitted] = np.interp(r_number[~fitted], r_number[fitted], deltaG[fitted])
+
+    n_epochs = max(len(mse_loss) for _, mse_loss, _ in results)
+    pad = lambda loss: np.pad(loss, (0, n_epochs - len(loss)), mode='edge')
+    mse_loss = np.sum([pad(mse_loss) for _, mse_loss, _ in results], axis=0)
+    total_loss = np.sum([pad(total_loss) for _, _, total_loss in results], axis=0)
+
+    model = DeltaGFit(torch.nn.Parameter(torch.tensor(deltaG, dtype=torch.float64).unsqueeze(-1)))
+    result = TorchSingleFitResult(data_object, model, mse_loss=mse_loss, total_loss=total_loss, sections=sections)
+
+    return result
+
+
+def regularizer_sweep(r1, r2, param):
+    """
+    Regularization losses for ΔG parameters stacked along a leading hyperparameter axis.
+
+    Parameters
+    ----------
+    r1 : :class:`~torch.Tensor`
+        Regularizer values along the residue axis, shape (K,)
+    r2 : :class:`~torch.Tensor`
+        Regularizer values along the sample axis, shape (K,). Only used for parameters of batch fits.
+    param : :class:`~torch.Tensor`
+        ΔG parameters of shape (K, Nr, 1) or (K, Ns, Nr, 1)
+
+    Returns
+    -------
+    reg_loss : :class:`~torch.Tensor`
+        Regularization loss for each of the K settings
+
+    """
+    dims = tuple(range(1, param.dim()))
+    d_ax1 = torch.abs(param[..., :-1, :] - param[..., 1:, :])
+    reg_loss = r1 * torch.mean(d_ax1, dim=dims)
+    if param.dim() == 4:
+        d_ax2 = torch.abs(param - torch.mean(param, dim=1, keepdim=True))
+        reg_loss = reg_loss + r2 * torch.mean(d_ax2, dim=dims)
+
+    return reg_loss
+
+
+def _fit_stacked(data_obj, initial_guess, r1, r2, weights=None, epochs=100000, patience=50, stop_loss=0.05,
+                 optimizer='SGD', **optimizer_kwargs):
+    """
+    Fits K independent sets of ΔG parameters, stacked along a leading axis, in one vectorized optimization.
+
+    Optional `weights` of shape (K, Np) or (K, Ns, Np) weigh the squared residuals of each peptide for each set.
+
+    Returns the model, the loss histories (summed over the K sets), the final squared residuals per peptide of shape
+    (K, Np) or (K, Ns, Np) and the final regularization losses for each set.
+    """
+
+    tensors = data_obj.get_tensors()
+    inputs = [tensors[key] for key in ['temperature', 'X', 'k_int', 'timepoints']]
+
+    K = len(r1)
+    output_data = tensors['uptake'].expand(K, *tensors['uptake'].shape)
+
+    if isinstance(initial_guess, pd.Series):
+        initial_guess = initial_guess.to_numpy()
+    shape = (data_obj.Ns, data_obj.Nr) if isinstance(data_obj, HDXMeasurementSet) else (data_obj.Nr, )
+    initial_guess = np.broadcast_to(initial_guess, (K, ) + shape)
+
+    dtype = torch.float64
+    deltaG_par = torch.nn.Parameter(torch.tensor(initial_guess, dtype=dtype).unsqueeze(-1))
+
+    model = DeltaGFit(deltaG_par)
+    if weights is None:
+        criterion = torch.nn.MSELoss(reduction='sum')
+    else:
+        weights_t = torch.tensor(weights, dtype=dtype).unsqueeze(-1)
+        criterion = lambda output, target: torch.sum(weights_t * (output - target)**2)
+
+    optimizer_kwargs = {**optimizer_defaults.get(optimizer, {}), **optimizer_kwargs}
+    optimizer_klass = getattr(torch.optim, optimizer)
+
+    r1_t = torch.tensor(r1, dtype=dtype)
+    r2_t = torch.tensor(r2, dtype=dtype)
+    reg_func = lambda param: torch.sum(regularizer_sweep(r1_t, r2_t, param))
+
+    # Loss is summed over the K settings, stop loss is scaled accordingly
+    mse_loss, total_loss, returned_model = run_optimizer(inputs, output_data, optimizer_klass, optimizer_kwargs,
+                                                         model, criterion, reg_func, epochs=epochs,
+                                                         patience=patience, stop_loss=stop_loss*K)
+
+    with torch.no_grad():
+        output = model(*inputs)
+        sq_residuals = torch.sum((output - output_data)**2, dim=-1).numpy()
+        stacked_reg_loss = regularizer_sweep(r1_t, r2_t, model.deltaG).numpy()
+
+    return model, mse_loss, total_loss, sq_residuals, stacked_reg_loss
+
+
+def fit_gibbs_global_sweep(data_obj, initial_guess, r1, r2=None, epochs=100000, patience=50, stop_loss=0.05,
+                           optimizer='SGD', **optimizer_kwargs):
+    """
+    Global fit of ΔG for a grid of regularizer values.
+
+    All regularizer settings are optimized simultaneously in one vectorized run, where the ΔG parameters have an
+    additional leading axis for the regularizer settings.
+
+    Parameters
+    ----------
+    data_obj : :class:`~pyhdx.models.KineticsSeries` or :class:`~pyhdx.models.HDXMeasurementSet`
+        Data object to fit
+    initial_guess : :class:`~numpy.ndarray`
+        Initial guesses for ΔG, shape (Nr, ) for single fits or (Ns, Nr) for batch fits
+    r1 : :obj:`iterable`
+        Values of the regularizer along the residue axis
+    r2 : :obj:`iterable`
+        Values of the regularizer along the sample axis (batch fits only). The full grid of r1 and r2 values is fitted.
+    epochs : :obj:`int`
+        Maximum number of epochs
+    patience : :obj:`int`
+        Number of epochs where stop loss should be satisfied before stopping
+    stop_loss : :obj:`float`
+        Threshold of the loss difference (per regularizer setting) below which to stop fitting
+    optimizer : :obj:`str`
+        Name of the :mod:`torch.optim` optimizer to use
+    optimizer_kwargs
+        Additional keyword arguments passed to the optimizer
+
+    Returns
+    -------
+    result : :class:`~pyhdx.fitting_torch.TorchSweepFitResult`
+
+    """
+
+    r1 = np.atleast_1d(r1).astype(float)
+    if isinstance(data_obj, HDXMeasurementSet):
+        r2 = np.atleast_1d(5. if r2 is None else r2).astype(float)
+        grid = np.array(list(product(r1, r2)))
+        r1, r2 = grid[:, 0], grid[:, 1]
+    elif r2 is not None:
+        raise ValueError("Regularizer 'r2' is only available for batch fits")
+    else:
+        r2 = np.zeros_like(r1)
+
+    model, mse_loss, total_loss, sq_residuals, sweep_reg_loss = \
+        _fit_stacked(data_obj, initial_guess, r1, r2, epochs=epochs, patience=patience, stop_loss=stop_loss,
+                     optimizer=optimizer, **optimizer_kwargs)
+    sweep_mse_loss = sq_residuals.reshape(len(r1), -1).sum(axis=1)
+
+    result = TorchSweepFitResult(data_obj, model, r1=r1, r2=r2, mse_loss=mse_loss, total_loss=total_loss,
+                                 sweep_mse_loss=sweep_mse_loss, sweep_reg_loss=sweep_reg_loss)
+
+    return result
+
+
+def fit_gibbs_global_cv(data_obj, initial_guess, r1, r2=None, n_folds=5, seed=43, epochs=100000, patience=50,
+                        stop_loss=0.05, optimizer='SGD', **optimizer_kwargs):
+    """
+    Cross-validation of the global ΔG fit by holding out subsets of peptides.
+
+    Peptides are randomly assigned to `n_folds` folds. For each fold and regularizer setting the ΔG values are fitted
+    to the remaining peptides. All folds and regularizer settings are fitted simultaneously in one vectorized run, where
+    held-out peptides are masked out of the loss.
+
+    Parameters
+    ----------
+    data_obj : :class:`~pyhdx.models.KineticsSeries` or :class:`~pyhdx.models.HDXMeasurementSet`
+        Data object to fit
+    initial_guess : :class:`~numpy.ndarray`
+        Initial guesses for ΔG, shape (Nr, ) for single fits or (Ns, Nr) for batch fits
+    r1 : :obj:`iterable`
+        Values of the regularizer along the residue axis
+    r2 : :obj:`iterable`
+        Values of the regularizer along the sample axis (batch fits only). The full grid of r1 and r2 values is fitted.
+    n_folds : :obj:`int`
+        Number of cross-validation folds
+    seed : :obj:`int`
+        Seed for the random assignment of peptides to folds
+    epochs : :obj:`int`
+        Maximum number of epochs
+    patience : :obj:`int`
+        Number of epochs where stop loss should be satisfied before stopping
+    stop_loss : :obj:`float`
+        Threshold of the loss difference (per fold and regularizer setting) below which to stop fitting
+    optimizer : :obj:`str`
+        Name of the :mod:`torch.optim` optimizer to use
+    optimizer_kwargs
+        Additional keyword arguments passed to the optimizer
+
+    Returns
+    -------
+    result : :class:`~pyhdx.fitting_torch.TorchCVFitResult`
+
+    """
+
+    r1 = np.atleast_1d(r1).astype(float)
+    if isinstance(data_obj, HDXMeasurementSet):
+        r2 = np.atleast_1d(5. if r2 is None else r2).astype(float)
+        Np_list = [d.Np for d in data_obj.data_objs]
+        grid = list(product(r1, r2, range(n_folds)))
+    elif r2 is not None:
+        raise ValueError("Regularizer 'r2' is only available for batch fits")
+    else:
+        Np_list = [data_obj.Np]
+        grid = list(product(r1, [0.], range(n_folds)))
+
+    r1_values, r2_values, folds = [np.array(arr) for arr in zip(*grid)]
+
+    # Assign peptides to folds, padded peptides of batch fits are assigned -1
+    with temporary_seed(seed):
+        fold_indices = np.full((len(Np_list), data_obj.Np), fill_value=-1)
+        for i, Np in enumerate(Np_list):
+            fold_indices[i, :Np] = np.random.permutation(Np) % n_folds
+    if not isinstance(data_obj, HDXMeasurementSet):
+        fold_indices = fold_indices[0]
+
+    test_mask = fold_indices[np.newaxis, ...] == folds.reshape(-1, *[1]*fold_indices.ndim)  # K x [Ns x] Np
+    train_mask = ~test_mask & (fold_indices >= 0)
+
+    model, mse_loss, total_loss, sq_residuals, sweep_reg_loss = \
+        _fit_stacked(data_obj, initial_guess, r1_values, r2_values, weights=train_mask.astype(float), epochs=epochs,
+                     patience=patience, stop_loss=stop_loss, optimizer=optimizer, **optimizer_kwargs)
+
+    K = len(grid)
+    sweep_mse_loss = (sq_residuals * train_mask).reshape(K, -1).sum(axis=1)
+    test_mse_loss = (sq_residuals * test_mask).reshape(K, -1).sum(axis=1)
+
+    result = TorchCVFitResult(data_obj, model, r1=r1_values, r2=r2_values, folds=folds, mse_loss=mse_loss,
+                              total_loss=total_loss, sweep_mse_loss=sweep_mse_loss, sweep_reg_loss=sweep_reg_loss,
+                              test_mse_loss=test_mse_loss)
+
+    return result
+
+
+def fit_gibbs_global_bootstrap(data_obj, initial_guess, r1=2, r2=5, n_samples=100, ci=95., seed=43, epochs=100000,
+                               patience=50, stop_loss=0.05, optimizer='SGD', **optimizer_kwargs):
+    """
+    Bootstrap estimate of ΔG confidence intervals by resampling peptides.
+
+    Each bootstrap sample draws peptides with replacement, which is implemented as integer weights on the squared
+    residuals of each peptide. The unresampled data is fitted as sample 0, which gives the point estimate of ΔG. All
+    samples are fitted simultaneously in one vectorized run.
+
+    Parameters
+    ----------
+    data_obj : :class:`~pyhdx.models.KineticsSeries` or :class:`~pyhdx.models.HDXMeasurementSet`
+        Data object to fit
+    initial_guess : :class:`~numpy.ndarray`
+        Initial guesses for ΔG, shape (Nr, ) for single fits or (Ns, Nr) for batch fits
+    r1 : :obj:`float`
+        Value of the regularizer along the residue axis
+    r2 : :obj:`float`
+        Value of the regularizer along the sample axis (batch fits only)
+    n_samples : :obj:`int`
+        Number of bootstrap samples
+    ci : :obj:`float`
+        Width of the confidence interval (percentage)
+    seed : :obj:`int`
+        Seed for the random resampling of peptides
+    epochs : :obj:`int`
+        Maximum number of epochs
+    patience : :obj:`int`
+        Number of epochs where stop loss should be satisfied before stopping
+    stop_loss : :obj:`float`
+        Threshold of the loss difference (per bootstrap sample) below which to stop fitting
+    optimizer : :obj:`str`
+        Name of the :mod:`torch.optim` optimizer to use
+    optimizer_kwargs
+        Additional keyword arguments passed to the optimizer
+
+    Returns
+    -------
+    result : :class:`~pyhdx.fitting_torch.TorchBootstrapFitResult`
+
+    """
+
+    if isinstance(data_obj, HDXMeasurementSet):
+        Np_list = [d.Np for d in data_obj.data_objs]
+    else:
+        Np_list = [data_obj.Np]
+
+    # Sample 0 weighs all peptides once, padded peptides of batch fits have zero weight
+    weights = np.zeros((n_samples + 1, len(Np_list), data_obj.Np))
+    with temporary_seed(seed):
+        for i, Np in enumerate(Np_list):
+            weights[0, i, :Np] = 1.
+            weights[1:, i, :Np] = np.random.multinomial(Np, np.ones(Np) / Np, size=n_samples)
+    if not isinstance(data_obj, HDXMeasurementSet):
+        weights = weights[:, 0, :]
+
+    r1_values = np.full(n_samples + 1, r1, dtype=float)
+    r2_values = np.full(n_samples + 1, r2 if isinstance(data_obj, HDXMeasurementSet) else 0., dtype=float)
+    model, mse_loss, total_loss, sq_residuals, reg_loss = \
+        _fit_stacked(data_obj, initial_guess, r1_values, r2_values, weights=weights, epochs=epochs,
+                     patience=patience, stop_loss=stop_loss, optimizer=optimizer, **optimizer_kwargs)
+
+    result = TorchBootstrapFitResult(data_obj, model, ci=ci, mse_loss=mse_loss, total_loss=total_loss)
+
+    return result
+
+
 """
 this might still serve some use
 def weighted_avg_linearize(self):
@@ -482,6 +2085,14 @@ class KineticsFitResult(object):
         self.results = results
         self.models = models
 
+    def __getstate__(self):
+        # Only the parameters of symfit fit results are used, which are pickled as :obj:`EmptyResult`
+        results = [EmptyResult(result.chi_squared, dict(result.params)) for result in self.results]
+        return {**self.__dict__, 'results': results}
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+
     @property
     def model_type(self):
         if np.all([isinstance(m, SingleKineticModel) for m in self.models]):
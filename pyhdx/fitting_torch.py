@@ -5,9 +5,127 @@ import torch as t
 from scipy import constants
 import numpy as np
 import pandas as pd
+import warnings
 from pyhdx.models import Protein
 
 
+
+def deltaG_uptake(deltaG, temperature, X, k_int, timepoints):
+    """
+    Calculates D-uptake per peptide from deltaG values.
+
+    Parameters
+    ----------
+    deltaG : :class:`~torch.Tensor`
+        Gibbs free energies (N_residues, 1)
+    temperature : :class:`~torch.Tensor`
+        Temperature (1,)
+    X : :class:`~torch.Tensor`
+        Coverage matrix (N_peptides, N_residues)
+    k_int : :class:`~torch.Tensor`
+        Intrinsic exchange rates (N_residues, 1)
+    timepoints : :class:`~torch.Tensor`
+        Exposure times (1, N_timepoints)
+
+    Returns
+    -------
+    uptake : :class:`~torch.Tensor`
+        D-uptake per peptide per timepoint (N_peptides, N_timepoints)
+
+    """
+
+    # Gas constant is written as literal (scipy.constants.R) as TorchScript cannot capture global floats
+    pfact = t.exp(deltaG / (8.31446261815324 * temperature))
+    uptake = 1 - t.exp(-t.matmul((k_int / (1 + pfact)), timepoints))
+    return t.matmul(X, uptake)
+
+
+def mse_kernel(deltaG, temperature, X, k_int, timepoints, uptake):
+    """Fused forward pass and sum of squared residuals, equal to `DeltaGFit` followed by `MSELoss(reduction='sum')`"""
+    output = deltaG_uptake(deltaG, temperature, X, k_int, timepoints)
+    return t.sum((output - uptake) ** 2)
+
+
+def mse_tv_kernel(deltaG, temperature, X, k_int, timepoints, uptake, r1: float):
+    """Fused :func:`mse_kernel` and total variation regularizer along the residue axis, equal to
+    :func:`~pyhdx.fitting.regularizer_1d`. Returns the sum of squared residuals and the regularization loss."""
+    mse_loss = mse_kernel(deltaG, temperature, X, k_int, timepoints, uptake)
+    reg_loss = r1 * t.mean(t.abs(deltaG[:-1] - deltaG[1:]))
+    return mse_loss, reg_loss
+
+
+def uptake_weights(uptake_sd):
+    """
+    Inverse variance weights of uptake values, normalized to a mean of one such that weighted losses are on the same
+    scale as unweighted losses. Entries without a positive standard deviation get the largest weight.
+
+    Parameters
+    ----------
+    uptake_sd : :class:`~torch.Tensor`
+        Standard deviations of the uptake values
+
+    Returns
+    -------
+    weights : :class:`~torch.Tensor`
+        Weights with the same shape as `uptake_sd`
+
+    """
+    positive = uptake_sd > 0
+    if not t.any(positive):
+        return t.ones_like(uptake_sd)
+    weights = t.zeros_like(uptake_sd)
+    weights[positive] = 1 / uptake_sd[positive] ** 2
+    weights[~positive] = weights.max()
+
+    return weights / weights.mean()
+
+
+def weighted_mse_loss(weights, output, target):
+    """Sum of squared residuals weighted by `weights`, use as criterion with `functools.partial`"""
+    return t.sum(weights * (output - target) ** 2)
+
+
+_compiled_kernels = {}
+
+
+def compile_kernel(kernel, method='script'):
+    """
+    Compiles a loss kernel with TorchScript or `torch.compile`.
+
+    Falls back to the uncompiled kernel if the requested method is not available. Compiled kernels are cached.
+
+    Parameters
+    ----------
+    kernel : :obj:`callable`
+        Loss function to compile, eg :func:`mse_kernel`
+    method : :obj:`str`
+        Compilation method, options are 'script' (TorchScript), 'compile' (`torch.compile`) or 'eager' (no compilation)
+
+    Returns
+    -------
+    compiled : :obj:`callable`
+        Compiled kernel
+    """
+
+    if method == 'eager':
+        return kernel
+    elif method not in ['script', 'compile']:
+        raise ValueError(f"Invalid value '{method}' for 'method', options are 'script', 'compile' or 'eager'")
+
+    key = (kernel, method)
+    if key not in _compiled_kernels:
+        try:
+            if method == 'script':
+                _compiled_kernels[key] = t.jit.script(kernel)
+            else:
+                _compiled_kernels[key] = t.compile(kernel)
+        except Exception as e:  # Catch all as different torch versions raise different errors
+            warnings.warn(f"Could not compile loss kernel with method '{method}', using eager mode ({e})")
+            _compiled_kernels[key] = kernel
+
+    return _compiled_kernels[key]
+
+
 class DeltaGFit(nn.Module):
     def __init__(self, deltaG):
         super(DeltaGFit, self).__init__()
@@ -22,34 +140,260 @@ class DeltaGFit(nn.Module):
 
         """
 
-        pfact = t.exp(self.deltaG / (constants.R * temperature))
-        uptake = 1 - t.exp(-t.matmul((k_int / (1 + pfact)), timepoints))
-        return t.matmul(X, uptake)
+        return deltaG_uptake(self.deltaG, temperature, X, k_int, timepoints)
+
 
+class BlockDeltaGFit(nn.Module):
+    """
+    Model with ΔG values shared within blocks of consecutive residues.
 
-def estimate_errors(series, deltaG):  #todo refactor to data_obj
+    Parameters
+    ----------
+    deltaG : :class:`~torch.nn.Parameter`
+        ΔG values per block (N_blocks, 1)
+    blocks : :class:`~torch.Tensor`
+        Indicator matrix (N_residues, N_blocks) assigning residues to blocks
+
+    """
+    def __init__(self, deltaG, blocks):
+        super(BlockDeltaGFit, self).__init__()
+        self.block_deltaG = deltaG
+        self.register_buffer('blocks', blocks)
+
+    @property
+    def deltaG(self):
+        """:class:`~torch.Tensor`: ΔG values per residue (N_residues, 1)"""
+        return t.matmul(self.blocks, self.block_deltaG)
+
+    def forward(self, temperature, X, k_int, timepoints):
+        return deltaG_uptake(self.deltaG, temperature, X, k_int, timepoints)
+
+
+def uptake_derivatives(deltaG, temperature, k_int, timepoints):
+    """
+    Analytic first and second derivatives of per-residue D-uptake with respect to deltaG.
+
+    Parameters
+    ----------
+    deltaG : :class:`~torch.Tensor`
+        Gibbs free energies (N_residues, 1)
+    temperature : :class:`~torch.Tensor`
+        Temperature (1,)
+    k_int : :class:`~torch.Tensor`
+        Intrinsic exchange rates (N_residues, 1)
+    timepoints : :class:`~torch.Tensor`
+        Exposure times (1, N_timepoints)
+
+    Returns
+    -------
+    uptake : :class:`~torch.Tensor`
+        Per-residue D-uptake (N_residues, N_timepoints)
+    grad : :class:`~torch.Tensor`
+        First derivative of uptake to deltaG (N_residues, N_timepoints)
+    curv : :class:`~torch.Tensor`
+        Second derivative of uptake to deltaG (N_residues, N_timepoints)
+
+    """
+    RT = constants.R * temperature
+    pfact = t.exp(deltaG / RT)
+    rate = k_int / (1 + pfact)
+    decay = t.exp(-rate * timepoints)
+    # d(rate)/d(deltaG) = -rate * pfact / ((1 + pfact) * RT)
+    sat = rate * pfact / (1 + pfact)
+    grad = -timepoints * decay * sat / RT
+    curv = grad * (timepoints * sat + (1 - pfact) / (1 + pfact)) / RT
+
+    return 1 - decay, grad, curv
+
+
+def banded_hessian(X, grad, curv=None, residuals=None):
+    """
+    Hessian of the sum-of-squares loss in lower banded storage.
+
+    The bandwidth is given by the widest peptide in the coverage matrix `X`. Without `curv` and `residuals` the
+    Gauss-Newton approximation 2 JᵀJ is returned, otherwise the exact Hessian. Leading batch dimensions (states) are
+    supported, in which case the Hessians of all states are returned with a common bandwidth.
+
+    Parameters
+    ----------
+    X : :class:`~torch.Tensor`
+        Coverage matrix ([N_states,] N_peptides, N_residues)
+    grad : :class:`~torch.Tensor`
+        First derivative of residue uptake to deltaG ([N_states,] N_residues, N_timepoints)
+    curv : :class:`~torch.Tensor`, optional
+        Second derivative of residue uptake to deltaG ([N_states,] N_residues, N_timepoints)
+    residuals : :class:`~torch.Tensor`, optional
+        Model output minus measured uptake ([N_states,] N_peptides, N_timepoints)
+
+    Returns
+    -------
+    ab : :class:`~numpy.ndarray`
+        Hessian in lower banded form, ``ab[..., d, j] = H[..., j + d, j]`` ([N_states,] bandwidth + 1, N_residues)
+
+    """
+    nonzero = (X != 0).numpy()
+    first = nonzero.argmax(axis=-1)
+    last = X.shape[-1] - 1 - nonzero[..., ::-1].argmax(axis=-1)
+    bandwidth = int(np.where(nonzero.any(axis=-1), last - first, 0).max())
+
+    ab = np.zeros(X.shape[:-2] + (bandwidth + 1, X.shape[-1]))
+    ab[..., 0, :] = 2 * ((X ** 2).sum(dim=-2) * (grad ** 2).sum(dim=-1)).numpy()
+    for d in range(1, bandwidth + 1):
+        overlap = (X[..., d:] * X[..., :-d]).sum(dim=-2)
+        ab[..., d, :-d] = 2 * (overlap * (grad[..., d:, :] * grad[..., :-d, :]).sum(dim=-1)).numpy()
+
+    if curv is not None and residuals is not None:
+        ab[..., 0, :] += 2 * (t.matmul(X.transpose(-1, -2), residuals) * curv).sum(dim=-1).numpy()
+
+    return ab
+
+
+def banded_inverse_diagonal(ab):
+    """
+    Diagonal of the inverse of a symmetric banded matrix by selected inversion.
+
+    Factorizes the matrix as LDLᵀ without pivoting and evaluates only the banded part of the inverse with the
+    Takahashi recurrence, at O(N bandwidth²) cost. Leading batch dimensions are processed together.
+
+    Parameters
+    ----------
+    ab : :class:`~numpy.ndarray`
+        Symmetric matrix in lower banded form, ``ab[..., d, j] = A[..., j + d, j]``
+
+    Returns
+    -------
+    diagonal : :class:`~numpy.ndarray`
+        Diagonal of the inverse of the matrix
+
+    """
+    batch_shape, (bandwidth, size) = ab.shape[:-2], (ab.shape[-2] - 1, ab.shape[-1])
+    work = np.zeros(batch_shape + (bandwidth + 1, size + bandwidth))  # Zero padding to avoid truncating the band
+    work[..., :size] = ab
+
+    row, col = np.tril_indices(bandwidth)
+    pivots = np.empty(batch_shape + (size,))
+    for j in range(size):
+        pivots[..., j] = work[..., 0, j]
+        if np.any(pivots[..., j] == 0) or not np.all(np.isfinite(pivots[..., j])):
+            raise np.linalg.LinAlgError('Zero pivot in banded LDLᵀ factorization')
+        column = work[..., 1:, j].copy()
+        work[..., 1:, j] = column / pivots[..., j, np.newaxis]
+        work[..., row - col, j + 1 + col] -= column[..., row] * work[..., 1 + col, j]
+
+    p, q = np.indices((bandwidth, bandwidth))
+    offset, start = np.abs(p - q), np.minimum(p, q) + 1
+    inverse = np.zeros(batch_shape + (bandwidth + 1, size + bandwidth))
+    for i in range(size - 1, -1, -1):
+        factor = work[..., 1:, i]
+        z = -np.einsum('...pq,...q->...p', inverse[..., offset, start + i], factor)
+        inverse[..., 1:, i] = z
+        inverse[..., 0, i] = 1 / pivots[..., i] - (factor * z).sum(axis=-1)
+
+    return inverse[..., 0, :size]
+
+
+def _banded_to_dense(ab):
+    """Dense symmetric matrix from lower banded form"""
+    size = ab.shape[-1]
+    dense = np.zeros(ab.shape[:-2] + (size, size))
+    diagonal = np.arange(size)
+    for d in range(ab.shape[-2]):
+        dense[..., diagonal[d:], diagonal[:size - d]] = ab[..., d, :size - d]
+        dense[..., diagonal[:size - d], diagonal[d:]] = ab[..., d, :size - d]
+
+    return dense
+
+
+def _inverse_diagonal(ab):
+    """Diagonal of the inverse from lower banded form, with dense inversion as fallback for zero pivots"""
+    try:
+        return banded_inverse_diagonal(ab)
+    except np.linalg.LinAlgError:
+        return np.diagonal(t.inverse(t.tensor(_banded_to_dense(ab))).numpy(), axis1=-2, axis2=-1)
+
+
+def estimate_errors(series, deltaG, method='exact'):  #todo refactor to data_obj
+    """
+    Estimate standard errors of fitted deltaG values from the curvature of the loss.
+
+    Parameters
+    ----------
+    series : :class:`~pyhdx.models.KineticsSeries`
+        HDX measurement the deltaG values were fitted to
+    deltaG : :class:`~numpy.ndarray`
+        Fitted deltaG values for all residues
+    method : :obj:`str`
+        'exact' for the analytic Hessian or 'gauss-newton' for its JᵀJ approximation.
+
+    Returns
+    -------
+    errors : :class:`~pyhdx.models.Protein`
+        Protein object with 'covariance' column for exchanging residues
+
+    """
     # boolean array to select residues which are exchanging (ie no nterminal resiudes, no prolines, no regions without coverage)
     bools = series.coverage['exchanges'].to_numpy()
     r_number = series.coverage.r_number[bools]  # Residue number which exchange
-    deltaG = t.tensor(deltaG[bools], dtype=t.float64)
+    deltaG = t.tensor(deltaG[bools], dtype=t.float64).unsqueeze(-1)
 
     tensors = series.get_tensors(exchanges=True)
+    ab = _loss_hessian(deltaG, tensors, method)
+    covariance = np.sqrt(np.abs(_inverse_diagonal(ab)))
 
-    def calc_loss(deltaG_input):
-        criterion = t.nn.MSELoss(reduction='sum')
-        pfact = t.exp(deltaG_input.unsqueeze(-1) / (constants.R * tensors['temperature']))
-        uptake = 1 - t.exp(-t.matmul((tensors['k_int'] / (1 + pfact)), tensors['timepoints']))
-        output = t.matmul(tensors['X'], uptake)
+    #todo return pd series?
+    return Protein({'covariance': covariance, 'r_number': r_number}, index='r_number')
 
-        loss = criterion(output, tensors['uptake'])
-        return loss
 
-    hessian = t.autograd.functional.hessian(calc_loss, deltaG)
-    hessian_inverse = t.inverse(-hessian)
-    covariance = np.sqrt(np.abs(np.diagonal(hessian_inverse)))
+def estimate_errors_batch(hdx_set, deltaG, method='exact'):
+    """
+    Estimate standard errors of fitted deltaG values for all states of a batch fit in one vectorized pass.
 
-    #todo return pd series?
-    return Protein({'covariance': covariance, 'r_number': r_number}, index='r_number')
+    The Hessian is block diagonal over states; the banded blocks of all states are assembled from the packed batch
+    tensors and inverted together.
+
+    Parameters
+    ----------
+    hdx_set : :class:`~pyhdx.models.HDXMeasurementSet`
+        HDX measurements the deltaG values were fitted to
+    deltaG : :class:`~numpy.ndarray`
+        Fitted deltaG values (N_states, N_residues)
+    method : :obj:`str`
+        'exact' for the analytic Hessian or 'gauss-newton' for its JᵀJ approximation.
+
+    Returns
+    -------
+    errors : :class:`~pandas.DataFrame`
+        Standard errors with residue numbers as index and states as columns, NaN for non-exchanging residues
+
+    """
+    exchanges = hdx_set.exchanges
+    tensors = hdx_set.get_tensors()
+    deltaG = t.tensor(deltaG, dtype=t.float64).unsqueeze(-1)
+
+    # Non-exchanging residues are decoupled by zeroing their derivatives and setting unit curvature
+    mask = t.tensor(exchanges).unsqueeze(-1)
+    ab = _loss_hessian(deltaG, tensors, method, mask=mask)
+    ab[:, 0, :][~exchanges] = 1.
+
+    covariance = np.sqrt(np.abs(_inverse_diagonal(ab)))
+    covariance[~exchanges] = np.nan
+
+    names = [data_obj.name or data_obj.state for data_obj in hdx_set.data_objs]
+    return pd.DataFrame(covariance.T, index=hdx_set.r_number, columns=names)
+
+
+def _loss_hessian(deltaG, tensors, method, mask=None):
+    """Banded Hessian of the sum-of-squares loss at `deltaG`, optionally with derivatives masked by `mask`"""
+    uptake, grad, curv = uptake_derivatives(deltaG, tensors['temperature'], tensors['k_int'], tensors['timepoints'])
+    if mask is not None:
+        grad, curv = grad * mask, curv * mask
+    if method == 'exact':
+        residuals = t.matmul(tensors['X'], uptake) - tensors['uptake']
+        return banded_hessian(tensors['X'], grad, curv, residuals)
+    elif method == 'gauss-newton':
+        return banded_hessian(tensors['X'], grad)
+    else:
+        raise ValueError(f"Invalid value '{method}' for 'method', options are 'exact', 'gauss-newton'")
 
 
 class TorchFitResult(object):
@@ -57,6 +401,114 @@ class TorchFitResult(object):
         self.fit_object = fit_object
         self.model = model
         self.metadata = metadata
+        self.errors = None  # Standard errors of ΔG, set by estimate_errors
+        self._output = None
+        self._tensors = None
+        self._residuals = None
+
+    def __getstate__(self):
+        # Cached output, tensors and residuals are generated again from the fit object and model
+        return {**self.__dict__, '_output': None, '_tensors': None, '_residuals': None}
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+
+    @property
+    def output(self):
+        """:class:`~pyhdx.models.Protein`: Fit output, computed on first access and cached. Includes a 'covariance'
+        column after :meth:`estimate_errors` has been called."""
+        if self._output is None:
+            self._output = self._make_output()
+        return self._output
+
+    def _make_output(self):
+        raise NotImplementedError()
+
+    def estimate_errors(self, method='exact'):
+        """
+        Estimate standard errors of the fitted ΔG values and add them to the output.
+
+        This step is separate from fitting and can be submitted to a dask cluster, in which case the returned copy
+        of the fit result holds the errors.
+
+        Parameters
+        ----------
+        method : :obj:`str`
+            'exact' for the analytic Hessian or 'gauss-newton' for its JᵀJ approximation.
+
+        Returns
+        -------
+        fit_result : :class:`TorchFitResult`
+            This fit result
+
+        """
+        self.errors = self._estimate_errors(method)
+        self._output = None
+        return self
+
+    def _estimate_errors(self, method):
+        raise NotImplementedError(f"Error estimation is not available for {self.__class__.__name__}")
+
+    @property
+    def tensors(self):
+        """:obj:`dict`: Input tensors of the fitted data object, created on first access and cached"""
+        if self._tensors is None:
+            self._tensors = self.fit_object.get_tensors()
+        return self._tensors
+
+    def predict(self, timepoints=None):
+        """
+        Predicts D-uptake of all peptides from the fitted ΔG values.
+
+        Parameters
+        ----------
+        timepoints : :class:`~numpy.ndarray`, optional
+            Exposure times at which to calculate D-uptake, either a 1D array of times for all states or, for batch fits,
+            an array of shape (N_states, N_timepoints). By default the measured exposure times are used.
+
+        Returns
+        -------
+        uptake : :class:`~numpy.ndarray`
+            D-uptake of shape (N_peptides, N_timepoints) for single fits or (N_states, N_peptides, N_timepoints) for
+            batch fits. Entries of padded peptides or timepoints of batch fits are NaN.
+
+        """
+        tensors = self.tensors
+        if timepoints is None:
+            timepoints_t = tensors['timepoints']
+        else:
+            timepoints = np.asarray(timepoints, dtype=float)
+            shape = (-1, 1, timepoints.shape[-1]) if timepoints.ndim == 2 else tensors['timepoints'].dim() * (1, )
+            timepoints_t = t.tensor(timepoints, dtype=t.float64).reshape(*shape[:-1], -1)
+
+        with t.no_grad():
+            uptake = deltaG_uptake(self.model.deltaG, tensors['temperature'], tensors['X'], tensors['k_int'],
+                                   timepoints_t).numpy()
+
+        return self._mask_padding(uptake, measured=timepoints is None)
+
+    def residuals(self):
+        """
+        Residuals of the predicted D-uptake with respect to the measured D-uptake (`uptake_corrected`).
+
+        Returns
+        -------
+        residuals : :class:`~numpy.ndarray`
+            Residuals with the same shape as returned by :meth:`predict`. The array is cached and should not be
+            modified.
+
+        """
+        if self._residuals is None:
+            self._residuals = self.predict() - self._mask_padding(self.tensors['uptake'].numpy(), measured=True)
+        return self._residuals
+
+    def _mask_padding(self, uptake, measured):
+        """Sets entries of `uptake` which correspond to padding of the data object to NaN"""
+        return uptake
+
+    def __call__(self, timepoints):
+        """Predicted D-uptake at `timepoints`, see :meth:`predict`"""
+        return self.predict(timepoints)
 
     @property
     def mse_loss(self):
@@ -99,8 +551,7 @@ class TorchSingleFitResult(TorchFitResult):
     def temperature(self):
         return self.series.temperature
 
-    @property
-    def output(self):
+    def _make_output(self):
         out_dict = {}
         out_dict['r_number'] = self.series.coverage.r_number
         out_dict['sequence'] = self.series.coverage['sequence'].to_numpy()
@@ -114,34 +565,22 @@ class TorchSingleFitResult(TorchFitResult):
         #todo add possibility to add append series to protein?
         #todo update order of columns
         protein = Protein(out_dict, index='r_number')
-        protein_cov = estimate_errors(self.fit_object, self.deltaG)
-        protein = protein.join(protein_cov)
+        if self.errors is not None:
+            protein = protein.join(self.errors)
         return protein
 
-    def __call__(self, timepoints):
-        """output: Np x Nt array"""
-        #todo fix and tests
-        with t.no_grad():
-            #tensors = self.series.get_tensors()
-            temperature = t.Tensor([self.temperature])
-            X = t.Tensor(self.series.coverage.X)  # Np x Nr
-            k_int = t.Tensor(self.series.coverage['k_int'].to_numpy()).unsqueeze(-1)  # Nr x 1
-            timepoints = t.Tensor(timepoints).unsqueeze(0)  # 1 x Nt
-            inputs = [temperature, X, k_int, timepoints]
-
-            output = self.model(*inputs)
-        return output.detach().numpy()
+    def _estimate_errors(self, method):
+        return estimate_errors(self.fit_object, self.deltaG, method=method)
 
 
 class TorchBatchFitResult(TorchFitResult):
     def __init__(self, *args, **kwargs):
         super(TorchBatchFitResult, self).__init__(*args, **kwargs)
 
-    @property
-    def output(self):
-        #todo directly create dataframe
-
-        quantities = ['_deltaG', 'deltaG', 'covariance', 'pfact']
+    def _make_output(self):
+        quantities = ['_deltaG', 'deltaG', 'pfact']
+        if self.errors is not None:
+            quantities.insert(2, 'covariance')
 
         names = [data_obj.name or data_obj.state for data_obj in self.fit_object.data_objs]
 
@@ -154,24 +593,191 @@ class TorchBatchFitResult(TorchFitResult):
         g_values_nan[~self.fit_object.exchanges] = np.nan
         pfact = np.exp(g_values / (constants.R * self.fit_object.temperature[:, np.newaxis]))
 
-        output_data[:, 0::len(quantities)] = g_values.T
-        output_data[:, 1::len(quantities)] = g_values_nan.T
+        output_data[:, quantities.index('_deltaG')::len(quantities)] = g_values.T
+        output_data[:, quantities.index('deltaG')::len(quantities)] = g_values_nan.T
+        output_data[:, quantities.index('pfact')::len(quantities)] = pfact.T
+        if self.errors is not None:
+            output_data[:, quantities.index('covariance')::len(quantities)] = self.errors.to_numpy()
 
-        for i, data_obj in enumerate(self.fit_object.data_objs):
-            #todo this could use some pandas
-            i0 = data_obj.coverage.interval[0] - self.fit_object.interval[0]
-            i1 = data_obj.coverage.interval[1] - self.fit_object.interval[0]
+        df = pd.DataFrame(output_data, index=self.fit_object.r_number, columns=col_index)
 
-            cov = estimate_errors(data_obj, g_values[i, i0:i1])  # returns a protein? should be series
-            pd_series = cov['covariance']
-            pd_series = pd_series.reindex(self.fit_object.r_number)
+        return Protein(df)
 
-            output_data[:, 2+i*len(quantities)] = pd_series.to_numpy()
+        # use multi index df: https://stackoverflow.com/questions/24290495/constructing-3d-pandas-dataframe
+
+    def _estimate_errors(self, method):
+        return estimate_errors_batch(self.fit_object, self.deltaG, method=method)
+
+    def _mask_padding(self, uptake, measured):
+        masks = self.fit_object.masks
+        uptake = uptake.astype(float, copy=True)
+        if measured:
+            uptake[~masks['spt']] = np.nan
+        else:
+            uptake[~masks['spr'].any(axis=2)] = np.nan
+        return uptake
+
+
+class TorchSweepFitResult(TorchFitResult):
+    """
+    Fit result of a regularizer sweep. ΔG parameters for each regularizer setting are stacked along the first axis.
+
+    Parameters
+    ----------
+    fit_object : :class:`~pyhdx.models.KineticsSeries` or :class:`~pyhdx.models.HDXMeasurementSet`
+        Fitted data object
+    model : :class:`DeltaGFit`
+        Fitted model with stacked ΔG parameters
+    r1 : :class:`~numpy.ndarray`
+        Regularizer values along the residue axis for each setting
+    r2 : :class:`~numpy.ndarray`
+        Regularizer values along the sample axis for each setting
+    **metadata
+        Fit metadata, includes 'sweep_mse_loss' and 'sweep_reg_loss' with final losses per setting
+
+    """
+    def __init__(self, fit_object, model, r1, r2, **metadata):
+        super(TorchSweepFitResult, self).__init__(fit_object, model, **metadata)
+        self.r1 = r1
+        self.r2 = r2
+
+    def __len__(self):
+        return len(self.r1)
 
-        output_data[:, 3::len(quantities)] = pfact.T
+    @property
+    def batch(self):
+        """:obj:`bool`: ``True`` if the fitted data object is a batch of states"""
+        return self.model.deltaG.dim() == 4
 
-        df = pd.DataFrame(output_data, index=self.fit_object.r_number, columns=col_index)
+    @property
+    def losses(self):
+        """:class:`~pandas.DataFrame`: Mean squared error and regularization losses per regularizer setting (L-curve)"""
+        df = pd.DataFrame({'r1': self.r1, 'r2': self.r2,
+                           'mse_loss': self.metadata['sweep_mse_loss'],
+                           'reg_loss': self.metadata['sweep_reg_loss']})
+        df['total_loss'] = df['mse_loss'] + df['reg_loss']
+        if not self.batch:
+            df.drop(columns='r2', inplace=True)
+
+        return df
+
+    def __getitem__(self, item):
+        """Returns the fit result of regularizer setting with index `item`"""
+        model = DeltaGFit(nn.Parameter(self.model.deltaG[item].detach().clone()))
+        metadata = {'mse_loss': np.array([self.metadata['sweep_mse_loss'][item]]),
+                    'total_loss': np.array([self.metadata['sweep_mse_loss'][item] + self.metadata['sweep_reg_loss'][item]]),
+                    'r1': self.r1[item], 'r2': self.r2[item]}
+
+        klass = TorchBatchFitResult if self.batch else TorchSingleFitResult
+        return klass(self.fit_object, model, **metadata)
+
+
+class TorchCVFitResult(TorchSweepFitResult):
+    """
+    Fit result of a cross-validation. ΔG parameters for each regularizer setting and fold are stacked along the first
+    axis.
+
+    Parameters
+    ----------
+    fit_object : :class:`~pyhdx.models.KineticsSeries` or :class:`~pyhdx.models.HDXMeasurementSet`
+        Fitted data object
+    model : :class:`DeltaGFit`
+        Fitted model with stacked ΔG parameters
+    r1 : :class:`~numpy.ndarray`
+        Regularizer values along the residue axis for each fit
+    r2 : :class:`~numpy.ndarray`
+        Regularizer values along the sample axis for each fit
+    folds : :class:`~numpy.ndarray`
+        Index of the held-out fold for each fit
+    **metadata
+        Fit metadata, includes 'test_mse_loss' with the final losses of the held-out peptides per fit
+
+    """
+    def __init__(self, fit_object, model, r1, r2, folds, **metadata):
+        super(TorchCVFitResult, self).__init__(fit_object, model, r1, r2, **metadata)
+        self.folds = folds
 
-        return Protein(df)
+    @property
+    def losses(self):
+        """:class:`~pandas.DataFrame`: Training and held-out losses per regularizer setting and fold"""
+        df = super(TorchCVFitResult, self).losses
+        df.insert(df.columns.get_loc('mse_loss'), 'fold', self.folds)
+        df['test_mse_loss'] = self.metadata['test_mse_loss']
 
-        # use multi index df: https://stackoverflow.com/questions/24290495/constructing-3d-pandas-dataframe
\ No newline at end of file
+        return df
+
+    @property
+    def cv_loss(self):
+        """:class:`~pandas.DataFrame`: Held-out mean squared error summed over all folds, per regularizer setting"""
+        by = ['r1', 'r2'] if self.batch else ['r1']
+        return self.losses.groupby(by)[['test_mse_loss']].sum()
+
+
+class TorchBootstrapFitResult(TorchFitResult):
+    """
+    Fit result of a bootstrap resampling. ΔG parameters for each sample are stacked along the first axis, where sample
+    0 is the fit of the unresampled data and is used as point estimate for the output.
+
+    Parameters
+    ----------
+    fit_object : :class:`~pyhdx.models.KineticsSeries` or :class:`~pyhdx.models.HDXMeasurementSet`
+        Fitted data object
+    model : :class:`DeltaGFit`
+        Fitted model with stacked ΔG parameters
+    ci : :obj:`float`
+        Width of the confidence interval (percentage)
+    **metadata
+        Fit metadata
+
+    """
+    def __init__(self, fit_object, model, ci=95., **metadata):
+        super(TorchBootstrapFitResult, self).__init__(fit_object, model, **metadata)
+        self.ci = ci
+
+    def __len__(self):
+        """Number of bootstrap samples, excluding the fit of the unresampled data"""
+        return self.model.deltaG.shape[0] - 1
+
+    @property
+    def batch(self):
+        """:obj:`bool`: ``True`` if the fitted data object is a batch of states"""
+        return self.model.deltaG.dim() == 4
+
+    @property
+    def percentiles(self):
+        """:class:`~numpy.ndarray`: Median, lower and upper bound of ΔG values over the bootstrap samples"""
+        q = [50, 50 - self.ci / 2, 50 + self.ci / 2]
+        return np.percentile(self.deltaG[1:], q, axis=0)
+
+    def _make_output(self):
+        quantities = ['_deltaG', 'deltaG', 'pfact', 'deltaG_lower', 'deltaG_upper']
+        _deltaG = self.deltaG[0]  # [Ns x] Nr
+        bounds = self.percentiles[1:]  # 2 x [Ns x] Nr
+
+        if self.batch:
+            exchanges = self.fit_object.exchanges
+            deltaG = _deltaG.copy()
+            deltaG[~exchanges] = np.nan
+            bounds[:, ~exchanges] = np.nan
+            pfact = np.exp(deltaG / (constants.R * self.fit_object.temperature[:, np.newaxis]))
+
+            names = [data_obj.name or data_obj.state for data_obj in self.fit_object.data_objs]
+            col_index = pd.MultiIndex.from_product([names, quantities], names=['State', 'Quantity'])
+            output_data = np.stack([_deltaG, deltaG, pfact, *bounds], axis=-1).transpose(1, 0, 2)\
+                .reshape(self.fit_object.Nr, -1)
+            df = pd.DataFrame(output_data, index=self.fit_object.r_number, columns=col_index)
+
+            return Protein(df)
+        else:
+            series = self.fit_object
+            exchanges = series.coverage['exchanges'].to_numpy()
+            deltaG = _deltaG.copy()
+            deltaG[~exchanges] = np.nan
+            bounds[:, ~exchanges] = np.nan
+            pfact = np.exp(deltaG / (constants.R * series.temperature))
+
+            out_dict = {'r_number': series.coverage.r_number, 'sequence': series.coverage['sequence'].to_numpy()}
+            values = [_deltaG, deltaG, pfact, *bounds]
+            out_dict.update({quantity: value for quantity, value in zip(quantities, values)})
+
+            return Protein(out_dict, index='r_number')
@@ -1,26 +1,84 @@
 from dask.distributed import LocalCluster, Client
+from distributed.diagnostics.plugin import WorkerPlugin
 import time
 import os
 from pathlib import Path
 from pyhdx.panel.config import ConfigurationSettings
 import argparse
+import torch
 
 cfg = ConfigurationSettings()
 
+
+def set_torch_threads(intra_op_threads, inter_op_threads):
+    """Sets the number of PyTorch intra-op and inter-op threads in the current process"""
+    torch.set_num_threads(intra_op_threads)
+    try:
+        torch.set_num_interop_threads(inter_op_threads)
+    except RuntimeError:  # Inter-op threads can only be set once, before any parallel work has started
+        pass
+
+
+class TorchThreadsPlugin(WorkerPlugin):
+    """
+    Dask worker plugin which applies the PyTorch threading policy to worker processes on startup.
+
+    Parameters
+    ----------
+    intra_op_threads : :obj:`int`
+        Number of PyTorch intra-op threads. If `None` the value is taken from the configuration.
+    inter_op_threads : :obj:`int`
+        Number of PyTorch inter-op threads. If `None` the value is taken from the configuration.
+
+    """
+
+    name = 'pyhdx-torch-threads'
+
+    def __init__(self, intra_op_threads=None, inter_op_threads=None):
+        intra, inter = cfg.torch_threads
+        self.intra_op_threads = intra_op_threads or intra
+        self.inter_op_threads = inter_op_threads or inter
+
+    def setup(self, worker):
+        set_torch_threads(self.intra_op_threads, self.inter_op_threads)
+
+
 #todo refactor cluster
 def default_client(timeout='2s'):
     cluster = cfg.cluster
     try:
         client = Client(cluster, timeout=timeout)
+        client.register_worker_plugin(TorchThreadsPlugin())
         return client
     except (TimeoutError, IOError):
         print(f"No valid Dask scheduler found at specified address: '{cluster}'")
         return False
 
 
-def default_cluster():
-    port = int(cfg.get('cluster', 'port'))
-    cluster = LocalCluster(scheduler_port=port, n_workers=10)  # todo default settings local cluster from config
+def default_cluster(**kwargs):
+    """
+    Start a Dask LocalCluster sized according to the resource policy in the configuration.
+
+    Parameters
+    ----------
+    kwargs
+        Additional keyword arguments passed to :class:`~dask.distributed.LocalCluster`, these take precedence over
+        configuration settings.
+
+    Returns
+    -------
+    cluster : :class:`~dask.distributed.LocalCluster`
+
+    """
+
+    settings = {
+        'scheduler_port': int(cfg.get('cluster', 'port')),
+        'n_workers': cfg.n_workers,
+        'threads_per_worker': cfg.threads_per_worker,
+        'plugins': {TorchThreadsPlugin()}
+    }
+    settings.update(kwargs)
+    cluster = LocalCluster(**settings)
 
     return cluster
 
@@ -36,7 +94,7 @@ def blocking_cluster():
     else:
         port = int(cfg.get('cluster', 'port'))
     try:
-        local_cluster = LocalCluster(scheduler_port=port, n_workers=10)  # todo default settings local cluster from config
+        local_cluster = default_cluster(scheduler_port=port)
         print(f"Started local cluster at {local_cluster.scheduler_address}")
     except OSError as e:
         print(f"Could not start local cluster with at port: {port}")
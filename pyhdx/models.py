@@ -246,7 +246,9 @@ class PeptideMasterTable(object):
     marked with a lower case 'p' in the sequence field.
 
     The field `scores` is used in calculating exchange rates and can be set by either the `set_backexchange` or
-    `set_control` methods.
+    `set_control` methods. If the data has an `uptake_sd` field, these methods also add the field
+    `uptake_corrected_sd` with the standard deviation of `uptake_corrected`. With `set_control`, the standard deviation
+    of the control uptake is included in `uptake_corrected_sd`.
 
 
     Parameters
@@ -307,6 +309,53 @@ class PeptideMasterTable(object):
     def __len__(self):
         return len(self.data)
 
+    def aggregate(self):
+        """
+        Collapses duplicate entries with the same state, exposure, start and end, such as replicates or charge states,
+        into a single entry.
+
+        Within each group `uptake` is averaged with weights 1/`uptake_sd`², and `uptake_sd` is set to the standard
+        deviation of the weighted mean. Groups where not all entries have a positive `uptake_sd` are averaged
+        unweighted, and their standard deviation is estimated from the spread of the entries. Other fields are taken
+        from the first entry of each group. Aggregation should be done before applying controls.
+
+        """
+        if 'uptake_corrected' in self.data.dtype.names:
+            raise ValueError("Peptides should be aggregated before setting controls or back exchange")
+
+        keys = ['state', 'exposure', '_start', '_end']
+        _, index, inverse, counts = np.unique(self.data[keys], return_index=True, return_inverse=True,
+                                              return_counts=True)
+        inverse = inverse.ravel()
+
+        uptake = self.data['uptake']
+        if 'uptake_sd' in self.data.dtype.names:
+            uptake_sd = self.data['uptake_sd']
+        else:
+            uptake_sd = np.zeros_like(uptake)
+
+        weighted = (np.bincount(inverse, weights=uptake_sd <= 0) == 0)[inverse]
+        weights = np.ones_like(uptake)
+        weights[weighted] = 1 / uptake_sd[weighted]**2
+
+        w_sum = np.bincount(inverse, weights=weights)
+        mean = np.bincount(inverse, weights=weights*uptake) / w_sum
+
+        sq_dev = np.bincount(inverse, weights=(uptake - mean[inverse])**2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sem = np.sqrt(sq_dev / (counts * (counts - 1)))
+        sd = np.where(counts > 1, sem, uptake_sd[index])
+        sd[weighted[index]] = np.sqrt(1 / w_sum[weighted[index]])
+
+        data = self.data[index].copy()
+        data['uptake'] = mean
+        if 'uptake_sd' in data.dtype.names:
+            data['uptake_sd'] = sd
+        else:
+            data = append_fields(data, 'uptake_sd', data=sd, usemask=False)
+
+        self.data = np.sort(data, order=['start', 'end', 'sequence', 'exposure', 'state'])
+
     def groupby_state(self, **kwargs):
         """
         Groups measurements in the dataset by state and returns them in a dictionary as a
@@ -383,6 +432,9 @@ class PeptideMasterTable(object):
         uptake_corrected = self.data['uptake'] / (1 - back_exchange)
 
         self.data = append_fields(self.data, ['scores', 'uptake_corrected'], data=[scores, uptake_corrected], usemask=False)
+        if 'uptake_sd' in self.data.dtype.names:
+            uptake_corrected_sd = self.data['uptake_sd'] / (1 - back_exchange)
+            self.data = append_fields(self.data, 'uptake_corrected_sd', data=uptake_corrected_sd, usemask=False)
 
     def set_control(self, control_100, control_0=None):
         """
@@ -433,6 +485,8 @@ class PeptideMasterTable(object):
         #Apply controls for each sequence  (#todo there must be a better way to do this)
         scores = np.zeros(len(data_final), dtype=float)
         uptake_corrected = np.zeros(len(data_final), dtype=float)
+        has_sd = 'uptake_sd' in data_final.dtype.names
+        uptake_corrected_sd = np.zeros(len(data_final), dtype=float)
         for c_100, c_0 in zip(control_100_final, control_0_final):
             bs = data_final['start'] == c_100['start']
             be = data_final['end'] == c_100['end']
@@ -441,6 +495,10 @@ class PeptideMasterTable(object):
             scores[b_all] = 100 * (uptake - c_0['uptake']) / (c_100['uptake'] - c_0['uptake'])
 
             uptake_corrected[b_all] = (uptake / c_100['uptake']) * data_final[b_all]['ex_residues']
+            if has_sd:
+                # Standard deviations of the measurement and the control are propagated through the ratio
+                sd = np.sqrt(data_final[b_all]['uptake_sd']**2 + (uptake * c_100['uptake_sd'] / c_100['uptake'])**2)
+                uptake_corrected_sd[b_all] = (sd / c_100['uptake']) * data_final[b_all]['ex_residues']
 
         if 'scores' in data_final.dtype.names:
             data_final['scores'] = scores
@@ -452,6 +510,11 @@ class PeptideMasterTable(object):
         else:
             data_final = append_fields(data_final, 'uptake_corrected', data=uptake_corrected, usemask=False)
 
+        if has_sd and 'uptake_corrected_sd' in data_final.dtype.names:
+            data_final['uptake_corrected_sd'] = uptake_corrected_sd
+        elif has_sd:
+            data_final = append_fields(data_final, 'uptake_corrected_sd', data=uptake_corrected_sd, usemask=False)
+
         self.data = data_final
 
     def get_data(self, state, exposure):
@@ -515,6 +578,10 @@ class Coverage(object):
         Values are 1/(ex_residues) where there is coverage,
         #todo account for prolines: so that rows sum to 1 is currently not true
 
+    Notes
+    -----
+    The `X` and `Z` matrices are generated from the peptide data on first access and are not pickled.
+
     """
 
     def __init__(self, data, c_term=None, n_term=1, sequence=None):
@@ -560,16 +627,41 @@ class Coverage(object):
         self.interval = (np.min(self.data['start']), np.max(self.data['end']))
         self.protein = Protein(dic, index='r_number')
 
+        self._X = None
+        self._Z = None
+
+    def __getstate__(self):
+        return {**self.__dict__, '_X': None, '_Z': None}
+
+    def __setstate__(self, d):
+        self.__dict__.update(_X=None, _Z=None)  # Objects pickled by previous versions have the matrices as 'X', 'Z'
+        self.__dict__.update(d)
+
+    def _make_matrices(self):
         # matrix dimensions N_peptides N_residues, dtype for TF compatibility
-        _exchanges = self['exchanges']  # Array only on covered part
-        self.X = np.zeros((len(self.data), self.interval[1] - self.interval[0]), dtype=int)
-        self.Z = np.zeros_like(self.X, dtype=float)
-        for row, entry in enumerate(self.data):
-            i0, i1 = np.searchsorted(self.r_number, (entry['start'], entry['end']))
-            self.X[row][i0:i1] = 1
-            self.Z[row][i0:i1] = _exchanges[i0:i1]
+        _exchanges = self['exchanges'].to_numpy(dtype=float)  # Array only on covered part
+        i0 = np.searchsorted(self.r_number, self.data['start'])
+        i1 = np.searchsorted(self.r_number, self.data['end'])
+        columns = np.arange(self.Nr)
+        X = ((columns >= i0[:, np.newaxis]) & (columns < i1[:, np.newaxis])).astype(int)
+
+        self._X = X
+        self._Z = X * _exchanges / self.data['ex_residues'][:, np.newaxis]
+
+    @property
+    def X(self):
+        """:class:`~numpy.ndarray`: N x M coverage matrix of peptides and residues."""
+        if self._X is None:
+            self._make_matrices()
+        return self._X
 
-        self.Z = self.Z / self.data['ex_residues'][:, np.newaxis]
+    @property
+    def Z(self):
+        """:class:`~numpy.ndarray`: N x M matrix of peptides and residues, weighted by the number of exchanging
+        residues per peptide."""
+        if self._Z is None:
+            self._make_matrices()
+        return self._Z
 
     def __len__(self):
         return len(self.data)
@@ -610,13 +702,13 @@ class Coverage(object):
     @property
     def Np(self):
         """:obj:`int`: Number of peptides."""
-        return self.X.shape[0]
+        return len(self.data)
 
     @property
     def Nr(self):
         """:obj:`int`: Total number of residues spanned by the peptides."""
 
-        return self.X.shape[1]
+        return self.interval[1] - self.interval[0]
 
     @property
     def r_number(self):
@@ -778,6 +870,12 @@ class KineticsSeries(object):
         uptake_corrected = np.stack([v.uptake_corrected for v in self])
         return uptake_corrected
 
+    @property
+    def uptake_corrected_sd(self):
+        """matrix shape  N_t, N_p, standard deviations of `uptake_corrected`"""
+        uptake_corrected_sd = np.stack([v.uptake_corrected_sd for v in self])
+        return uptake_corrected_sd
+
     def get_tensors(self, exchanges=False):
         """
 
@@ -900,6 +998,10 @@ class PeptideMeasurements(Coverage):
     def uptake_corrected(self):
         return self.data['uptake_corrected']
 
+    @property
+    def uptake_corrected_sd(self):
+        return self.data['uptake_corrected_sd']
+
     @property
     def name(self):
         return self.state + '_' + str(self.exposure)
@@ -957,6 +1059,13 @@ class HDXMeasurementSet(object):
         self.aligned_indices = None
         self.aligned_dataframes = None
 
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k != 'masks'}
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+        self.masks = self.get_masks()
+
     @property
     def temperature(self):
         return np.array([data_obj.temperature for data_obj in self.data_objs])
@@ -1082,6 +1191,15 @@ class HDXMeasurementSet(object):
 
         return exchanges
 
+    @property
+    def uptake_corrected_sd(self):
+        """array shape N_s, N_p, N_t, standard deviations of `uptake_corrected`, zero for padded entries"""
+        values = np.concatenate([data_obj.uptake_corrected_sd.T.flatten() for data_obj in self.data_objs])
+        uptake_corrected_sd = np.zeros((self.Ns, self.Np, self.Nt))
+        uptake_corrected_sd[self.masks['spt']] = values
+
+        return uptake_corrected_sd
+
 
 #https://stackoverflow.com/questions/4494404/find-large-number-of-consecutive-values-fulfilling-condition-in-a-numpy-array
 def contiguous_regions(condition):
@@ -1,6 +1,7 @@
 import configparser
 from pathlib import Path
 import shutil
+import os
 
 
 def read_config(path):
@@ -63,6 +64,59 @@ class ConfigurationSettings(metaclass=Singleton):
         self.set('cluster', 'ip', ip)
         self.set('cluster', 'port', port)
 
+    @property
+    def threads_per_worker(self):
+        """Returns the number of threads per Dask worker"""
+
+        return int(self.get('cluster', 'threads_per_worker', fallback='1'))
+
+    @property
+    def n_workers(self):
+        """Returns the number of Dask workers, when set to 'auto' all available cores are divided over the workers"""
+
+        n_workers = self.get('cluster', 'n_workers', fallback='auto')
+        if n_workers == 'auto':
+            return max(1, (os.cpu_count() or 1) // self.threads_per_worker)
+        return int(n_workers)
+
+    @property
+    def torch_threads(self):
+        """Returns a tuple of (intra-op, inter-op) number of threads for PyTorch.
+
+        The default ('auto') number of intra-op threads is equal to the number of threads per worker.
+        """
+
+        intra = self.get('torch', 'intra_op_threads', fallback='auto')
+        intra = self.threads_per_worker if intra == 'auto' else int(intra)
+        inter = int(self.get('torch', 'inter_op_threads', fallback='1'))
+
+        return intra, inter
+
+    @property
+    def checkpoint_dir(self):
+        """Returns the directory where fit checkpoints are written, or ``None`` if checkpointing is disabled.
+
+        The default ('auto') is the 'checkpoints' directory in the user's .pyhdx directory. Set to 'none' to disable.
+        """
+
+        checkpoint_dir = self.get('fitting', 'checkpoint_dir', fallback='auto')
+        if checkpoint_dir == 'none':
+            return None
+        return config_dir / 'checkpoints' if checkpoint_dir == 'auto' else Path(checkpoint_dir)
+
+    @property
+    def max_jobs(self):
+        """Returns a tuple of the maximum number of concurrently running fit jobs per session and per server.
+
+        The default ('auto') maximum number of jobs per server is equal to the number of Dask workers.
+        """
+
+        session = int(self.get('jobs', 'max_jobs_session', fallback='2'))
+        server = self.get('jobs', 'max_jobs_server', fallback='auto')
+        server = self.n_workers if server == 'auto' else int(server)
+
+        return session, server
+
     def write_config(self, path=None):
         """
         This method is used to update the configuration file.
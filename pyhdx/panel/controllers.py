@@ -1,5 +1,7 @@
 import operator
+import re
 import urllib.request
+import uuid
 import zipfile
 from collections import namedtuple
 from io import StringIO, BytesIO
@@ -19,13 +21,18 @@ from skimage.filters import threshold_multiotsu
 from pyhdx import VERSION_STRING
 from pyhdx.fileIO import read_dynamx, txt_to_np, csv_to_protein, txt_to_protein, csv_to_dataframe
 from pyhdx.fitting import fit_rates_weighted_average, fit_rates_half_time_interpolate, get_bounds, fit_gibbs_global, \
-    fit_gibbs_global_batch
-from pyhdx.models import PeptideMasterTable, KineticsSeries, Protein, array_intersection
+    fit_gibbs_global_batch, fit_gibbs_global_independent, warm_start_guess
+from pyhdx.fitting_torch import TorchSingleFitResult, TorchBatchFitResult, estimate_errors_batch
+from pyhdx.fitting_torch import estimate_errors as estimate_errors_series  # FitControl.estimate_errors is a parameter
+from pyhdx.models import PeptideMasterTable, KineticsSeries, HDXMeasurementSet, Protein, array_intersection
 from pyhdx.panel.base import ControlPanel, DEFAULT_COLORS, DEFAULT_CLASS_COLORS
+from pyhdx.panel.config import ConfigurationSettings
 from pyhdx.panel.sources import DataSource, DataFrameSource
 from pyhdx.panel.transforms import ApplyCmapTransform
 from pyhdx.panel.widgets import ASyncProgressBar
-from pyhdx.support import rgb_to_hex, hex_to_rgba, series_to_pymol
+from pyhdx.support import rgb_to_hex, hex_to_rgba, series_to_pymol, ProgressReporter
+
+cfg = ConfigurationSettings()
 
 HalfLifeFitResult = namedtuple('HalfLifeFitResult', ['output'])
 
@@ -465,7 +472,8 @@ class InitialGuessControl(ControlPanel):
         self.own_widget_names = [name for name in self.widgets.keys() if name not in excluded]
         self.update_box()
 
-        self._guess_names = {}
+        self._progress_topic = f'pyhdx-progress-{id(self)}'
+        self.parent.subscribe(self._progress_topic, self._progress_updated)
 
     @property
     def _layout(self):
@@ -529,10 +537,23 @@ class InitialGuessControl(ControlPanel):
         if not self.dataset:
             self.dataset = options[0]
 
-    def add_fit_result(self, future):
-        name = self._guess_names.pop(future.key)
+    def _progress_updated(self, report):
+        self.pbar1.update(report)
+        if not report['done']:
+            self.pbar1.message = f"{report['name']}: {report['completed']}/{report['total']} blocks"
 
-        results = future.result()
+    def add_fit_result(self, job):
+        name = job.name
+        self.param['do_fit1'].constant = False
+        self.pbar1.reset()  # Failed or cancelled fits send no final progress report
+        if job.status == 'cancelled':
+            self.parent.logger.info(f'Cancelled initial guess: {name}')
+            return
+        elif job.status != 'finished':
+            self.parent.logger.info(f'Initial guess {name} failed: {job.exception()!r}')
+            return
+
+        results = job.result()
         dfs = [result.output.df for result in results]
         combined_results = pd.concat(dfs, axis=1,
                                      keys=list(self.parent.data_objects.keys()),
@@ -541,14 +562,13 @@ class InitialGuessControl(ControlPanel):
         self.sources['dataframe'].add_df(combined_results, 'rates', name)
         self.parent.fit_results[name] = {k: v for k, v in zip(self.parent.data_objects.keys(), results)}
         self.parent.param.trigger('data_objects')  # Informs other fittings that initial guesses are now available
-        self.param['do_fit1'].constant = False
 
     def _action_fit(self):
         if len(self.parent.data_objects) == 0:
             self.parent.logger.info('No datasets loaded')
             return
 
-        if self.guess_name in itertools.chain(self.parent.fit_results.keys(), self._guess_names.values()):
+        if self.guess_name in itertools.chain(self.parent.fit_results.keys(), self.parent.job_manager.jobs.keys()):
             self.parent.logger.info(f"Guess with name {self.guess_name} already in use")
             return
 
@@ -562,15 +582,15 @@ class InitialGuessControl(ControlPanel):
             else:
                 bounds = self.bounds.values()
 
-            futures = self.parent.client.map(fit_rates_weighted_average,
-                                             self.parent.data_objects.values(), bounds, client='worker_client')
-        elif self.fitting_model == 'Half-life (λ)':   # this is practically instantaneous and does not require dask
-            futures = self.parent.client.map(fit_rates_half_time_interpolate, self.parent.data_objects.values())
-
-        dask_future = self.parent.client.submit(lambda args: args, futures)
-        self._guess_names[dask_future.key] = self.guess_name
+            tasks = [(fit_rates_weighted_average, (data_obj, b),
+                      {'client': 'worker_client', 'pbar': ProgressReporter(self._progress_topic, name=name)})
+                     for (name, data_obj), b in zip(self.parent.data_objects.items(), bounds)]
+        elif self.fitting_model == 'Half-life (λ)':   # this is practically instantaneous
+            tasks = [(fit_rates_half_time_interpolate, (data_obj,), {})
+                     for data_obj in self.parent.data_objects.values()]
 
-        self.parent.future_queue.append((dask_future, self.add_fit_result))
+        # Initial guesses are quick and are started ahead of queued global fits
+        self.parent.job_manager.submit(self.guess_name, tasks, self.add_fit_result, priority=1, combine=True)
 
 
 class FitControl(ControlPanel):
@@ -584,12 +604,28 @@ class FitControl(ControlPanel):
 
     initial_guess = param.Selector(doc='Name of dataset to use for initial guesses.')
 
+    refine_from = param.Selector(default=None, objects=[None], label='Refine from fit',
+                                 doc='Name of a previous fit result to start from. Residues and states not in this '
+                                     'fit are initialized from the initial guesses.')
+
     fit_mode = param.Selector(default='Batch', objects=['Batch', 'Single'])
 
+    vectorize_single = param.Boolean(False, label='Vectorize single fits',
+                                     doc='In Single mode, fit all states independently as one vectorized batch')
+
     stop_loss = param.Number(0.01, bounds=(0, None),
                              doc='Threshold loss difference below which to stop fitting.')
     stop_patience = param.Integer(100, bounds=(1, None),
                                   doc='Number of epochs where stop loss should be satisfied before stopping.')
+    rel_tol = param.Number(0., bounds=(0, None), label='Relative stop loss',
+                           doc='Threshold loss difference relative to the total loss below which to stop fitting. '
+                               'Set to zero to disable. Not available for vectorized single fits.')
+    grad_tol = param.Number(0., bounds=(0, None), label='Gradient stop tolerance',
+                            doc='Gradient norm below which to stop fitting. Set to zero to disable. Not available '
+                                'for vectorized single fits.')
+    lr_scheduler = param.Selector(default=None, objects=[None, 'plateau', 'cosine'], label='Learning rate scheduler',
+                                  doc='Reduce the learning rate when the loss plateaus, or anneal it over all epochs '
+                                      'with a cosine schedule. Not available for vectorized single fits.')
     learning_rate = param.Number(10, bounds=(0, None),
                                  doc='Learning rate parameter for optimization.')
     momentum = param.Number(0.5, bounds=(0, None),
@@ -606,19 +642,46 @@ class FitControl(ControlPanel):
 
     fit_name = param.String("Gibbs_fit_1", doc="Name for for the fit result")
 
+    estimate_errors = param.Boolean(True, doc='Estimate standard errors of ΔG on the cluster after fitting finishes')
+
     do_fit = param.Action(lambda self: self._action_fit(), constant=True, label='Do Fitting',
                           doc='Start global fitting')
 
+    resume_fit = param.Action(lambda self: self._action_resume(), constant=True, label='Resume interrupted fits',
+                              doc='Resubmit interrupted fits, which continue from their last checkpoint')
+
+    cancel_fit = param.Action(lambda self: self._action_cancel(), label='Cancel fit',
+                              doc='Cancel the queued or running fit with the current fit name')
+
     def __init__(self, parent, **params):
         self.pbar1 = ASyncProgressBar() #tqdm?
         super(FitControl, self).__init__(parent, **params)
 
         source = self.parent.sources['dataframe']
         source.param.watch(self._source_updated, ['updated'])
+        self.parent.param.watch(self._fit_results_updated, ['fit_results'])
 
-        self._current_jobs = 0
-        self._max_jobs = 2  #todo config
-        self._fit_names = {}
+        self._error_names = {}
+        self._fit_tasks = {}  # Tasks (function, args, kwargs) with data objects per fit name, until the fit finishes
+        self._interrupted = []
+        self._progress_topic = f'pyhdx-progress-{id(self)}'
+        self.parent.subscribe(self._progress_topic, self._progress_updated)
+
+    def make_dict(self):
+        widgets = self.generate_widgets()
+        widgets['pbar1'] = self.pbar1.view
+
+        return widgets
+
+    def _progress_updated(self, report):
+        self.pbar1.update(report)
+        if not report['done']:
+            self.pbar1.message = f"{report['name']}: epoch {report['completed']}, " \
+                                 f"total loss {report['total_loss']:.2f}, at most {report['eta']:.0f} s remaining"
+
+    def _reporter(self, name):
+        """Progress reporter for fit `name`, which sends reports to this controller"""
+        return ProgressReporter(self._progress_topic, name=name)
 
     def _source_updated(self, *events):
         table = self.parent.sources['dataframe'].get('rates')
@@ -633,27 +696,55 @@ class FitControl(ControlPanel):
         if not self.initial_guess and objects:
             self.initial_guess = objects[0]
 
-    @param.depends('fit_mode', watch=True)
+    def _fit_results_updated(self, *events):
+        # Only global fit results can be refined, initial guesses are dictionaries of rate fit results
+        def is_global(result):
+            if isinstance(result, list):
+                return bool(result) and all(is_global(elem) for elem in result)
+            return isinstance(result, (TorchSingleFitResult, TorchBatchFitResult))
+
+        names = [name for name, result in self.parent.fit_results.items() if is_global(result)]
+        self.param['refine_from'].objects = [None] + names
+
+    @param.depends('fit_mode', 'vectorize_single', watch=True)
     def _fit_mode_updated(self):
         if self.fit_mode == 'Batch' and len(self.parent.data_objects) > 1:
             self.param['r2'].constant = False
         else:
             self.param['r2'].constant = True
 
-    def add_fit_result(self, future):
-        name = self._fit_names.pop(future.key)
-        result = future.result()
-        self._current_jobs -= 1
+        # Vectorized single fits only stop on the (absolute) stop loss and run without scheduler or checkpoints
+        vectorized = self.fit_mode == 'Single' and self.vectorize_single
+        for name in ['rel_tol', 'grad_tol', 'lr_scheduler']:
+            self.param[name].constant = vectorized
+
+    def add_fit_result(self, job):
+        name = job.name
+        self.pbar1.reset()  # Failed or cancelled fits send no final progress report
+        if job.status == 'cancelled':
+            tasks, combine = self._fit_tasks.pop(name)
+            for func, args, kwargs in tasks:  # Cancelled fits are not resumed
+                checkpoint = kwargs.get('checkpoint')
+                if checkpoint is not None and Path(checkpoint).exists():
+                    Path(checkpoint).unlink()
+            self.parent.logger.info(f'Cancelled PyTorch fit: {name}')
+            return
+        elif job.status != 'finished':
+            self._interrupted.append(name)
+            self.param['resume_fit'].constant = False
+            self.parent.logger.info(f'PyTorch fit {name} was interrupted ({job.exception()!r}), '
+                                    f'resume to continue from the last checkpoint')
+            return
+
+        result = job.result()
+        tasks, combine = self._fit_tasks.pop(name)
 
         self.parent.logger.info(f'Finished PyTorch fit: {name}')
 
         if isinstance(result, list):
             self.parent.fit_results[name] = list(result)
-            output_dfs = {fit_result.series.name: fit_result.output.df for fit_result in result}
-            df = pd.concat(output_dfs.values(), keys=output_dfs.keys(), axis=1)
         else:
             self.parent.fit_results[name] = result  # todo this name can be changed by the time this is executed
-            df = result.output.df
 
             self.parent.logger.info('Finished PyTorch fit')
             loss = result.metadata['mse_loss']
@@ -662,41 +753,146 @@ class FitControl(ControlPanel):
             self.parent.logger.info(f"Total loss: {result.total_loss:.2f}, regularization loss: {result.reg_loss:.2f} "
                                     f"({result.regularization_percentage:.1f}%)")
 
-        self.parent.sources['dataframe'].add_df(df, 'global_fit', names=[name])
+        self.parent.sources['dataframe'].add_df(self._output_df(result), 'global_fit', names=[name])
         self.parent.param.trigger('fit_results')
 
+        if self.estimate_errors:
+            error_name = f'{name} (errors)'
+            self._error_names[error_name] = (name, result)
+            self.parent.job_manager.submit(error_name, self._error_tasks(tasks, result), self.add_error_result,
+                                           combine=True)
+
+    @staticmethod
+    def _error_tasks(tasks, result):
+        """
+        Returns tasks which estimate the standard errors of the fit results of `result`. Tasks take the data objects of
+        the fit `tasks`, which are resolved to their scattered futures, and only the fitted ΔG values.
+        """
+        if isinstance(result, TorchBatchFitResult):
+            return [(estimate_errors_batch, (tasks[0][1][0], result.deltaG), {})]
+
+        data_obj = tasks[0][1][0]
+        if isinstance(data_obj, HDXMeasurementSet):  # Vectorized single fits of all states
+            data_objs = data_obj.data_objs
+        else:
+            data_objs = [args[0] for func, args, kwargs in tasks]
+
+        return [(estimate_errors_series, (data_obj, fit_result.deltaG), {})
+                for data_obj, fit_result in zip(data_objs, result)]
+
+    def add_error_result(self, job):
+        """Adds the standard errors of ΔG to the fit results and replaces their output"""
+        name, result = self._error_names.pop(job.name)
+        if job.status != 'finished':
+            self.parent.logger.info(f'Error estimation of {name} failed: {job.exception()!r}')
+            return
+
+        results = result if isinstance(result, list) else [result]
+        for fit_result, errors in zip(results, job.result()):
+            fit_result.errors = errors
+            fit_result._output = None
+
+        self.parent.logger.info(f'Finished error estimation: {name}')
+
+        source = self.parent.sources['dataframe']
+        source.remove_df('global_fit', name)
+        source.add_df(self._output_df(result), 'global_fit', names=[name])
+        self.parent.param.trigger('fit_results')
+
+    @staticmethod
+    def _output_df(result):
+        if isinstance(result, list):
+            output_dfs = {fit_result.series.name: fit_result.output.df for fit_result in result}
+            return pd.concat(output_dfs.values(), keys=output_dfs.keys(), axis=1)
+        else:
+            return result.output.df
+
     def _action_fit(self):
-        if self.fit_name in itertools.chain(self.parent.fit_results.keys(), self._fit_names.values()):
-            self.parent.logger.info(f"Guess with name {self.guess_name} already in use")
+        if self.fit_name in itertools.chain(self.parent.fit_results.keys(), self.parent.job_manager.jobs.keys(),
+                                            self._interrupted):
+            self.parent.logger.info(f"Fit with name {self.fit_name} already in use")
             return
 
         self.parent.logger.info('Started PyTorch fit')
 
-        self._current_jobs += 1
-        if self._current_jobs >= self._max_jobs:
-            self.widgets['do_fit'].constant = True
+        checkpoint_dir = cfg.checkpoint_dir
+        if checkpoint_dir is not None:
+            checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        token = uuid.uuid4().hex  # Checkpoints of fits with the same name in other sessions are separate files
 
-        self.parent.logger.info(f'Current number of active jobs: {self._current_jobs}')
         if self.fit_mode == 'Batch':
             hdx_set = self.parent.hdx_set
             rates_df = self.sources['dataframe'].get('rates', fit_ID=self.initial_guess)
 
             rates_guess = [rates_df[state]['rate'] for state in hdx_set.names]
-            gibbs_guess = hdx_set.guess_deltaG(rates_guess)
+            gibbs_guess = self._refine_guess(hdx_set, hdx_set.guess_deltaG(rates_guess))
 
-            dask_future = self.parent.client.submit(fit_gibbs_global_batch, hdx_set, gibbs_guess, **self.fit_kwargs)
-        else:
-            data_objs = self.parent.data_objects.values()
+            checkpoint = self._checkpoint_path(checkpoint_dir, token, self.fit_name)
+            tasks = [(fit_gibbs_global_batch, (hdx_set, gibbs_guess),
+                      {**self.fit_kwargs, 'checkpoint': checkpoint, 'progress': self._reporter(self.fit_name)})]
+        elif self.vectorize_single:
+            hdx_set = self.parent.hdx_set
             rates_df = self.sources['dataframe'].get('rates', fit_ID=self.initial_guess)
-            gibbs_guesses = [data_obj.guess_deltaG(rates_df[data_obj.name]['rate']) for data_obj in data_objs]
-            futures = self.parent.client.map(fit_gibbs_global, data_objs, gibbs_guesses, **self.fit_kwargs)
 
-            # Combine list of futures into one future object
-            # See https://github.com/dask/distributed/pull/560
-            dask_future = self.parent.client.submit(lambda args: args, futures)
+            rates_guess = [rates_df[state]['rate'] for state in hdx_set.names]
+            gibbs_guess = self._refine_guess(hdx_set, hdx_set.guess_deltaG(rates_guess))
 
-        self._fit_names[dask_future.key] = self.fit_name
-        self.parent.future_queue.append((dask_future, self.add_fit_result))
+            self.parent.logger.info('Vectorized single fits do not use relative or gradient stop tolerances, '
+                                    'learning rate schedulers or checkpoints')
+            tasks = [(fit_gibbs_global_independent, (hdx_set, gibbs_guess),
+                      {**self.fit_kwargs, 'progress': self._reporter(self.fit_name)})]
+        else:
+            data_objs = self.parent.data_objects.values()
+            rates_df = self.sources['dataframe'].get('rates', fit_ID=self.initial_guess)
+            tasks = []
+            for data_obj in data_objs:
+                gibbs_guess = self._refine_guess(data_obj, data_obj.guess_deltaG(rates_df[data_obj.name]['rate']))
+                checkpoint = self._checkpoint_path(checkpoint_dir, token, self.fit_name, data_obj.name)
+                progress = self._reporter(f'{self.fit_name} ({data_obj.name})')
+                tasks.append((fit_gibbs_global, (data_obj, gibbs_guess),
+                              {**self.fit_kwargs, 'checkpoint': checkpoint, 'progress': progress}))
+
+        # Tasks of separate single fits return one fit result each, which are combined into a list
+        self._fit_tasks[self.fit_name] = (tasks, self.fit_mode == 'Single' and not self.vectorize_single)
+        self._submit_fit(self.fit_name)
+
+    @staticmethod
+    def _checkpoint_path(checkpoint_dir, token, *names):
+        """Checkpoint file in `checkpoint_dir` for the fit with unique `token`, named by file name safe `names`"""
+        if checkpoint_dir is None:
+            return None
+        name = re.sub(r'[^\w\-]', '_', '_'.join(str(name) for name in names))
+        return checkpoint_dir / f'{name}_{token}.pt'
+
+    def _refine_guess(self, data_obj, gibbs_guess):
+        """Replaces initial guesses by the values of the fit result selected in 'refine_from'"""
+        if self.refine_from is None:
+            return gibbs_guess
+        return warm_start_guess(self.parent.fit_results[self.refine_from], data_obj, gibbs_guess)
+
+    def _action_resume(self):
+        interrupted, self._interrupted = self._interrupted, []
+        self.param['resume_fit'].constant = True
+        for name in interrupted:
+            self.parent.logger.info(f'Resuming PyTorch fit: {name}')
+            self._submit_fit(name, resume=True)
+
+    def _action_cancel(self):
+        try:
+            self.parent.job_manager.cancel(self.fit_name)
+        except KeyError:
+            self.parent.logger.info(f'No queued or running fit with name {self.fit_name}')
+
+    def _submit_fit(self, name, resume=False):
+        """Adds the fit tasks of fit `name` to the job queue, with `resume` fits continue from their checkpoints"""
+        tasks, combine = self._fit_tasks[name]
+        if resume:
+            tasks = [(func, args, {**kwargs, 'resume': True}) if kwargs.get('checkpoint') is not None
+                     else (func, args, kwargs) for func, args, kwargs in tasks]
+        job_manager = self.parent.job_manager
+        job_manager.submit(name, tasks, self.add_fit_result, combine=combine)
+        self.parent.logger.info(f'Number of running jobs: {len(job_manager.running)}, '
+                                f'queued jobs: {len(job_manager.queue)}')
 
     @property
     def fit_kwargs(self):
@@ -704,6 +900,9 @@ class FitControl(ControlPanel):
                           epochs=self.epochs, patience=self.stop_patience, stop_loss=self.stop_loss)
         if self.fit_mode == 'Batch':
             fit_kwargs['r2'] = self.r2
+        if self.fit_mode == 'Batch' or not self.vectorize_single:
+            fit_kwargs.update(rel_tol=self.rel_tol or None, grad_tol=self.grad_tol or None,
+                              scheduler=self.lr_scheduler)
 
         return fit_kwargs
 
@@ -12,7 +12,255 @@ from lumen.sources import Source
 from lumen.filters import FacetFilter
 
 from functools import partial
-from dask.distributed import Client
+from dask.distributed import Client, Event
+import copy
+import heapq
+import itertools
+import threading
+import uuid
+import weakref
+
+from pyhdx.panel.config import ConfigurationSettings
+from pyhdx.support import ProgressReporter
+
+cfg = ConfigurationSettings()
+
+
+def combine_futures(client, futures, **kwargs):
+    """
+    Combines a list of futures into one future, whose result is the list of results of `futures`.
+
+    See https://github.com/dask/distributed/pull/560
+
+    Parameters
+    ----------
+    client : :class:`~distributed.client.Client`
+        Dask client
+    futures : :obj:`list`
+        List of :class:`~distributed.client.Future`
+    **kwargs
+        Additional keyword arguments passed to :meth:`~distributed.client.Client.submit`
+
+    Returns
+    -------
+    future : :class:`~distributed.client.Future`
+
+    """
+    return client.submit(list, futures, **kwargs)
+
+
+class Job(object):
+    """
+    Fit job of the :class:`~pyhdx.panel.main_controllers.JobManager`, consisting of one or more tasks which are
+    submitted to the Dask cluster together.
+
+    Parameters
+    ----------
+    name : :obj:`str`
+        Name of the job
+    tasks : :obj:`list`
+        List of tasks as tuples of (function, args, kwargs)
+    callback : :obj:`callable`
+        Function which is called with the job when it is done (finished, failed or cancelled)
+    priority : :obj:`int`
+        Jobs with higher priority are started first, and their tasks are given priority by the Dask scheduler
+    combine : :obj:`bool`
+        If `True`, the results of the tasks are combined in a list, otherwise the job should consist of one task
+
+    Attributes
+    ----------
+    futures : :obj:`list`
+        Futures of the submitted tasks, the last future is the future of the job
+    status : :obj:`str`
+        Either 'queued', 'running', 'finished', 'error' or 'cancelled'
+    cancel_event : :obj:`str`
+        Name of the :class:`~distributed.Event` which is set to stop the running tasks of the job
+
+    """
+
+    def __init__(self, name, tasks, callback, priority=0, combine=False):
+        self.name = name
+        self.tasks = tasks
+        self.callback = callback
+        self.priority = priority
+        self.combine = combine
+
+        self.futures = []
+        self.status = 'queued'
+        self.cancel_event = f'pyhdx-cancel-{uuid.uuid4().hex}'
+
+    @property
+    def future(self):
+        """:class:`~distributed.client.Future` of the job or `None` if the job was not submitted"""
+        return self.futures[-1] if self.futures else None
+
+    def result(self):
+        return self.future.result()
+
+    def exception(self):
+        return self.future.exception() if self.status == 'error' else None
+
+
+class JobManager(object):
+    """
+    Queue for fit jobs, which limits the number of concurrently running jobs of one session and of all sessions of
+    the server.
+
+    Queued jobs of all sessions are started in order of priority, and in order of submission for equal priority, as
+    long as their session has a free slot. A job keeps its slot
+    until all of its tasks have returned, independent of whether the job finished, failed or was cancelled.
+
+    Running jobs are cancelled cooperatively: :class:`~pyhdx.support.ProgressReporter` arguments of the tasks check the
+    cancel event of the job and stop the fit by raising :class:`~pyhdx.support.FitCancelledError`. Tasks without a
+    progress reporter run until they finish. When one task of a job fails, the remaining tasks are cancelled likewise.
+
+    Parameters
+    ----------
+    client : :class:`~distributed.client.Client`
+        Dask client used to submit jobs
+    schedule : :obj:`callable`, optional
+        Function with signature ``schedule(callback, *args)`` used to call job callbacks from the thread of the Dask
+        client, by default callbacks are called directly
+    max_jobs : :obj:`int`, optional
+        Maximum number of running jobs of this job manager, by default as given by the configuration
+    max_server_jobs : :obj:`int`, optional
+        Maximum number of running jobs of all job managers, by default as given by the configuration
+    resolve : :obj:`callable`, optional
+        Function called with each positional argument of the tasks when a job is started, which returns the argument
+        to submit, for example the future of a data object scattered to the Dask cluster
+
+    """
+
+    _managers = weakref.WeakSet()  # Job managers of all sessions of the server
+    _server_jobs = 0
+    _count = itertools.count()  # Submission order of the jobs of all sessions
+    _lock = threading.RLock()  # Done callbacks of futures are called from other threads
+
+    def __init__(self, client, schedule=None, max_jobs=None, max_server_jobs=None, resolve=None):
+        self.client = client
+        self.schedule = schedule or (lambda callback, *args: callback(*args))
+        self.resolve = resolve or (lambda arg: arg)
+        session_jobs, server_jobs = cfg.max_jobs
+        self.max_jobs = max_jobs or session_jobs
+        self.max_server_jobs = max_server_jobs or server_jobs
+
+        self.queue = []  # heap of (-priority, count, job)
+        self.running = {}
+
+        self._managers.add(self)
+
+    @property
+    def jobs(self):
+        """Dictionary of all queued and running jobs (name as keys)"""
+        return {**{job.name: job for *_, job in self.queue}, **self.running}
+
+    def submit(self, name, tasks, callback, priority=0, combine=False):
+        """
+        Adds a job to the queue and starts queued jobs if the maximum number of running jobs is not reached.
+
+        See :class:`~pyhdx.panel.main_controllers.Job` for parameters.
+
+        Returns
+        -------
+        job : :class:`~pyhdx.panel.main_controllers.Job`
+
+        """
+        with self._lock:
+            if name in self.jobs:
+                raise ValueError(f"Job with name {name} already exists")
+
+            job = Job(name, tasks, callback, priority=priority, combine=combine)
+            heapq.heappush(self.queue, (-priority, next(self._count), job))
+            self._start_all()
+
+        return job
+
+    def cancel(self, name):
+        """
+        Cancels a queued or running job. Running jobs are stopped through their cancel event and their slot is
+        released when their tasks have returned.
+
+        Parameters
+        ----------
+        name : :obj:`str`
+            Name of the job to cancel
+
+        """
+        with self._lock:
+            if name in self.running:
+                job = self.running[name]
+                job.status = 'cancelled'
+                Event(job.cancel_event, client=self.client).set()  # The done callbacks of the tasks release the slot
+                return
+
+            for i, (*_, job) in enumerate(self.queue):
+                if job.name == name:
+                    self.queue.pop(i)
+                    heapq.heapify(self.queue)
+                    job.status = 'cancelled'
+                    job.callback(job)
+                    return
+
+        raise KeyError(f"No job with name {name}")
+
+    def _start_all(self):
+        """Starts queued jobs of all job managers of the server in order as long as slots are available"""
+        with self._lock:
+            while True:
+                available = [manager for manager in self._managers if manager.queue and
+                             len(manager.running) < manager.max_jobs and
+                             JobManager._server_jobs < manager.max_server_jobs]
+                if not available:
+                    break
+                min(available, key=lambda manager: manager.queue[0][:2])._start_next()
+
+    def _start_next(self):
+        *_, job = heapq.heappop(self.queue)
+        JobManager._server_jobs += 1
+        self.running[job.name] = job
+        job.status = 'running'
+
+        # Not pure such that resubmitted tasks are not resolved to previously failed futures
+        job.futures = [self.client.submit(func, *[self.resolve(arg) for arg in args], pure=False,
+                                          priority=job.priority, **self._cancellable(kwargs, job.cancel_event))
+                       for func, args, kwargs in job.tasks]
+        if job.combine:
+            job.futures.append(combine_futures(self.client, job.futures[:], pure=False, priority=job.priority))
+
+        for future in job.futures:
+            future.add_done_callback(lambda future, job=job: self.schedule(self._task_done, job))
+
+    @staticmethod
+    def _cancellable(kwargs, cancel_event):
+        """Returns task keyword arguments with progress reporters which check `cancel_event`"""
+        kwargs = dict(kwargs)
+        for key, value in kwargs.items():
+            if isinstance(value, ProgressReporter):
+                kwargs[key] = copy.copy(value)
+                kwargs[key].cancel = cancel_event
+        return kwargs
+
+    def _task_done(self, job):
+        with self._lock:
+            if job.name not in self.running:
+                return
+
+            if job.status == 'running' and any(future.status == 'error' for future in job.futures):
+                job.status = 'error'
+                Event(job.cancel_event, client=self.client).set()  # Stops the remaining tasks of the job
+            if not all(future.done() for future in job.futures):
+                return
+
+            self.running.pop(job.name)
+            JobManager._server_jobs -= 1
+            if job.status == 'running':
+                job.status = {'finished': 'finished', 'cancelled': 'cancelled'}.get(job.future.status, 'error')
+            Event(job.cancel_event, client=self.client).clear()  # Releases the event on the scheduler
+
+            try:
+                job.callback(job)
+            finally:
+                self._start_all()
 
 
 class MainController(param.Parameterized):
@@ -26,6 +274,7 @@ class MainController(param.Parameterized):
         List of strings referring to which ControlPanels to use for this MainController instance
         Should refer to subclasses of :class:`~pyhdx.panel.base.ControlPanel`
     client : dask client
+        Dask client, by default a new client is started
 
 
     Attributes
@@ -35,6 +284,8 @@ class MainController(param.Parameterized):
         Currently active Bokeh document
     logger : :class:`~logging.Logger`
         Logger instance
+    job_manager : :class:`~pyhdx.panel.main_controllers.JobManager`
+        Queue for fit jobs of this session
     control_panels : :obj:`dict`
         Dictionary with :class:`~pyhdx.panel.base.ControlPanel` instances (__name__ as keys)
     figure_panels : :obj:`dict`
@@ -58,7 +309,8 @@ class MainController(param.Parameterized):
         self.control_panels = {ctrl.name: ctrl(self) for ctrl in control_panels}  #todo as param?
 
         self.template = None   # Panel template
-        self.future_queue = []  # queue of future, callback
+        self.doc = pn.state.curdoc  # Bokeh document of the current session, None outside of a server session
+        self.job_manager = JobManager(self.client, schedule=self._schedule, resolve=self.resolve)
 
         for filt in self.filters.values():
             if isinstance(filt, FacetFilter):
@@ -71,7 +323,6 @@ class MainController(param.Parameterized):
                 trs.param.watch(partial(self._rerender, invalidate_cache=True), 'updated')
 
         self._update_views()
-        self.start()
 
     # from lumen.target.Target
     def _rerender(self, *events, invalidate_cache=False):
@@ -93,23 +344,62 @@ class MainController(param.Parameterized):
         for view in self.views:
             view.update()
 
-    def check_futures(self):
-        for future, callback in self.future_queue[:]:
-            if future.status == 'finished':
-                callback(future)
-                self.future_queue.remove((future, callback))
+    def add_future(self, future, callback):
+        """
+        Calls `callback` with `future` as argument when the future is done (finished, failed or cancelled).
+
+        The done callback of the future runs in a thread of the dask client and is scheduled on the event loop of the
+        Bokeh document, such that `callback` can safely update the application. Without a document (outside of a
+        server session) `callback` is called directly.
+
+        Parameters
+        ----------
+        future : :class:`~distributed.client.Future`
+            Dask future
+        callback : :obj:`callable`
+            Function to call with the done future, which should check the status of the future
+
+        """
+        future.add_done_callback(partial(self._schedule, callback))
+
+    def subscribe(self, topic, callback):
+        """
+        Calls `callback` with the message of each dask worker event of `topic`, such as the reports of a
+        :class:`~pyhdx.support.ProgressReporter`.
 
-    def start(self):
-        refresh_rate = 25
-        pn.state.add_periodic_callback(
-            self.check_futures, refresh_rate
-        )
+        Events are received by the dask client and `callback` is scheduled on the event loop of the Bokeh document,
+        as in :meth:`add_future`.
+
+        Parameters
+        ----------
+        topic : :obj:`str`
+            Topic of worker events
+        callback : :obj:`callable`
+            Function to call with the event message
+
+        """
+        self.client.subscribe_topic(topic, lambda event: self._schedule(callback, event[1]))
+
+    def _schedule(self, callback, *args):
+        """Schedules `callback` on the Bokeh document, or calls it directly without document"""
+        if self.doc is not None:
+            self.doc.add_next_tick_callback(partial(callback, *args))
+        else:
+            callback(*args)
+
+    def resolve(self, arg):
+        """Returns the argument submitted to the Dask cluster in place of the task argument `arg` of a job"""
+        return arg
 
 
 class PyHDXController(MainController):
     """
     Main controller for PyHDX web application.
 
+    Data objects are scattered to the Dask cluster once, and fits refer to the scattered data by their futures (see
+    :meth:`scatter`), such that the data is not serialized again for each fit. Fit tasks are created with the data
+    objects, which are resolved to their futures when the job starts (see :meth:`resolve`).
+
     """
 
     data_objects = param.Dict(default={}, doc='Dictionary for all datasets (KineticsSeries objects)') # todo refactor
@@ -122,10 +412,21 @@ class PyHDXController(MainController):
     sample_name = param.String(doc='Name describing the selected protein(s) state')
 
     def __init__(self, *args, **kwargs):
+        self._hdx_set = None  # Tuple of ids of data objects and their HDXMeasurementSet
+        self._scattered = {}  # Scattered objects and their futures (id of object as keys)
         super(PyHDXController, self).__init__(*args, **kwargs)
 
     @param.depends('data_objects', watch=True)
     def _datasets_updated(self):
+        # Scatters new datasets and releases scattered data of removed datasets
+        keys = [id(obj) for obj in self.data_objects.values()]
+        keep = set(keys)
+        if self._hdx_set is not None and self._hdx_set[0] == keys:
+            keep.add(id(self._hdx_set[1]))
+        self._scattered = {key: value for key, value in self._scattered.items() if key in keep}
+        for obj in self.data_objects.values():
+            self.scatter(obj)
+
         if len(self.data_objects) == 0:
             self.sample_name = ''
         elif len(self.data_objects) == 1:
@@ -142,7 +443,43 @@ class PyHDXController(MainController):
         """Returns combined HDXMeasurementSet of all currently added data objects"""
         #todo when alignments are added in, update this as (fixed) attribute
 
-        return HDXMeasurementSet(list(self.data_objects.values()))
+        data_objects = list(self.data_objects.values())
+        keys = [id(obj) for obj in data_objects]
+        if self._hdx_set is None or self._hdx_set[0] != keys:
+            self._hdx_set = (keys, HDXMeasurementSet(data_objects))
+
+        return self._hdx_set[1]
+
+    def scatter(self, obj):
+        """
+        Returns the future of `obj` scattered to all workers of the Dask cluster. Objects are scattered only once,
+        subsequent calls return the same future unless the scattered data was lost, for example when workers are
+        restarted.
+
+        Parameters
+        ----------
+        obj : :obj:`object`
+            Object to scatter, typically a :class:`~pyhdx.models.KineticsSeries` or
+            :class:`~pyhdx.models.HDXMeasurementSet`
+
+        Returns
+        -------
+        future : :class:`~distributed.client.Future`
+            Future of the scattered object, which can be passed as argument to submitted tasks
+
+        """
+        key = id(obj)
+        if key not in self._scattered or self._scattered[key][1].status != 'finished':
+            # Not hashed as data objects cannot be tokenized deterministically
+            self._scattered[key] = (obj, self.client.scatter(obj, hash=False, broadcast=True))
+
+        return self._scattered[key][1]
+
+    def resolve(self, arg):
+        """Returns the scattered future of data objects, other task arguments are returned unchanged"""
+        if isinstance(arg, (KineticsSeries, HDXMeasurementSet)):
+            return self.scatter(arg)
+        return arg
 
 
 class ComparisonController(MainController):
@@ -29,8 +29,12 @@ class DataFrameSource(Source):
         # else:
         #     raise ValueError("Currently column multiindex beyond two levels is not supported")
 
-    def remove_df(self, table, name, level):
-        raise NotImplementedError('Removing datafarmes not implemented')
+    def remove_df(self, table, name, level=0):
+        """Removes columns with label `name` at multiindex level `level` from table `table`"""
+        df = self.tables[table].drop(columns=name, level=level)
+        if self.dropna:
+            df = df.dropna(how='all')
+        self.tables[table] = df
 
         self.updated = True
 
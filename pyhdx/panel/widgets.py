@@ -176,6 +176,7 @@ class LoggingMarkdown(Markdown):
 class ASyncProgressBar(param.Parameterized):
     completed = param.Integer(default=0)
     num_tasks = param.Integer(default=10, bounds=(1, None))
+    message = param.String(default='', doc='Status message shown below the progress bar')
 
     async def run(self, futures):
         async for task in as_completed(futures):
@@ -189,13 +190,25 @@ class ASyncProgressBar(param.Parameterized):
 
     def reset(self):
         self.completed = 0
+        self.message = ''
 
     def increment(self):
         self.completed += 1
 
-    @param.depends('completed', 'num_tasks')
+    def update(self, report):
+        """Updates the progress bar from a :class:`~pyhdx.support.ProgressReporter` report"""
+        if report['done']:
+            self.reset()
+            return
+        self.num_tasks = max(report['total'], 1)
+        self.completed = report['completed']
+
+    @param.depends('completed', 'num_tasks', 'message')
     def view(self):
         if self.value:
-            return pn.widgets.Progress(active=True, value=self.value, align="center", sizing_mode="stretch_width")
+            progress = pn.widgets.Progress(active=True, value=self.value, align="center", sizing_mode="stretch_width")
+            if self.message:
+                return pn.Column(progress, pn.pane.Str(self.message, sizing_mode='stretch_width'))
+            return progress
         else:
             return None
@@ -8,7 +8,8 @@ import pandas as pd
 from itertools import count, groupby
 import warnings
 from pathlib import Path
-from dask.distributed import Client
+from dask.distributed import Client, Event, get_worker
+import time
 
 
 def verify_cluster(cluster, timeout='2s'):
@@ -66,8 +67,8 @@ def get_reduced_blocks(coverage, max_combine=2, max_join=5):
 
 
 def get_constant_blocks(coverage, block_size=10, initial_block=5):
-    num_repeats = (coverage.prot_len - initial_block) // block_size
-    remainder = (coverage.prot_len - initial_block) % block_size
+    num_repeats = (len(coverage.r_number) - initial_block) // block_size
+    remainder = (len(coverage.r_number) - initial_block) % block_size
 
     blocks = [initial_block] + [block_size] * num_repeats
     if remainder:
@@ -126,6 +127,73 @@ def temporary_seed(seed):
         np.random.set_state(state)
 
 
+class FitCancelledError(Exception):
+    """Raised by a :class:`ProgressReporter` to stop a fit which is cancelled"""
+    pass
+
+
+class ProgressReporter(object):
+    """
+    Reports the progress of long running fits, throttled to at most one report per `interval` seconds.
+
+    Reports are dictionaries with the entries 'name', 'completed', 'total', 'elapsed', 'eta' (estimated remaining time
+    in seconds, based on `total`), 'done' and additional quantities such as current losses. Reports are passed to
+    `callback` and, when the reporter is called on a dask worker, logged as a worker event under `topic`. Clients
+    receive these events with :meth:`~distributed.Client.subscribe_topic`.
+
+    If `cancel` is given, the reporter checks the :class:`~distributed.Event` with this name before each report and
+    raises :class:`FitCancelledError` when the event is set, such that fits stop when they are cancelled.
+
+    Parameters
+    ----------
+    topic : :obj:`str`, optional
+        Topic of worker events
+    callback : :obj:`callable`, optional
+        Function called with each report
+    name : :obj:`str`, optional
+        Name added to reports to identify the fit
+    interval : :obj:`float`
+        Minimum time between reports in seconds. Final reports are always sent.
+    cancel : :obj:`str`, optional
+        Name of the Dask event which cancels the fit
+
+    """
+
+    def __init__(self, topic=None, callback=None, name=None, interval=0.5, cancel=None):
+        self.topic = topic
+        self.callback = callback
+        self.name = name
+        self.interval = interval
+        self.cancel = cancel
+        self._start = None
+        self._last = None
+
+    def __call__(self, completed, total, done=False, **quantities):
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        if not done and self._last is not None and now - self._last < self.interval:
+            return
+        self._last = now
+
+        if not done and self.cancel is not None and Event(self.cancel).is_set():
+            raise FitCancelledError("Fit was cancelled")
+
+        elapsed = now - self._start
+        eta = 0. if done or not completed else elapsed * (total - completed) / completed
+        report = {'name': self.name, 'completed': int(completed), 'total': int(total), 'elapsed': elapsed,
+                  'eta': eta, 'done': done, **{k: float(v) for k, v in quantities.items()}}
+
+        if self.callback is not None:
+            self.callback(report)
+        if self.topic is not None:
+            try:
+                worker = get_worker()
+            except ValueError:  # Not running on a dask worker
+                return
+            worker.log_event(self.topic, report)
+
+
 def grouper(n, iterable, padvalue=None):
     "grouper(3, 'abcdefg', 'x') --> ('a','b','c'), ('d','e','f'), ('g','x','x')"
     return itertools.zip_longest(*[iter(iterable)]*n, fillvalue=padvalue)
@@ -24,6 +24,9 @@ gibbs_guess = hdx_set.guess_deltaG([guess['rate'], guess['rate']])
 # For real data start with parameters r1=0.05, r2=0.5, epochs=100000
 result = fit_gibbs_global_batch(hdx_set, gibbs_guess, r1=2, r2=5, epochs=1000)
 
+# Standard errors of ΔG ('covariance' column of the output) are only included after estimating them
+result.estimate_errors()
+
 #Human readable output
 result.output.to_file('Batch_fit_result.txt', fmt='pprint')
 
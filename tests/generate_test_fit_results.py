@@ -42,6 +42,7 @@ else:
 
 gibbs_guess = series.guess_deltaG(output['rate'])
 fr_torch = fit_gibbs_global(series, gibbs_guess, epochs=epochs)
+fr_torch.estimate_errors()
 fr_torch.output.to_file(directory / 'test_data' / 'ecSecB_torch_fit.txt')
 
 series_dimer = KineticsSeries(pmt.get_state('SecB his dimer apo'), sequence=sequence_dimer,
@@ -51,6 +52,7 @@ hdx_set = HDXMeasurementSet([series_dimer, series])
 
 gibbs_guess = hdx_set.guess_deltaG([output['rate'], output['rate']])
 batch_result = fit_gibbs_global_batch(hdx_set, gibbs_guess, epochs=epochs)
+batch_result.estimate_errors()
 
 batch_result.output.to_file(directory / 'test_data' / 'ecSecB_batch.csv')
 batch_result.output.to_file(directory / 'test_data' / 'ecSecB_batch.txt', fmt='pprint')
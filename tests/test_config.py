@@ -1,6 +1,7 @@
 from pathlib import Path
-from pyhdx.panel.config import ConfigurationSettings, read_config, config_file_path, reset_config
+from pyhdx.panel.config import ConfigurationSettings, read_config, config_file_path, reset_config, config_dir
 import pytest
+import os
 
 directory = Path(__file__).parent
 
@@ -29,5 +30,41 @@ class TestConfig(object):
         cp_config = read_config(config_file_path)
         assert cp_config['cluster']['port'] == '52123'
 
+    def test_resource_policy(self):
+        reset_config()
+        cfg = ConfigurationSettings()
+        cfg.load_config(config_file_path)
+
+        cfg.set('cluster', 'threads_per_worker', '2')
+        assert cfg.n_workers == max(1, os.cpu_count() // 2)
+        assert cfg.torch_threads == (2, 1)
+
+        cfg.set('cluster', 'n_workers', '3')
+        cfg.set('torch', 'intra_op_threads', '4')
+        assert cfg.n_workers == 3
+        assert cfg.torch_threads == (4, 1)
+
+        cfg.load_config(config_file_path)
+
+    def test_checkpoint_dir(self):
+        reset_config()
+        cfg = ConfigurationSettings()
+        cfg.load_config(config_file_path)
+        assert cfg.checkpoint_dir == config_dir / 'checkpoints'
+
+        cfg.set('fitting', 'checkpoint_dir', 'none')
+        assert cfg.checkpoint_dir is None
+
+        cfg.load_config(config_file_path)
+
+    def test_max_jobs(self):
+        reset_config()
+        cfg = ConfigurationSettings()
+        cfg.load_config(config_file_path)
+        assert cfg.max_jobs == (2, cfg.n_workers)
 
+        cfg.set('jobs', 'max_jobs_session', '1')
+        cfg.set('jobs', 'max_jobs_server', '4')
+        assert cfg.max_jobs == (1, 4)
 
+        cfg.load_config(config_file_path)
@@ -1,20 +1,47 @@
 import os
 from pyhdx import PeptideMasterTable, KineticsSeries
 from pyhdx.fileIO import read_dynamx, csv_to_protein
-from pyhdx.fitting import fit_rates_weighted_average, fit_gibbs_global, fit_gibbs_global_batch, fit_gibbs_global_batch_aligned
+from pyhdx.fitting import fit_rates_weighted_average, fit_gibbs_global, fit_gibbs_global_batch, fit_gibbs_global_batch_aligned, \
+    tv_denoise_1d, fit_gibbs_global_sweep, fit_gibbs_global_cv, fit_gibbs_global_bootstrap, \
+    fit_gibbs_global_independent, warm_start_guess, fit_gibbs_global_blocks, fit_gibbs_global_sections, \
+    run_optimizer
+from pyhdx.fitting_torch import estimate_errors, banded_inverse_diagonal, DeltaGFit, TorchSingleFitResult
 from pyhdx.models import HDXMeasurementSet
+from pyhdx.support import get_constant_blocks
+from scipy import constants
 import numpy as np
 import torch
 import pandas as pd
 import time
-from dask.distributed import LocalCluster
+import pickle
+from dask.distributed import LocalCluster, Client
+from pyhdx.support import ProgressReporter
 import asyncio
+import pytest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import pyhdx.fitting
 
 directory = os.path.dirname(__file__)
 np.random.seed(43)
 torch.manual_seed(43)
 
 
+class TestOperators(object):
+    def test_tv_denoise_1d(self):
+        # Exact TV proximal operator; both 3-residue plateaus move towards each other by lam / 3
+        y = np.array([0., 0., 0., 4., 4., 4.])
+        assert np.allclose(tv_denoise_1d(y, 0.3), [0.1, 0.1, 0.1, 3.9, 3.9, 3.9])
+        assert np.allclose(tv_denoise_1d(y, 10), 2.)
+
+    def test_banded_inverse_diagonal(self):
+        rng = np.random.default_rng(43)
+        lower = sum(np.diag(rng.normal(size=50 - d), -d) for d in range(4))
+        matrix = lower @ lower.T + np.eye(50)
+        ab = np.array([np.pad(np.diagonal(matrix, -d), (0, d)) for d in range(4)])
+        assert np.allclose(banded_inverse_diagonal(ab), np.diagonal(np.linalg.inv(matrix)))
+
+
 class TestSecBDataFit(object):
     @classmethod
     def setup_class(cls):
@@ -34,6 +61,11 @@ class TestSecBDataFit(object):
         reduced_data = data[data['end'] < 40]
         cls.reduced_series = KineticsSeries(reduced_data)
 
+        cls.initial_rates = csv_to_protein(os.path.join(directory, 'test_data', 'ecSecB_guess.txt'))
+        cls.gibbs_guess = cls.series_apo.guess_deltaG(cls.initial_rates['rate'])
+        cls.hdx_set = HDXMeasurementSet([cls.series_apo, cls.series_dimer])
+        cls.batch_guess = cls.hdx_set.guess_deltaG([cls.initial_rates['rate'], cls.initial_rates['rate']])
+
         cluster = LocalCluster()
         cls.address = cluster.scheduler_address
 
@@ -47,20 +79,410 @@ class TestSecBDataFit(object):
 
     def test_global_fit(self):
         #kf = KineticsFitting(self.series_apo, bounds=(1e-2, 800), temperature=self.temperature, pH=self.pH)
-        initial_rates = csv_to_protein(os.path.join(directory, 'test_data', 'ecSecB_guess.txt'))
-
         t0 = time.time()  # Very crude benchmarks
-        gibbs_guess = self.series_apo.guess_deltaG(initial_rates['rate']).to_numpy()
+        gibbs_guess = self.gibbs_guess.to_numpy()
         fr_global = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=1000)
         t1 = time.time()
 
         assert t1 - t0 < 5
         out_deltaG = fr_global.output
+        assert 'covariance' not in out_deltaG
+        assert fr_global.output is out_deltaG
+
+        fr_global.estimate_errors()
+        out_deltaG = fr_global.output
         check_deltaG = csv_to_protein(os.path.join(directory, 'test_data', 'ecSecB_torch_fit.txt'))
 
         assert np.allclose(check_deltaG['deltaG'], out_deltaG['deltaG'], equal_nan=True, rtol=0.01)
         assert np.allclose(check_deltaG['covariance'], out_deltaG['covariance'], equal_nan=True, rtol=0.01)
 
+    def test_global_fit_checkpoint(self, tmp_path):
+        gibbs_guess = self.gibbs_guess.to_numpy()
+        fr_check = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=300, stop_loss=-1)
+
+        # Interrupt the fit after 250 epochs, the last checkpoint is at epoch 200
+        def interrupt(completed, total, **kwargs):
+            if completed == 250:
+                raise KeyboardInterrupt
+
+        checkpoint = tmp_path / 'checkpoint.pt'
+        kwargs = dict(epochs=300, stop_loss=-1, checkpoint=checkpoint, checkpoint_interval=100)
+        with pytest.raises(KeyboardInterrupt):
+            fit_gibbs_global(self.series_apo, gibbs_guess, progress=interrupt, **kwargs)
+        assert checkpoint.exists()
+
+        # Checkpoints of fits with different settings are refused
+        with pytest.raises(ValueError):
+            fit_gibbs_global(self.series_apo, gibbs_guess, r1=3, resume=True, **kwargs)
+        assert checkpoint.exists()
+
+        fr_resumed = fit_gibbs_global(self.series_apo, gibbs_guess, resume=True, **kwargs)
+        assert not checkpoint.exists()
+        assert np.allclose(fr_resumed.deltaG, fr_check.deltaG)
+        assert np.allclose(fr_resumed.metadata['total_loss'], fr_check.metadata['total_loss'])
+
+        # Without resume, existing checkpoints are discarded
+        with pytest.raises(KeyboardInterrupt):
+            fit_gibbs_global(self.series_apo, gibbs_guess, progress=interrupt, **kwargs)
+        fr_fresh = fit_gibbs_global(self.series_apo, gibbs_guess, **kwargs)
+        assert np.allclose(fr_fresh.metadata['total_loss'], fr_check.metadata['total_loss'])
+
+        # Fits with learning rate probing resume with the probed learning rate, without probing again
+        fr_probe = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=300, stop_loss=-1, lr_probe=(0.5, 1.))
+        with pytest.raises(KeyboardInterrupt):
+            fit_gibbs_global(self.series_apo, gibbs_guess, lr_probe=(0.5, 1.), progress=interrupt, **kwargs)
+        with mock.patch.object(pyhdx.fitting, 'probe_learning_rate') as probe:
+            fr_resumed = fit_gibbs_global(self.series_apo, gibbs_guess, lr_probe=(0.5, 1.), resume=True, **kwargs)
+        probe.assert_not_called()
+        assert fr_resumed.metadata['lr_probe']['lr_chosen'] == fr_probe.metadata['lr_probe']['lr_chosen']
+        assert np.allclose(fr_resumed.metadata['total_loss'], fr_probe.metadata['total_loss'])
+
+    def test_global_fit_warm_start(self):
+        gibbs_guess = self.gibbs_guess
+        fr_cold = fit_gibbs_global(self.series_apo, gibbs_guess, r1=2, epochs=30000, stop_loss=0.5)
+
+        warm_guess = warm_start_guess(fr_cold, self.series_apo, gibbs_guess)
+        assert isinstance(warm_guess, pd.Series)
+        assert np.allclose(warm_guess, fr_cold.deltaG)
+
+        fr_warm = fit_gibbs_global(self.series_apo, warm_guess, r1=2.2, epochs=30000, stop_loss=0.5)
+        assert len(fr_warm.metadata['total_loss']) < len(fr_cold.metadata['total_loss']) / 4
+
+        # States not in the previous fit are initialized from the rate guesses
+        hdx_set, batch_guess = self.hdx_set, self.batch_guess
+        warm_batch_guess = warm_start_guess(fr_cold, hdx_set, batch_guess)
+        i0, i1 = np.array(self.series_apo.coverage.interval) - hdx_set.interval[0]
+        assert np.allclose(warm_batch_guess[0, i0:i1], fr_cold.deltaG)
+        assert np.allclose(warm_batch_guess[1], batch_guess[1])
+
+        # States are matched by name, other single states are only used with a warning
+        dimer_guess = self.series_dimer.guess_deltaG(self.initial_rates['rate'])
+        with pytest.warns(UserWarning):
+            warm_dimer_guess = warm_start_guess(fr_cold, self.series_dimer, dimer_guess)
+        r_number = np.intersect1d(self.series_dimer.coverage.r_number, self.series_apo.coverage.r_number)
+        apo_deltaG = pd.Series(fr_cold.deltaG, index=self.series_apo.coverage.r_number)
+        dimer_deltaG = pd.Series(warm_dimer_guess.to_numpy(), index=self.series_dimer.coverage.r_number)
+        assert np.allclose(dimer_deltaG[r_number], apo_deltaG[r_number])
+
+    def test_global_fit_blocks(self):
+        gibbs_guess = self.gibbs_guess
+
+        fr_direct = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=30000, stop_loss=0.5)
+        fr_blocks = fit_gibbs_global_blocks(self.series_apo, gibbs_guess, epochs=30000, stop_loss=0.5)
+
+        assert len(fr_blocks.metadata['level_epochs']) == 3
+        assert sum(fr_blocks.metadata['level_epochs']) < len(fr_direct.metadata['total_loss']) / 4
+        assert fr_blocks.total_loss < fr_direct.total_loss
+
+        levels = [get_constant_blocks(self.series_apo.coverage, block_size=20)]
+        fr_constant = fit_gibbs_global_blocks(self.series_apo, gibbs_guess, levels=levels, epochs=100)
+        assert fr_constant.deltaG.shape == (self.series_apo.Nr,)
+
+    def test_global_fit_prune(self):
+        gibbs_guess = self.gibbs_guess
+
+        fr_full = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=1000)
+        fr_pruned = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=1000, prune=True)
+        assert fr_pruned.deltaG.shape == (self.series_apo.Nr,)
+        assert fr_pruned.total_loss == pytest.approx(fr_full.total_loss, rel=1e-2)
+
+        # The scaled regularizer of the pruned fit equals the regularizer on all residues after interpolation
+        reg_loss = pyhdx.fitting.regularizer_1d(2, fr_pruned.model.deltaG).item()
+        assert fr_pruned.total_loss - fr_pruned.mse_loss == pytest.approx(reg_loss, rel=1e-2)
+
+        exchanges = self.series_apo.coverage['exchanges'].to_numpy()
+        assert np.allclose(fr_pruned.deltaG[exchanges], fr_full.deltaG[exchanges], rtol=0.05)
+
+    def test_global_fit_weighted(self):
+        gibbs_guess = self.gibbs_guess
+
+        fr = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=200)
+        fr_weighted = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=200, weighted=True)
+        assert not np.allclose(fr_weighted.deltaG, fr.deltaG)
+
+        # Equal standard deviations give the unweighted fit
+        data = self.series_apo.full_data.copy()
+        data['uptake_corrected_sd'] = 0.1
+        series = KineticsSeries(data, **self.series_apo.metadata)
+        fr_equal = fit_gibbs_global(series, gibbs_guess, epochs=200, weighted=True)
+        assert np.allclose(fr_equal.deltaG, fr.deltaG)
+
+        # Batch fits, weights of padded entries do not change the fit
+        batch_kwargs = dict(epochs=200, r2=0.5)
+        fr_batch = fit_gibbs_global_batch(self.hdx_set, self.batch_guess, **batch_kwargs)
+        fr_batch_weighted = fit_gibbs_global_batch(self.hdx_set, self.batch_guess, weighted=True, **batch_kwargs)
+        assert not np.allclose(fr_batch_weighted.deltaG, fr_batch.deltaG)
+
+        data = self.series_dimer.full_data.copy()
+        data['uptake_corrected_sd'] = 0.1
+        series_dimer = KineticsSeries(data, **self.series_dimer.metadata)
+        hdx_set = HDXMeasurementSet([series, series_dimer])
+        fr_batch_equal = fit_gibbs_global_batch(hdx_set, self.batch_guess, weighted=True, **batch_kwargs)
+        assert np.allclose(fr_batch_equal.deltaG, fr_batch.deltaG)
+
+        fr_state = fit_gibbs_global_batch(hdx_set, self.batch_guess, weighted=True, stop_per_state=True,
+                                          **batch_kwargs)
+        assert np.allclose(fr_state.deltaG, fr_batch.deltaG)
+
+    def test_global_fit_lr_probe(self):
+        gibbs_guess = self.gibbs_guess
+
+        # Batched trial runs are equal to separate runs of 50 epochs
+        fr_probe = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=10, lr_probe=(0.5, 1.))
+        probe = fr_probe.metadata['lr_probe']
+        for lr, loss in zip(probe['lr'], probe['loss']):
+            fr = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=51, lr=lr)
+            assert loss == pytest.approx(fr.total_loss)
+        assert probe['lr_chosen'] == 10.
+
+        # Weight decay is applied with the trial learning rates
+        fr_probe = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=10, lr_probe=(0.5, 1.), weight_decay=1e-5)
+        probe = fr_probe.metadata['lr_probe']
+        for lr, loss in zip(probe['lr'], probe['loss']):
+            fr = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=51, lr=lr, weight_decay=1e-5)
+            assert loss == pytest.approx(fr.total_loss)
+
+        with pytest.raises(ValueError):
+            fit_gibbs_global(self.series_apo, gibbs_guess, epochs=10, optimizer='Adam', lr_probe=True)
+
+    def test_global_fit_convergence(self):
+        gibbs_guess = self.gibbs_guess
+
+        fr_rel = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=5000, stop_loss=0, rel_tol=1e-4)
+        assert len(fr_rel.metadata['total_loss']) < 5001
+
+        # The gradient norm decreases from 0.23 to below 0.2 after about 2000 epochs
+        fr_grad = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=5000, stop_loss=0, grad_tol=0.2, patience=10)
+        total_loss = fr_grad.metadata['total_loss']
+        assert 1000 < len(total_loss) < 5001
+        assert total_loss[-1] < 0.8 * total_loss[1]
+
+        # At a too large learning rate the loss oscillates, which is damped by reducing the learning rate
+        fr = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=1000, lr=1e4)
+        fr_cosine = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=1000, lr=1e4, scheduler='cosine')
+        fr_plateau = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=1000, lr=1e4, scheduler='plateau')
+        assert fr_cosine.total_loss < 0.9 * fr.total_loss
+        assert fr_plateau.total_loss < 0.9 * fr.total_loss
+
+        with pytest.raises(ValueError):
+            fit_gibbs_global(self.series_apo, gibbs_guess, epochs=10, scheduler='step')
+
+    def test_fit_result_predict(self):
+        hdx_set, gibbs_guess = self.hdx_set, self.batch_guess
+
+        result = fit_gibbs_global_batch(hdx_set, gibbs_guess, epochs=100)
+        timepoints = np.logspace(-2, 2, num=250)
+        uptake = result.predict(timepoints)
+        assert uptake.shape == (hdx_set.Ns, hdx_set.Np, 250)
+
+        residuals = result.residuals()
+        assert residuals.shape == (hdx_set.Ns, hdx_set.Np, hdx_set.Nt)
+        assert np.nansum(residuals**2) == pytest.approx(result.mse_loss, rel=1e-3)
+
+        # Cached tensors and residuals are not pickled
+        unpickled = pickle.loads(pickle.dumps(result))
+        assert unpickled._tensors is None and unpickled._residuals is None
+        assert np.allclose(unpickled.residuals(), residuals, equal_nan=True)
+
+        # Each state equals the prediction of a single fit result with the same ΔG values
+        for i, data_obj in enumerate(hdx_set.data_objs):
+            i0, i1 = np.array(data_obj.coverage.interval) - hdx_set.interval[0]
+            model = DeltaGFit(torch.nn.Parameter(result.model.deltaG.detach()[i, i0:i1].clone()))
+            single = TorchSingleFitResult(data_obj, model)
+
+            assert np.allclose(uptake[i, :data_obj.Np], single(timepoints))
+            assert np.all(np.isnan(uptake[i, data_obj.Np:]))
+            assert np.allclose(residuals[i, :data_obj.Np, -data_obj.Nt:], single.residuals())
+
+    def test_global_fit_progress(self):
+        gibbs_guess = self.gibbs_guess
+
+        reports = []
+        reporter = ProgressReporter(callback=reports.append, interval=0.)
+        result = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=20, progress=reporter)
+        assert [report['completed'] for report in reports] == list(range(1, 21)) + [20]
+        assert reports[-1]['done']
+        assert reports[-1]['total_loss'] == pytest.approx(result.total_loss)
+
+        # Batch fits with per-state stopping also send a final report when not all states have converged
+        reports = []
+        reporter = ProgressReporter(callback=reports.append, interval=0.)
+        result = fit_gibbs_global_batch(self.hdx_set, self.batch_guess, epochs=5, stop_per_state=True,
+                                        progress=reporter)
+        assert [report['completed'] for report in reports] == [1, 2, 3, 4, 5, 5]
+        assert reports[-1]['done'] and not any(report['done'] for report in reports[:-1])
+        assert reports[-1]['converged'] == 0
+        assert reports[-1]['total_loss'] == pytest.approx(result.total_loss)
+
+        # Reports from workers are received as worker events
+        events = []
+        with Client(self.address) as client:
+            client.subscribe_topic('progress', events.append)
+            reporter = ProgressReporter(topic='progress', name='apo', interval=0.)
+            future = client.submit(fit_gibbs_global, self.series_apo, gibbs_guess, epochs=20, progress=reporter)
+            future.result()
+            for _ in range(50):
+                if events and events[-1][1]['done']:
+                    break
+                time.sleep(0.1)
+        assert events[-1][1]['name'] == 'apo'
+        assert events[-1][1]['completed'] == 20
+
+    def test_global_fit_sections(self):
+        gibbs_guess = self.gibbs_guess
+
+        # A single section spanning all residues is identical to a regular fit
+        fr_direct = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=500)
+        fr_single = fit_gibbs_global_sections(self.series_apo, gibbs_guess, gap_size=100, epochs=500)
+        assert len(fr_single.metadata['sections']) == 1
+        assert np.allclose(fr_single.deltaG, fr_direct.deltaG)
+
+        fr_sections = fit_gibbs_global_sections(self.series_apo, gibbs_guess, epochs=500)
+        sections = fr_sections.metadata['sections']
+        assert len(sections) == len(self.series_apo.coverage.get_sections())
+        assert fr_sections.mse_loss == pytest.approx(fr_direct.mse_loss, rel=0.05)
+
+        # Residues in gaps between sections are interpolated
+        deltaG = pd.Series(fr_sections.deltaG, index=self.series_apo.coverage.r_number)
+        gap = np.arange(sections[0][1], sections[1][0])
+        assert np.all(deltaG[gap] >= deltaG[[gap[0] - 1, gap[-1] + 1]].min())
+        assert np.all(deltaG[gap] <= deltaG[[gap[0] - 1, gap[-1] + 1]].max())
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            fr_executor = fit_gibbs_global_sections(self.series_apo, gibbs_guess, client=executor, epochs=500)
+        assert np.allclose(fr_executor.deltaG, fr_sections.deltaG)
+
+    def test_global_fit_proximal(self):
+        gibbs_guess = self.gibbs_guess.to_numpy()
+
+        fr_sgd = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=1000)
+        fr_fista = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=1000, optimizer='FISTA')
+
+        assert fr_fista.total_loss < fr_sgd.total_loss
+        assert np.all(np.isfinite(fr_fista.deltaG))
+
+    def test_global_fit_kernel(self):
+        gibbs_guess = self.gibbs_guess.to_numpy()
+
+        fr_eager = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=100)
+        fr_script = fit_gibbs_global(self.series_apo, gibbs_guess, epochs=100, kernel='script')
+
+        assert np.allclose(fr_eager.deltaG, fr_script.deltaG)
+        assert np.allclose(fr_eager.metadata['total_loss'], fr_script.metadata['total_loss'])
+
+        # Compiled kernels only compute the sum of squared residuals
+        tensors = self.series_apo.get_tensors()
+        inputs = [tensors[key] for key in ['temperature', 'X', 'k_int', 'timepoints']]
+        model = DeltaGFit(torch.nn.Parameter(torch.tensor(gibbs_guess).unsqueeze(-1)))
+        with pytest.raises(ValueError):
+            run_optimizer(inputs, tensors['uptake'], torch.optim.SGD, {'lr': 10}, model,
+                          torch.nn.MSELoss(reduction='mean'), lambda param: 0., epochs=10, kernel='script')
+
+    def test_global_fit_sweep(self):
+        gibbs_guess = self.gibbs_guess.to_numpy()
+
+        r1_values = [0.5, 2, 5]
+        sweep_result = fit_gibbs_global_sweep(self.series_apo, gibbs_guess, r1=r1_values, epochs=200, patience=1000)
+        losses = sweep_result.losses
+
+        assert len(sweep_result) == 3
+        assert np.all(losses['r1'] == r1_values)
+        assert np.allclose(losses['total_loss'], losses['mse_loss'] + losses['reg_loss'])
+
+        # Each setting in the sweep is identical to an independent fit
+        fr_global = fit_gibbs_global(self.series_apo, gibbs_guess, r1=2, epochs=200, patience=1000)
+        assert np.allclose(fr_global.deltaG, sweep_result[1].deltaG)
+
+    def test_global_fit_cv(self):
+        gibbs_guess = self.gibbs_guess.to_numpy()
+
+        cv_result = fit_gibbs_global_cv(self.series_apo, gibbs_guess, r1=[0.5, 2], n_folds=3, epochs=100)
+        losses = cv_result.losses
+
+        assert len(losses) == 6
+        assert list(losses['fold']) == [0, 1, 2, 0, 1, 2]
+        assert np.all(losses['test_mse_loss'] > 0)
+        assert list(cv_result.cv_loss.index) == [0.5, 2]
+
+    def test_global_fit_bootstrap(self):
+        gibbs_guess = self.gibbs_guess.to_numpy()
+
+        bs_result = fit_gibbs_global_bootstrap(self.series_apo, gibbs_guess, n_samples=10, epochs=100)
+        output = bs_result.output
+
+        assert len(bs_result) == 10
+        assert bs_result.deltaG.shape == (11, self.series_apo.Nr)
+        assert np.all(output.index == self.series_apo.coverage.r_number)
+        assert list(output.columns) == ['sequence', '_deltaG', 'deltaG', 'pfact', 'deltaG_lower', 'deltaG_upper']
+
+        # The fit of the unresampled data is the point estimate
+        assert np.allclose(output['_deltaG'], bs_result.deltaG[0])
+        bools = ~np.isnan(output['deltaG'])
+        pfact = np.exp(output['deltaG'][bools] / (constants.R * self.series_apo.temperature))
+        assert np.allclose(output['pfact'][bools], pfact)
+        assert np.all(output['deltaG_lower'][bools] <= output['deltaG_upper'][bools])
+
+        bs_result = fit_gibbs_global_bootstrap(self.hdx_set, self.batch_guess, n_samples=5, epochs=100)
+        output = bs_result.output
+        assert len(bs_result) == 5
+        assert output.df.shape == (self.hdx_set.Nr, 10)
+        assert list(output.df.columns.get_level_values('Quantity')[:5]) == \
+            ['_deltaG', 'deltaG', 'pfact', 'deltaG_lower', 'deltaG_upper']
+        assert np.allclose(output.df.xs('_deltaG', axis=1, level='Quantity').to_numpy().T, bs_result.deltaG[0])
+
+    def test_estimate_errors(self):
+        check_deltaG = csv_to_protein(os.path.join(directory, 'test_data', 'ecSecB_torch_fit.txt'))
+        deltaG = check_deltaG['deltaG'].reindex(self.series_apo.coverage.r_number).to_numpy()
+        bools = self.series_apo.coverage['exchanges'].to_numpy()
+        tensors = self.series_apo.get_tensors(exchanges=True)
+
+        def calc_loss(deltaG_input):
+            pfact = torch.exp(deltaG_input.unsqueeze(-1) / (8.31446261815324 * tensors['temperature']))
+            uptake = 1 - torch.exp(-torch.matmul((tensors['k_int'] / (1 + pfact)), tensors['timepoints']))
+            return torch.sum((torch.matmul(tensors['X'], uptake) - tensors['uptake']) ** 2)
+
+        hessian = torch.autograd.functional.hessian(calc_loss, torch.tensor(deltaG[bools], dtype=torch.float64))
+        check = np.sqrt(np.abs(np.diagonal(torch.inverse(hessian).numpy())))
+        errors = estimate_errors(self.series_apo, deltaG)
+        r_number = self.series_apo.coverage.r_number[bools]
+        assert np.allclose(errors['covariance'][r_number], check, rtol=1e-6)
+
+        errors_gn = estimate_errors(self.series_apo, deltaG, method='gauss-newton')
+        assert np.all(errors_gn.index == errors.index)
+
+    def test_global_fit_independent(self):
+        hdx_set, gibbs_guess = self.hdx_set, self.batch_guess
+
+        results = fit_gibbs_global_independent(hdx_set, gibbs_guess, epochs=500, stop_loss=1)
+        assert len(results) == 2
+        assert len(results[0].metadata['total_loss']) != len(results[1].metadata['total_loss'])
+
+        # Each state is identical to a separate single fit, including its number of epochs
+        for i, data_obj in enumerate(hdx_set.data_objs):
+            i0, i1 = np.array(data_obj.coverage.interval) - hdx_set.interval[0]
+            fr_single = fit_gibbs_global(data_obj, gibbs_guess[i, i0:i1], epochs=500, stop_loss=1)
+
+            assert np.allclose(results[i].deltaG, fr_single.deltaG)
+            assert np.allclose(results[i].metadata['total_loss'], fr_single.metadata['total_loss'])
+
+    def test_batch_fit_stop_per_state(self):
+        hdx_set, gibbs_guess = self.hdx_set, self.batch_guess
+
+        # Without converged states the fit equals a regular batch fit
+        result = fit_gibbs_global_batch(hdx_set, gibbs_guess, epochs=200, stop_loss=0.01)
+        result_per_state = fit_gibbs_global_batch(hdx_set, gibbs_guess, epochs=200, stop_loss=0.01, stop_per_state=True)
+        assert np.allclose(result.deltaG, result_per_state.deltaG)
+        assert np.allclose(result.metadata['total_loss'], result_per_state.metadata['total_loss'])
+        assert np.all(result_per_state.metadata['n_epochs'] == 200)
+
+        result = fit_gibbs_global_batch(hdx_set, gibbs_guess, epochs=300, stop_loss=1., stop_per_state=True)
+        n_epochs = result.metadata['n_epochs']
+        state_mse_loss = result.metadata['state_mse_loss']
+        assert n_epochs[0] != n_epochs[1]
+        assert state_mse_loss.shape == (max(n_epochs) + 1, 2)
+        i = np.argmin(n_epochs)
+        assert np.all(state_mse_loss[n_epochs[i]:, i] == state_mse_loss[n_epochs[i], i])
+
     def test_batch_fit(self):
         hdx_set = HDXMeasurementSet([self.series_apo, self.series_dimer])
         guess = csv_to_protein(os.path.join(directory, 'test_data', 'ecSecB_guess.txt'))
@@ -68,9 +490,17 @@ class TestSecBDataFit(object):
         gibbs_guess = hdx_set.guess_deltaG([guess['rate'], guess['rate']])
         result = fit_gibbs_global_batch(hdx_set, gibbs_guess, epochs=1000)
 
-        output = result.output
+        assert 'covariance' not in result.output.columns.get_level_values('Quantity')
+        output = result.estimate_errors().output
 
         check_protein = csv_to_protein(os.path.join(directory, 'test_data', 'ecSecB_batch.csv'), column_depth=2)
+        assert list(output['SecB WT apo'].columns) == list(check_protein['SecB WT apo'].columns)
+
+        # Batched error estimation equals per-state estimation
+        for i, data_obj in enumerate(hdx_set.data_objs):
+            i0, i1 = np.array(data_obj.coverage.interval) - hdx_set.interval[0]
+            errors = estimate_errors(data_obj, result.deltaG[i, i0:i1])['covariance'].reindex(hdx_set.r_number)
+            assert np.allclose(errors, output[data_obj.name or data_obj.state]['covariance'], equal_nan=True)
         states = ['SecB WT apo', 'SecB his dimer apo']
 
         for state in states:
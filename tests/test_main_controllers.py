@@ -0,0 +1,228 @@
+from pyhdx import PeptideMasterTable, read_dynamx, KineticsSeries
+from pyhdx.models import HDXMeasurementSet
+from pyhdx.panel.main_controllers import JobManager, PyHDXController
+from pyhdx.support import ProgressReporter, FitCancelledError
+from dask.distributed import LocalCluster, Client, Event
+from pathlib import Path
+import time
+import pytest
+
+directory = Path(__file__).parent
+
+
+def wait_for(release, progress=None):
+    """Task which runs until the event `release` is set, reporting progress while waiting"""
+    event = Event(release)
+    for i in range(600):
+        if event.is_set():
+            return i
+        if progress is not None:
+            progress(i, 600)
+        time.sleep(0.05)
+    raise TimeoutError
+
+
+def fail():
+    raise ValueError('Task failed')
+
+
+class StubDocument(object):
+    """Records the callbacks scheduled on a Bokeh document"""
+    def __init__(self):
+        self.callbacks = []
+
+    def add_next_tick_callback(self, callback):
+        self.callbacks.append(callback)
+
+
+def poll(condition, timeout=30):
+    t0 = time.monotonic()
+    while not condition():
+        assert time.monotonic() - t0 < timeout, 'Timed out'
+        time.sleep(0.05)
+
+
+class TestJobManager(object):
+    @classmethod
+    def setup_class(cls):
+        cls.cluster = LocalCluster(n_workers=1, threads_per_worker=4, processes=False)
+        cls.client = Client(cls.cluster)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.client.close()
+        cls.cluster.close()
+
+    def setup_method(self):
+        self.done = []
+        self.count = 0
+
+    def callback(self, job):
+        self.done.append(job)
+
+    def task(self, progress=False):
+        """Returns a blocking task and the event which releases it"""
+        self.count += 1
+        release = f'release-{id(self)}-{self.count}'
+        kwargs = {'progress': ProgressReporter(interval=0.)} if progress else {}
+        return (wait_for, (release, ), kwargs), Event(release, client=self.client)
+
+    def test_priority(self):
+        manager = JobManager(self.client, max_jobs=1, max_server_jobs=4)
+        task, release = self.task()
+        manager.submit('first', [task], self.callback)
+        for name, priority in [('low', 0), ('high', 1), ('low_2', 0)]:
+            manager.submit(name, [(time.sleep, (0.,), {})], self.callback, priority=priority)
+        assert list(manager.running) == ['first']
+
+        release.set()
+        poll(lambda: len(self.done) == 4)
+        assert [job.name for job in self.done] == ['first', 'high', 'low', 'low_2']
+        assert all(job.status == 'finished' for job in self.done)
+        assert JobManager._server_jobs == 0
+
+    def test_limits(self):
+        managers = [JobManager(self.client, max_jobs=2, max_server_jobs=3) for i in range(2)]
+        releases = []
+        for i, manager in enumerate(managers):
+            for j in range(3):
+                task, release = self.task()
+                releases.append(release)
+                manager.submit(f'job_{i}_{j}', [task], self.callback)
+
+        # Two jobs of the first session and one of the second session fill the server
+        assert [len(manager.running) for manager in managers] == [2, 1]
+        assert JobManager._server_jobs == 3
+
+        releases[0].set()
+        poll(lambda: len(self.done) == 1)
+        assert [len(manager.running) for manager in managers] == [2, 1]
+        assert 'job_0_2' in managers[0].running
+
+        for release in releases:
+            release.set()
+        poll(lambda: len(self.done) == 6)
+        assert JobManager._server_jobs == 0
+
+    def test_failure(self):
+        manager = JobManager(self.client, max_jobs=1, max_server_jobs=4)
+        task, release = self.task(progress=True)
+        manager.submit('failed', [(fail, (), {}), task], self.callback, combine=True)
+        manager.submit('queued', [(time.sleep, (0.,), {})], self.callback)
+
+        # The remaining task of the failed job is stopped, after which the slot is released
+        poll(lambda: len(self.done) == 2)
+        failed, queued = self.done
+        assert failed.status == 'error'
+        assert isinstance(failed.exception(), ValueError)
+        assert isinstance(failed.futures[1].exception(), FitCancelledError)
+        assert queued.status == 'finished'
+        assert JobManager._server_jobs == 0
+
+    def test_cancel(self):
+        manager = JobManager(self.client, max_jobs=1, max_server_jobs=4)
+        task, release = self.task(progress=True)
+        blocking_task, blocking_release = self.task()
+        manager.submit('running', [task, blocking_task], self.callback, combine=True)
+        manager.submit('queued', [(time.sleep, (0.,), {})], self.callback)
+        manager.submit('next', [(time.sleep, (0.,), {})], self.callback)
+
+        # Queued jobs are cancelled without being submitted
+        manager.cancel('queued')
+        assert self.done[0].name == 'queued' and self.done[0].status == 'cancelled'
+        assert not self.done[0].futures
+
+        # The task with a progress reporter stops, the slot is kept until the other task returns
+        manager.cancel('running')
+        job = manager.running['running']
+        poll(lambda: job.futures[0].done())
+        assert isinstance(job.futures[0].exception(), FitCancelledError)
+        time.sleep(0.5)
+        assert list(manager.running) == ['running']
+        assert JobManager._server_jobs == 1
+
+        blocking_release.set()
+        poll(lambda: len(self.done) == 3)
+        assert [job.name for job in self.done] == ['queued', 'running', 'next']
+        assert self.done[1].status == 'cancelled'
+        assert JobManager._server_jobs == 0
+
+        with pytest.raises(KeyError):
+            manager.cancel('running')
+
+
+class TestPyHDXController(object):
+    @classmethod
+    def setup_class(cls):
+        pmt = PeptideMasterTable(read_dynamx(directory / 'test_data' / 'ecSecB_apo.csv'))
+        pmt.set_control(('Full deuteration control', 0.167))
+        cls.series = KineticsSeries(pmt.get_state('SecB WT apo'), temperature=303.15, pH=8.)
+
+        cls.cluster = LocalCluster(n_workers=2, threads_per_worker=1, processes=False)
+        cls.client = Client(cls.cluster)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.client.close()
+        cls.cluster.close()
+
+    def test_scatter(self):
+        controller = PyHDXController([], client=self.client)
+
+        # Data objects are scattered to all workers once
+        future = controller.scatter(self.series)
+        assert controller.scatter(self.series) is future
+        assert len(self.client.who_has(future)[future.key]) == 2
+
+        # Lost data is scattered again
+        self.client.cancel(future)
+        poll(lambda: future.status == 'cancelled')
+        rescattered = controller.scatter(self.series)
+        assert rescattered is not future
+        assert rescattered.status == 'finished'
+
+    def test_resolve(self):
+        controller = PyHDXController([], client=self.client)
+        hdx_set = HDXMeasurementSet([self.series])
+        assert controller.resolve(hdx_set) is controller.scatter(hdx_set)
+        assert controller.resolve(2.) == 2.
+
+        # Jobs submit the futures of data objects scattered when the job starts
+        future = controller.scatter(self.series)
+        self.client.cancel(future)
+        poll(lambda: future.status == 'cancelled')
+
+        done = []
+        controller.job_manager.submit('job', [(len, (self.series, ), {})], done.append)
+        poll(lambda: done)
+        assert done[0].status == 'finished'
+        assert done[0].result() == len(self.series)
+        assert controller.scatter(self.series) is not future
+
+    def test_schedule(self):
+        controller = PyHDXController([], client=self.client)
+        controller.doc = StubDocument()
+        done = []
+
+        # Done callbacks of futures run on the next tick of the document
+        future = self.client.submit(len, [1, 2])
+        controller.add_future(future, done.append)
+        poll(lambda: controller.doc.callbacks)
+        assert not done
+        controller.doc.callbacks.pop()()
+        assert done == [future]
+
+        # As do the callbacks of worker events
+        controller.subscribe('test_schedule', done.append)
+        self.client.log_event('test_schedule', 'message')
+        poll(lambda: controller.doc.callbacks)
+        assert len(done) == 1
+        controller.doc.callbacks.pop()()
+        assert done[1] == 'message'
+
+        # Without document callbacks are called directly
+        controller.doc = None
+        future = self.client.submit(len, [1, 2, 3])
+        controller.add_future(future, done.append)
+        poll(lambda: len(done) == 3)
+        assert done[2] is future
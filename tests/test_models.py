@@ -37,6 +37,36 @@ class TestUptakeFileModels(object):
         series = states['SecB WT apo']
         assert isinstance(series, KineticsSeries)
 
+    def test_aggregate(self):
+        data = read_dynamx(directory / 'test_data' / 'ecSecB_apo.csv')
+        replicate = data.copy()
+        replicate['uptake'] += 0.5
+        replicate['uptake_sd'] *= 2
+
+        pmt = PeptideMasterTable(np.concatenate([data, replicate]))
+        pmt.aggregate()
+        assert len(pmt.data) == len(self.pf1.data)
+
+        # Inverse variance weighted mean of the two replicates
+        i = np.argmax(data['uptake_sd'] > 0)
+        selected = pmt.get_data(data['state'][i], data['exposure'][i])
+        entry = selected[(selected['_start'] == data['start'][i]) & (selected['_end'] == data['end'][i])]
+        assert entry['uptake'] == pytest.approx(data['uptake'][i] + 0.5 / 5)
+        assert entry['uptake_sd'] == pytest.approx(data['uptake_sd'][i] * np.sqrt(4 / 5))
+
+        pmt.set_control(('Full deuteration control', 0.167))
+        series = KineticsSeries(pmt.get_state('SecB WT apo'))
+        assert series.uptake_corrected_sd.shape == series.uptake_corrected.shape
+
+        # Standard deviations of the control are propagated into uptake_corrected_sd
+        control = pmt.get_data('Full deuteration control', 0.167)
+        data = pmt.get_state('SecB WT apo')
+        c = control[(control['start'] == data['start'][0]) & (control['end'] == data['end'][0])][0]
+        sd = np.sqrt(data['uptake_sd'][0]**2 + (data['uptake'][0] * c['uptake_sd'] / c['uptake'])**2)
+        assert data['uptake_corrected_sd'][0] == pytest.approx(sd / c['uptake'] * data['ex_residues'][0])
+        with pytest.raises(ValueError):
+            pmt.aggregate()
+
     # def test_split(self):
     #     series_name = 'SecB WT apo'
     #
@@ -78,6 +108,18 @@ class TestSeries(object):
 
         # assert ...
 
+    def test_pickling(self):
+        unpickled = pickle.loads(pickle.dumps(self.series))
+        assert unpickled.coverage._X is None
+        assert np.all(unpickled.coverage.X == self.series.coverage.X)
+        assert np.all(unpickled[0].Z == self.series[0].Z)
+        assert np.all(unpickled.uptake_corrected == self.series.uptake_corrected)
+        pd.testing.assert_frame_equal(unpickled.coverage.protein.df, self.series.coverage.protein.df)
+
+        # Pickled data does not include the coverage matrices
+        matrix_size = sum(pm.X.nbytes + pm.Z.nbytes for pm in self.series)
+        assert len(pickle.dumps(self.series)) < matrix_size
+
 @pytest.mark.skip(reason="Simulated data was removed")
 class TestSimulatedData(object):
     @classmethod
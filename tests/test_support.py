@@ -1,6 +1,6 @@
 import numpy as np
 import matplotlib as mpl
-from pyhdx.support import rgb_to_hex
+from pyhdx.support import rgb_to_hex, ProgressReporter
 
 
 class TestSupportFunctions(object):
@@ -13,3 +13,16 @@ class TestSupportFunctions(object):
 
         hex_pyhdx = rgb_to_hex(selected_rgb)
         assert np.all(hex_pyhdx == hex_mpl)
+
+    def test_progress_reporter(self):
+        reports = []
+        reporter = ProgressReporter(callback=reports.append, name='fit', interval=60.)
+        for i in range(10):
+            reporter(i + 1, 100, loss=np.float64(i))
+        reporter(10, 100, done=True, loss=9.)
+
+        # Throttled to the first and the final report
+        assert len(reports) == 2
+        assert reports[0]['completed'] == 1 and reports[0]['name'] == 'fit'
+        assert reports[1]['done'] and reports[1]['eta'] == 0.
+        assert isinstance(reports[0]['loss'], float)